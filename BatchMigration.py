@@ -0,0 +1,275 @@
+import os
+import sys
+import json
+import time
+import argparse
+import functools
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# The common layer modules import each other as top-level modules
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "common_layer"))
+
+from Pipeline import Pipeline, sheet_workers_conflict, SIMPLIFIED_VIEW_FILE, COMMON_LAYER_FILE, COMMON_LAYER_STORE
+from ConversionCache import ConversionCache
+from StageMetrics import StageMetrics
+from SheetSelection import SheetSelection
+from SourceExtractor import extract_app_sources, check_format, FORMATS, DEFAULT_FORMAT
+
+# Metrics file written to each app's output folder, by --metrics format
+METRICS_FILE_NAMES = {"jsonl": 'metrics.jsonl', "prometheus": 'metrics.prom'}
+
+# File names looked up in an app folder when no shared datasource is given
+DATASOURCE_FILE_NAMES = ('datasource.tds', 'input-data-source.txt')
+
+
+def is_unbuilt_app(path):
+    """An unbuilt app folder has an objects/ folder next to its script.qvs."""
+    return os.path.isdir(os.path.join(path, 'objects')) and os.path.isfile(os.path.join(path, 'script.qvs'))
+
+
+def find_unbuilt_apps(root):
+    """Return every unbuilt app folder below root, sorted so runs are repeatable."""
+    apps = []
+    pending = [root]
+    while pending:
+        folder = pending.pop()
+        if is_unbuilt_app(folder):
+            apps.append(folder)
+            continue
+        with os.scandir(folder) as entries:
+            pending.extend(entry.path for entry in entries if entry.is_dir())
+    return sorted(apps)
+
+
+def app_output_name(root, app_path):
+    relative = os.path.relpath(app_path, root)
+    if relative == os.curdir:
+        relative = os.path.basename(os.path.abspath(app_path))
+    return relative.replace(os.sep, '__')
+
+
+def find_datasource(app_path, default_datasource):
+    for file_name in DATASOURCE_FILE_NAMES:
+        candidate = os.path.join(app_path, file_name)
+        if os.path.isfile(candidate):
+            return candidate
+    return default_datasource
+
+
+def migrate_app(app_path, output_dir, default_datasource=None, stream=False, cache_dir=None,
+                cache_bytes=256 * 1024 * 1024, write_tableau_json=True, pretty_xml=True,
+                keep_intermediate=False, metrics_format=None, profile_slowest=0, trace_memory=False,
+                pretty_json=False, read_ahead=0, selection=None, extract_data=False, data_root=None,
+                sheet_workers=0, common_layer_store=False, extract_format=DEFAULT_FORMAT):
+    """Run Qlik -> common layer -> Tableau for one app and return its manifest.
+
+    The stages run in memory through a Pipeline; keep_intermediate=True also writes
+    simplified_view.json and common_layer.json to output_dir, the latter as a sharded
+    common_layer/ store folder with common_layer_store=True.
+    With stream=True the sheet files are parsed incrementally, so memory during the
+    simplify stage follows the largest sheet object.
+    With a cache_dir, sheets whose inputs did not change since an earlier run are
+    served from a ConversionCache (streaming runs bypass it).
+    read_ahead=N reads up to N object files concurrently, which hides per-file latency
+    when the apps live on NFS / SMB shares.
+    A SheetSelection as selection limits the run to the sheets and objects it picks.
+    sheet_workers=N spreads the sheets of the app over N processes; meant for batches of
+    a few very large apps, run with workers=1, and not combined with stream, read_ahead
+    or metrics.
+    extract_data=True extracts the delimited files the script loads (found under data_root,
+    by default the app folder) to output_dir/data as extract_format files ("parquet", which
+    needs pyarrow, or "csv.gz"); an app without a datasource then takes its columns from
+    the generated .tds of its first source, which Tableau itself cannot open.
+    write_tableau_json=False skips result-common-to-tableau.json, which only mirrors the XML.
+    JSON outputs are compact unless pretty_json=True.
+    metrics_format ("jsonl" or "prometheus") writes per-stage and per-sheet metrics;
+    profile_slowest=N keeps cProfile (and, with trace_memory, tracemalloc) captures of
+    the N slowest sheets under output_dir/profiles.
+    """
+    manifest = {
+        "app": app_path,
+        "output_dir": output_dir,
+        "status": "failed",
+        "stages": {},
+        "outputs": {}
+    }
+    started = time.perf_counter()
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        outputs = manifest["outputs"]
+        if keep_intermediate:
+            outputs["simplified_view"] = os.path.join(output_dir, SIMPLIFIED_VIEW_FILE)
+            outputs["common_layer"] = os.path.join(output_dir,
+                                                   COMMON_LAYER_STORE if common_layer_store else COMMON_LAYER_FILE)
+        if write_tableau_json:
+            outputs["tableau_json"] = os.path.join(output_dir, 'result-common-to-tableau.json')
+        outputs["tableau_xml"] = os.path.join(output_dir, 'tableau-result.xml')
+
+        if extract_data:
+            extracted = extract_app_sources(app_path, os.path.join(output_dir, 'data'), data_root, workers=1,
+                                            output_format=extract_format)
+            manifest["extracted_sources"] = extracted
+            default_datasource = default_datasource or next(
+                (summary["datasource"] for summary in extracted if "datasource" in summary), None)
+        datasource_path = find_datasource(app_path, default_datasource)
+        if datasource_path is None:
+            raise FileNotFoundError(f"No Tableau datasource found for {app_path}")
+        manifest["datasource"] = datasource_path
+
+        cache = ConversionCache(cache_dir, cache_bytes) if cache_dir else None
+        metrics = None
+        if metrics_format or profile_slowest:
+            metrics = StageMetrics({"app": app_path}, profile_slowest, trace_memory)
+        pipeline = Pipeline(datasource_path, cache, output_dir if keep_intermediate else None, stream, metrics,
+                            pretty_json, read_ahead, selection, sheet_workers=sheet_workers,
+                            common_layer_store=common_layer_store)
+        try:
+            pipeline.run(app_path, outputs["tableau_xml"], outputs.get("tableau_json"), pretty_xml)
+        finally:
+            manifest["stages"] = pipeline.stage_times
+            manifest["missing_library_items"] = pipeline.missing_library_items
+            if metrics is not None:
+                write_metrics(metrics, output_dir, metrics_format, outputs)
+
+        if cache is not None:
+            manifest["cache"] = cache.stats()
+        manifest["status"] = "ok"
+    except Exception as error:
+        manifest["error"] = f"{type(error).__name__}: {error}"
+        manifest["traceback"] = traceback.format_exc()
+    manifest["elapsed"] = time.perf_counter() - started
+    write_manifest(manifest)
+    return manifest
+
+
+def write_metrics(metrics, output_dir, metrics_format, outputs):
+    if metrics_format:
+        outputs["metrics"] = os.path.join(output_dir, METRICS_FILE_NAMES[metrics_format])
+        with open(outputs["metrics"], 'w') as fp:
+            if metrics_format == "prometheus":
+                metrics.write_prometheus(fp)
+            else:
+                metrics.write_jsonl(fp)
+    if metrics.profile_slowest:
+        outputs["profiles"] = metrics.write_profiles(os.path.join(output_dir, 'profiles'))
+
+
+def write_manifest(manifest):
+    if not os.path.isdir(manifest["output_dir"]):
+        return
+    with open(os.path.join(manifest["output_dir"], 'manifest.json'), 'w') as fp:
+        json.dump(manifest, fp, indent=4)
+
+
+def run_batch(root, output_root, workers=None, **options):
+    """Migrate every unbuilt app under root, one app per pool task, and write batch-manifest.json.
+
+    options are passed on to migrate_app.
+    """
+    apps = find_unbuilt_apps(root)
+    jobs = [(app, os.path.join(output_root, app_output_name(root, app))) for app in apps]
+    migrate = functools.partial(migrate_app, **options)
+    manifests = {}
+    started = time.perf_counter()
+
+    if workers == 1:
+        for job in jobs:
+            manifests[job[0]] = migrate(*job)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(migrate, *job): job for job in jobs}
+            for future in as_completed(futures):
+                app_path, output_dir = futures[future]
+                try:
+                    manifests[app_path] = future.result()
+                except Exception as error:
+                    # The worker itself died (e.g. killed); migrate_app catches everything else
+                    manifests[app_path] = {
+                        "app": app_path,
+                        "output_dir": output_dir,
+                        "status": "failed",
+                        "error": f"{type(error).__name__}: {error}"
+                    }
+
+    summary = {
+        "root": root,
+        "workers": workers or os.cpu_count(),
+        "elapsed": time.perf_counter() - started,
+        "succeeded": sum(1 for m in manifests.values() if m["status"] == "ok"),
+        "failed": sum(1 for m in manifests.values() if m["status"] != "ok"),
+        "apps": [manifests[app] for app in apps]
+    }
+    os.makedirs(output_root, exist_ok=True)
+    with open(os.path.join(output_root, 'batch-manifest.json'), 'w') as fp:
+        json.dump(summary, fp, indent=4)
+    return summary
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Migrate every unbuilt Qlik app under a folder to Tableau.")
+    parser.add_argument('root', help="folder searched for unbuilt apps (objects/ + script.qvs)")
+    parser.add_argument('output', help="folder receiving one sub-folder per app")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('-d', '--datasource', default=None,
+                        help="Tableau datasource XML used for apps without their own datasource.tds")
+    parser.add_argument('--stream', action='store_true',
+                        help="parse sheet files incrementally to bound memory on very large sheets")
+    parser.add_argument('--read-ahead', type=int, default=0, metavar='N',
+                        help="read up to N object files of an app concurrently, for apps on network shares")
+    parser.add_argument('--sheet-workers', type=int, default=0, metavar='N',
+                        help="convert the sheets of each app on N processes, for apps with many sheets")
+    parser.add_argument('--cache-dir', default=None,
+                        help="reuse results for unchanged sheets from this conversion cache folder")
+    parser.add_argument('--cache-size', type=int, default=256, help="conversion cache size limit in MB")
+    parser.add_argument('--no-tableau-json', action='store_true',
+                        help="only write the workbook XML, not its result-common-to-tableau.json mirror")
+    parser.add_argument('--compact-xml', action='store_true', help="write the workbook XML without indentation")
+    parser.add_argument('--keep-intermediate', action='store_true',
+                        help="also write simplified_view.json and common_layer.json for debugging")
+    parser.add_argument('--common-layer-store', action='store_true',
+                        help="with --keep-intermediate, write the common layer as a sharded store folder")
+    parser.add_argument('--pretty-json', action='store_true', help="indent the JSON outputs instead of compacting them")
+    SheetSelection.add_arguments(parser)
+    parser.add_argument('--extract-data', action='store_true',
+                        help="extract the CSV / text files each script loads to compressed columnar files")
+    parser.add_argument('--extract-format', choices=FORMATS, default=DEFAULT_FORMAT,
+                        help="with --extract-data: parquet (needs pyarrow) or gzip-compressed CSV")
+    parser.add_argument('--data-root', default=None,
+                        help="folder lib:// and relative source paths resolve against (default: each app's folder)")
+    parser.add_argument('--metrics', choices=sorted(METRICS_FILE_NAMES), default=None,
+                        help="write per-stage and per-sheet timings, byte and object counts in this format")
+    parser.add_argument('--profile-slowest', type=int, default=0, metavar='N',
+                        help="keep cProfile captures of the N slowest sheets of each app")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="with --profile-slowest, also record tracemalloc peaks and top allocations")
+    args = parser.parse_args(argv)
+    conflict = sheet_workers_conflict(args.sheet_workers, args.stream, args.read_ahead,
+                                      bool(args.metrics or args.profile_slowest))
+    if conflict:
+        parser.error(f"--sheet-workers cannot be combined with --{conflict.replace('_', '-')}")
+    if args.extract_data:
+        try:
+            check_format(args.extract_format)
+        except RuntimeError as e:
+            parser.error(str(e))
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    summary = run_batch(args.root, args.output, args.workers, default_datasource=args.datasource,
+                        stream=args.stream, cache_dir=args.cache_dir, cache_bytes=args.cache_size * 1024 * 1024,
+                        write_tableau_json=not args.no_tableau_json, pretty_xml=not args.compact_xml,
+                        keep_intermediate=args.keep_intermediate, common_layer_store=args.common_layer_store,
+                        metrics_format=args.metrics,
+                        profile_slowest=args.profile_slowest, trace_memory=args.trace_memory,
+                        pretty_json=args.pretty_json, read_ahead=args.read_ahead,
+                        selection=SheetSelection.from_args(args), extract_data=args.extract_data,
+                        data_root=args.data_root, sheet_workers=args.sheet_workers,
+                        extract_format=args.extract_format)
+    print(f"{summary['succeeded']} succeeded, {summary['failed']} failed in {summary['elapsed']:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
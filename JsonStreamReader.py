@@ -0,0 +1,169 @@
+import json
+import re
+
+# Everything up to the next bracket, with strings skipped whole; group 1 is the bracket,
+# or a lone quote when a string is cut off at the end of the buffer
+_CONTAINER_TOKEN = re.compile(r'(?:[^"\[\]{}]|"[^"\\]*(?:\\.[^"\\]*)*")*([\[\]{}]|")')
+_STRING = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"')
+_SCALAR = re.compile(r'[^,\]}\s]+')
+_WHITESPACE = re.compile(r'\s*')
+
+
+class JsonStreamReader:
+    """Incremental reader for a large JSON document.
+
+    Objects and arrays are walked member by member with iter_object / iter_array.
+    A member is either decoded with read_value or dropped with skip_value, so only
+    the subtrees that are actually needed are ever materialised.  Members the caller
+    leaves untouched are skipped automatically.
+    """
+
+    def __init__(self, fp, chunk_size=1 << 20):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        # Characters already dropped from the front of the buffer
+        self.dropped = 0
+
+    def _more(self, keep_from):
+        """Append the next chunk, dropping buffered text before keep_from; returns the shift.
+
+        A chunk is at least as long as the text kept, so a value spanning many chunks
+        doubles the buffer on each refill and is copied O(1) times per character overall,
+        not once per chunk.
+        """
+        chunk = self.fp.read(max(self.chunk_size, len(self.buffer) - keep_from))
+        if not chunk:
+            raise ValueError("Unexpected end of JSON stream")
+        self.buffer = self.buffer[keep_from:] + chunk
+        self.pos -= keep_from
+        self.dropped += keep_from
+        return keep_from
+
+    def _skip_whitespace(self):
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return
+            self._more(self.pos)
+
+    def _peek(self):
+        self._skip_whitespace()
+        return self.buffer[self.pos]
+
+    def _expect(self, char):
+        if self._peek() != char:
+            raise ValueError(f"Expected {char!r} at offset {self.buffer_offset()}")
+        self.pos += 1
+
+    def _read_key(self):
+        self._skip_whitespace()
+        while True:
+            match = _STRING.match(self.buffer, self.pos)
+            if match:
+                self.pos = match.end()
+                return json.loads(match.group())
+            self._more(self.pos)
+
+    def _value_end(self, keep):
+        """Return the buffer offset just past the value at self.pos.
+
+        With keep=False text that has already been scanned is dropped while reading ahead,
+        so skipping a value never holds more than one chunk.
+        """
+        start = self.pos
+        first = self.buffer[start]
+        if first == '"':
+            while True:
+                match = _STRING.match(self.buffer, self.pos)
+                if match:
+                    return match.end()
+                self._more(self.pos)
+        if first not in '[{':
+            while True:
+                match = _SCALAR.match(self.buffer, self.pos)
+                if match is None:
+                    raise ValueError(f"Expected a value at offset {self.buffer_offset()}")
+                if match.end() < len(self.buffer):
+                    return match.end()
+                self._more(self.pos)
+
+        depth = 0
+        scan = self.pos
+        while True:
+            match = _CONTAINER_TOKEN.match(self.buffer, scan)
+            while match:
+                token = match.group(1)
+                if token == '"':
+                    break
+                scan = match.end()
+                if token in '[{':
+                    depth += 1
+                else:
+                    depth -= 1
+                    if depth == 0:
+                        return scan
+                match = _CONTAINER_TOKEN.match(self.buffer, scan)
+            if not keep:
+                # Everything scanned so far is dropped, the value start goes with it
+                self.pos = scan
+            scan -= self._more(self.pos)
+
+    def read_value(self):
+        """Decode and return the value at the current position."""
+        self._skip_whitespace()
+        end = self._value_end(keep=True)
+        value = json.loads(self.buffer[self.pos:end])
+        self.pos = end
+        return value
+
+    def skip_value(self):
+        """Move past the value at the current position without decoding it."""
+        self._skip_whitespace()
+        self.pos = self._value_end(keep=False)
+
+    def _close_member(self, closing):
+        char = self._peek()
+        if char != closing and char != ',':
+            raise ValueError(f"Expected ',' or {closing!r} at offset {self.buffer_offset()}")
+        self.pos += 1
+        return char == closing
+
+    def iter_object(self):
+        """Yield each key of the object at the current position."""
+        self._expect('{')
+        if self._peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self._read_key()
+            self._expect(':')
+            self._skip_whitespace()
+            start = self.buffer_offset()
+            yield key
+            if self.buffer_offset() == start:
+                self.skip_value()
+            if self._close_member('}'):
+                return
+
+    def iter_array(self):
+        """Yield the index of each item of the array at the current position."""
+        self._expect('[')
+        if self._peek() == ']':
+            self.pos += 1
+            return
+        index = 0
+        while True:
+            self._skip_whitespace()
+            start = self.buffer_offset()
+            yield index
+            if self.buffer_offset() == start:
+                self.skip_value()
+            if self._close_member(']'):
+                return
+            index += 1
+
+    def buffer_offset(self):
+        """Offset of the current position from the start of the stream."""
+        return self.dropped + self.pos
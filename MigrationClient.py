@@ -0,0 +1,48 @@
+import os
+import json
+import socket
+import struct
+import tempfile
+
+# Imported by the migrate CLI before it knows whether it converts in process, so it
+# must stay limited to the standard library
+
+
+def default_socket_path():
+    """The socket in $XDG_RUNTIME_DIR, else in a folder of the temporary folder private to this user."""
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir and os.path.isdir(runtime_dir):
+        return os.path.join(runtime_dir, "qlik-migrate.sock")
+    return os.path.join(tempfile.gettempdir(), f"qlik-migrate-{os.getuid()}", "daemon.sock")
+
+
+def check_peer(client, socket_path):
+    """Raise PermissionError unless the daemon behind client runs as this user."""
+    if hasattr(socket, 'SO_PEERCRED'):
+        _, uid, _ = struct.unpack('3i', client.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED,
+                                                          struct.calcsize('3i')))
+    else:
+        uid = os.stat(socket_path).st_uid
+    if uid != os.getuid():
+        raise PermissionError(f"{socket_path} is served by another user (uid {uid})")
+
+
+def submit(request, socket_path=None, timeout=None):
+    """Send one request dict to a running daemon and return its response dict.
+
+    Raises OSError (FileNotFoundError, ConnectionRefusedError) when no daemon listens
+    on socket_path, PermissionError when the daemon is another user's, before the
+    request is sent.
+    """
+    socket_path = socket_path or default_socket_path()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(socket_path)
+        check_peer(client, socket_path)
+        with client.makefile('rwb') as stream:
+            stream.write(json.dumps(request).encode('utf-8') + b'\n')
+            stream.flush()
+            line = stream.readline()
+    if not line:
+        raise ConnectionError("The migration daemon closed the connection without answering")
+    return json.loads(line)
@@ -0,0 +1,139 @@
+import os
+import sys
+import json
+import time
+import traceback
+import socketserver
+
+# The common layer modules import each other as top-level modules
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "common_layer"))
+
+from Pipeline import Pipeline
+from QVFJsonSimplifier import LibraryPool
+from ColumnCatalog import DatasourceCache
+from SheetSelection import SheetSelection
+from dictionary.mapping_registry import default_registry
+from MigrationClient import default_socket_path, submit
+
+
+class JobHandler(socketserver.StreamRequestHandler):
+    """One connection: a JSON request line in, a JSON response line out."""
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            request = json.loads(line)
+        except ValueError:
+            response = {"status": "failed", "error": "Request is not a JSON line"}
+        else:
+            response = self.server.daemon.handle(request)
+        self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+
+
+class MigrationDaemon:
+    """Converts apps sent over a Unix socket in one long-lived process.
+
+    Modules, compiled patterns and the mapping tables are loaded once, and a LibraryPool
+    and DatasourceCache keep master item libraries and datasource catalogs parsed between
+    jobs, re-reading a file only when its mtime or size changes.  Jobs run one at a time
+    in the order they connect.  Requests are one JSON object per line:
+    {"command": "convert", "app": ..., "datasource": ..., "output": ..., ...},
+    {"command": "ping"} or {"command": "shutdown"}; paths must be absolute.
+    """
+
+    def __init__(self, socket_path=None, max_apps=64):
+        self.socket_path = socket_path or default_socket_path()
+        self.library_pool = LibraryPool(max_apps)
+        self.datasource_cache = DatasourceCache()
+        self.jobs = 0
+        self.stopping = False
+        default_registry()
+
+    def convert(self, request):
+        selection = SheetSelection(**request.get("selection", {}))
+        pipeline = Pipeline(request["datasource"], stream=request.get("stream", False),
+                            pretty_json=request.get("pretty_json", False), read_ahead=request.get("read_ahead", 0),
+                            selection=selection, library_pool=self.library_pool,
+                            datasource_cache=self.datasource_cache, sheet_workers=request.get("sheet_workers", 0))
+        pipeline.run(request["app"], request["output"], request.get("json"), pretty=request.get("pretty", True))
+        return {"stage_times": pipeline.stage_times, "missing_library_items": pipeline.missing_library_items}
+
+    def handle(self, request):
+        """Run one request and return its response dict; failures are reported, not raised."""
+        started = time.perf_counter()
+        command = request.get("command")
+        try:
+            if command == "convert":
+                response = self.convert(request)
+                self.jobs += 1
+            elif command == "ping":
+                response = {"pid": os.getpid(), "jobs": self.jobs, "cached_apps": len(self.library_pool),
+                            "cached_datasources": len(self.datasource_cache)}
+            elif command == "shutdown":
+                self.stopping = True
+                response = {}
+            else:
+                return {"status": "failed", "error": f"Unknown command {command!r}"}
+        except Exception as e:
+            return {"status": "failed", "error": f"{type(e).__name__}: {e}", "traceback": traceback.format_exc()}
+        response["status"] = "ok"
+        response["elapsed"] = time.perf_counter() - started
+        return response
+
+    def make_socket_dir(self):
+        """Create the default socket's folder private to this user; RuntimeError when someone else owns it."""
+        folder = os.path.dirname(self.socket_path)
+        os.makedirs(folder, mode=0o700, exist_ok=True)
+        stat = os.stat(folder)
+        if stat.st_uid != os.getuid() or stat.st_mode & 0o077:
+            raise RuntimeError(f"{folder} is not private to this user; remove it or choose a path with --socket")
+
+    def remove_stale_socket(self):
+        """Remove a socket no daemon listens on; RuntimeError when it is in use or not ours."""
+        if not os.path.exists(self.socket_path):
+            return
+        try:
+            submit({"command": "ping"}, self.socket_path, timeout=1)
+        except PermissionError:
+            raise RuntimeError(f"{self.socket_path} belongs to another user; choose another path with --socket")
+        except OSError:
+            try:
+                os.remove(self.socket_path)
+            except PermissionError:
+                raise RuntimeError(f"Cannot remove the stale socket {self.socket_path}; "
+                                   f"choose another path with --socket")
+        else:
+            raise RuntimeError(f"A migration daemon is already listening on {self.socket_path}")
+
+    def serve(self):
+        """Accept jobs until a shutdown request; the socket is only accessible to this user."""
+        if self.socket_path == default_socket_path():
+            self.make_socket_dir()
+        self.remove_stale_socket()
+        previous_umask = os.umask(0o077)
+        try:
+            server = socketserver.UnixStreamServer(self.socket_path, JobHandler)
+        finally:
+            os.umask(previous_umask)
+        server.daemon = self
+        try:
+            with server:
+                while not self.stopping:
+                    server.handle_request()
+        finally:
+            os.remove(self.socket_path)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve Qlik to Tableau conversions over a Unix socket.")
+    parser.add_argument('--socket', default=None, help=f"socket path (default: {default_socket_path()})")
+    parser.add_argument('--max-apps', type=int, default=64, help="apps whose master item libraries stay cached")
+    args = parser.parse_args()
+    try:
+        MigrationDaemon(args.socket, args.max_apps).serve()
+    except RuntimeError as e:
+        sys.exit(str(e))
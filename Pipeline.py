@@ -0,0 +1,220 @@
+import os
+import sys
+import time
+import tempfile
+
+# The common layer modules import each other as top-level modules
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "common_layer"))
+
+import JsonBackend
+from QVFJsonSimplifier import QVFJsonSimplifier
+from SheetSelection import SheetSelection
+from QlikToCommonConverter import commonConverter
+from CommonLayerStore import CommonLayerStore, atomic_write
+from CommonToTableauDatasource import CommonToTableauDatasource
+from CommonToTableauConverter import commonToTableauConverter
+
+# Intermediate artifacts, written only when the pipeline has an artifacts_dir
+SIMPLIFIED_VIEW_FILE = 'simplified_view.json'
+COMMON_LAYER_FILE = 'common_layer.json'
+# CommonLayerStore folder written instead of COMMON_LAYER_FILE with common_layer_store=True
+COMMON_LAYER_STORE = 'common_layer'
+
+
+def sheet_workers_conflict(sheet_workers, stream=False, read_ahead=0, metrics=None):
+    """Name the option sheet_workers cannot run with, or None; the CLIs check it before starting.
+
+    metrics is a StageMetrics, or True when one will be used.
+    """
+    if sheet_workers <= 1:
+        return None
+    if stream:
+        return "stream"
+    if read_ahead:
+        return "read_ahead"
+    if metrics and getattr(metrics, 'enabled', True):
+        return "metrics"
+    return None
+
+
+class Pipeline:
+    """Qlik app folder -> simplified view -> common layer -> Tableau workbook, in memory.
+
+    Each stage hands its result to the next one as Python objects instead of a JSON
+    file.  Give an artifacts_dir to also write simplified_view.json and common_layer.json
+    there for debugging.  stream=True parses the sheet files incrementally; the
+    simplified view then goes through a file (a temporary one without artifacts_dir).
+    Artifacts are compact JSON unless pretty_json=True and are replaced atomically, so a
+    crashed run never leaves a truncated one; common_layer_store=True writes the common
+    layer as a sharded CommonLayerStore folder instead of common_layer.json.  read_ahead=N reads up to N
+    object files concurrently, for apps on network shares (not with stream=True).
+    A SheetSelection as selection converts only the sheets and objects it picks.
+    Long-lived processes pass a shared LibraryPool and DatasourceCache, so master item
+    libraries and datasource files are only parsed again when they change.
+    sheet_workers=N converts the sheets of an app on N forked processes (see
+    SheetParallel; only where fork is available).  The workers record no metrics and do
+    not read ahead, so sheet_workers > 1 with stream, read_ahead or metrics is a ValueError.
+    stage_times holds the wall time of each stage of the last run (prepare / sheets /
+    merge with sheet workers); pass a StageMetrics as metrics for per-sheet timings,
+    byte and object counts.
+    """
+
+    def __init__(self, datasource_path, cache=None, artifacts_dir=None, stream=False, metrics=None,
+                 pretty_json=False, read_ahead=0, selection=None, library_pool=None, datasource_cache=None,
+                 sheet_workers=0, common_layer_store=False):
+        conflict = sheet_workers_conflict(sheet_workers, stream, read_ahead, metrics)
+        if conflict:
+            raise ValueError(f"sheet_workers={sheet_workers} cannot be combined with {conflict}")
+        self.datasource_path = datasource_path
+        self.cache = cache
+        self.artifacts_dir = artifacts_dir
+        self.stream = stream
+        self.metrics = metrics
+        self.pretty_json = pretty_json
+        self.selection = selection
+        self.datasource_cache = datasource_cache
+        self.sheet_workers = sheet_workers
+        self.common_layer_store = common_layer_store
+        self.simplifier = QVFJsonSimplifier(cache, metrics, read_ahead, selection=selection, library_pool=library_pool)
+        self.stage_times = {}
+
+    def artifact_path(self, file_name):
+        if self.artifacts_dir is None:
+            return None
+        os.makedirs(self.artifacts_dir, exist_ok=True)
+        return os.path.join(self.artifacts_dir, file_name)
+
+    def write_artifact(self, file_name, data):
+        path = self.artifact_path(file_name)
+        if path is not None:
+            atomic_write(path, JsonBackend.dumpb(data, self.pretty_json))
+
+    def write_common_layer(self, common_layer):
+        if self.artifacts_dir is None:
+            return
+        if self.common_layer_store:
+            CommonLayerStore(self.artifact_path(COMMON_LAYER_STORE), self.pretty_json).write_workbook(common_layer)
+        else:
+            self.write_artifact(COMMON_LAYER_FILE, common_layer)
+
+    def simplify(self, app_path):
+        """Return the simplified view of the app, as QVFJsonSimplifier.simplify_json builds it.
+
+        With stream=True the view is still loaded whole at the end; run() instead hands
+        the streamed view on sheet by sheet (see simplify_to_file).
+        """
+        if not self.stream:
+            simplified = self.simplifier.simplify_json(app_path)
+            self.write_artifact(SIMPLIFIED_VIEW_FILE, simplified)
+            return simplified
+        path = self.simplify_to_file(app_path)
+        try:
+            return JsonBackend.load_file(path)
+        finally:
+            if self.artifacts_dir is None:
+                os.remove(path)
+
+    def simplify_to_file(self, app_path):
+        """Stream the simplified view to a file and return its path.
+
+        The file is the simplified_view.json artifact, moved into place once complete,
+        or a temporary file the caller removes when there is no artifacts_dir.
+        """
+        path = self.artifact_path(SIMPLIFIED_VIEW_FILE)
+        fd, temp_path = tempfile.mkstemp(suffix='.json', dir=self.artifacts_dir)
+        try:
+            with os.fdopen(fd, 'w') as fp:
+                self.simplifier.simplify_json_stream(app_path, fp)
+            if path is None:
+                return temp_path
+            os.replace(temp_path, path)
+            return path
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    def to_common(self, simplified):
+        return commonConverter(cache=self.cache, data=simplified, metrics=self.metrics,
+                               selection=self.selection).qlik_to_common()
+
+    def to_common_streamed(self, simplified_path):
+        """to_common over a simplified view file, read and converted one sheet at a time."""
+        rest = {}
+        with open(simplified_path, 'r', encoding='utf-8') as fp:
+            converter = commonConverter(cache=self.cache, data=rest, metrics=self.metrics, selection=self.selection)
+            return converter.qlik_to_common(QVFJsonSimplifier.iter_simplified_view(fp, rest))
+
+    def attach_datasource(self, common_layer):
+        """Add the Tableau datasource name, caption and columns to the common layer in place."""
+        common_layer = CommonToTableauDatasource(None, self.datasource_path, common_layer, self.metrics,
+                                                 datasource_cache=self.datasource_cache).run_conversion()
+        self.write_common_layer(common_layer)
+        return common_layer
+
+    def to_tableau(self, common_layer, xml_output_path, json_output_path=None, pretty=True):
+        """Write the Tableau workbook XML and, with a json_output_path, its JSON mirror."""
+        converter = commonToTableauConverter(None, json_output_path, xml_output_path, self.metrics)
+        converter.convert(pretty=pretty, write_json=json_output_path is not None, common_layer=common_layer,
+                          pretty_json=self.pretty_json)
+
+    def timed(self, stage, function, *args, **kwargs):
+        started = time.perf_counter()
+        result = function(*args, **kwargs)
+        self.stage_times[stage] = time.perf_counter() - started
+        return result
+
+    def run(self, app_path, xml_output_path, json_output_path=None, pretty=True):
+        """Run all four stages for one app; returns the common layer with its datasource section."""
+        self.stage_times = {}
+        if self.sheet_workers > 1:
+            import SheetParallel
+            if SheetParallel.fork_available():
+                return SheetParallel.run_parallel(self, app_path, xml_output_path, json_output_path, pretty)
+        if self.stream:
+            # The simplified view is never held whole: it goes to a file and back sheet by sheet
+            simplified_path = self.timed("simplify", self.simplify_to_file, app_path)
+            try:
+                common_layer = self.timed("common_layer", self.to_common_streamed, simplified_path)
+            finally:
+                if self.artifacts_dir is None:
+                    os.remove(simplified_path)
+        else:
+            simplified = self.timed("simplify", self.simplify, app_path)
+            common_layer = self.timed("common_layer", self.to_common, simplified)
+        common_layer = self.timed("datasource", self.attach_datasource, common_layer)
+        self.timed("tableau", self.to_tableau, common_layer, xml_output_path, json_output_path, pretty)
+        return common_layer
+
+    @property
+    def missing_library_items(self):
+        return self.simplifier.missing_library_items
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Migrate one unbuilt Qlik app to a Tableau workbook.")
+    parser.add_argument('app', help="unbuilt app folder (objects/ + script.qvs)")
+    parser.add_argument('datasource', help="Tableau datasource XML")
+    parser.add_argument('-o', '--output', default='tableau-result.xml', help="workbook XML to write")
+    parser.add_argument('--json', default=None, help="also write the worksheets as JSON to this file")
+    parser.add_argument('--artifacts', default=None,
+                        help="write simplified_view.json and common_layer.json to this folder")
+    parser.add_argument('--store', action='store_true',
+                        help="with --artifacts, write the common layer as a sharded store folder")
+    parser.add_argument('--stream', action='store_true', help="parse sheet files incrementally")
+    parser.add_argument('--read-ahead', type=int, default=0, metavar='N',
+                        help="read up to N object files concurrently, for apps on network shares")
+    parser.add_argument('--sheet-workers', type=int, default=0, metavar='N',
+                        help="convert the sheets on N processes, for apps with many sheets")
+    SheetSelection.add_arguments(parser)
+    args = parser.parse_args()
+    conflict = sheet_workers_conflict(args.sheet_workers, args.stream, args.read_ahead)
+    if conflict:
+        parser.error(f"--sheet-workers cannot be combined with --{conflict.replace('_', '-')}")
+
+    pipeline = Pipeline(args.datasource, artifacts_dir=args.artifacts, stream=args.stream,
+                        read_ahead=args.read_ahead, selection=SheetSelection.from_args(args),
+                        sheet_workers=args.sheet_workers, common_layer_store=args.store)
+    pipeline.run(args.app, args.output, args.json)
+    print(", ".join(f"{stage} {elapsed:.3f}s" for stage, elapsed in pipeline.stage_times.items()))
@@ -1,66 +1,400 @@
+import io
 import os
-import json
-import re
+import sys
+import hashlib
+from collections import OrderedDict
 
-class QVFJsonSimplifier:
-    # Define constant templates as class variables
-    OBJ_TEMPLATE = {
-        "sheet_object_info": {
-            "ObjectId": None,
-            "Caption": None,
-            "Type": None
-        },
-        "dimension": [],
-        "expression": []
-    }
-
-    SIMPLIFIED_DATA_TEMPLATE = {
-        "Document": {
-            "sheet_info": {},
-            "sheet_objects": []
+# Shared helpers live in common_layer, next to the converters that use them
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "common_layer"))
+
+import JsonBackend
+from StageMetrics import NULL_METRICS
+from ReadAhead import ReadAhead
+from SheetSelection import SELECT_ALL
+from JsonStreamReader import JsonStreamReader
+from QlikScriptIndexer import QlikScriptIndexer
+
+class MasterItemLibrary:
+    """qId-keyed index over a dimensions.json / measures.json master item list."""
+
+    def __init__(self, items):
+        # qId -> [(position in file, item)], the position keeps lookups in file order
+        self.index = {}
+        for position, item in enumerate(items):
+            self.index.setdefault(item["qInfo"]["qId"], []).append((position, item))
+
+    @classmethod
+    def from_file(cls, path):
+        return cls(JsonBackend.load_file(path))
+
+    def lookup(self, item_ids, missing=None):
+        """Return the items for item_ids in file order; unknown ids are appended to missing."""
+        found = []
+        for item_id in item_ids:
+            entries = self.index.get(item_id)
+            if entries:
+                found.extend(entries)
+            elif missing is not None:
+                missing.append(item_id)
+        found.sort(key=lambda entry: entry[0])
+        return [item for _, item in found]
+
+
+class AppLibraries:
+    """The master item libraries of one app's objects folder, each indexed on first use.
+
+    begin() starts a conversion of the app: the first access to each library then checks
+    the file's mtime and size and only re-reads it when it changed since it was indexed.
+    """
+    __slots__ = ('folder_path', 'libraries', 'checked')
+
+    def __init__(self, folder_path):
+        self.folder_path = folder_path
+        # file name -> ((mtime, size), MasterItemLibrary, sha256 of the file)
+        self.libraries = {}
+        self.checked = set()
+
+    def begin(self):
+        self.checked = set()
+
+    def entry(self, file_name, read):
+        entry = self.libraries.get(file_name)
+        if file_name not in self.checked:
+            path = os.path.join(self.folder_path, file_name)
+            stat = os.stat(path)
+            signature = (stat.st_mtime_ns, stat.st_size)
+            if entry is None or entry[0] != signature:
+                raw = read(path)
+                entry = self.libraries[file_name] = (signature, MasterItemLibrary(JsonBackend.loads(raw)),
+                                                     hashlib.sha256(raw).hexdigest())
+            self.checked.add(file_name)
+        return entry
+
+    def get(self, file_name, read):
+        return self.entry(file_name, read)[1]
+
+    def digest(self, file_name, read):
+        """sha256 of the bytes the library was indexed from."""
+        return self.entry(file_name, read)[2]
+
+
+class LibraryPool:
+    """AppLibraries keyed by app objects folder, least recently used dropped past max_apps."""
+
+    def __init__(self, max_apps=16):
+        self.max_apps = max_apps
+        self.apps = OrderedDict()
+
+    def get(self, folder_path):
+        key = os.path.abspath(folder_path)
+        libraries = self.apps.pop(key, None)
+        if libraries is None:
+            libraries = AppLibraries(key)
+        self.apps[key] = libraries
+        while len(self.apps) > self.max_apps:
+            self.apps.popitem(last=False)
+        return libraries
+
+    def __len__(self):
+        return len(self.apps)
+
+
+class SheetObject:
+    """Simplified sheet object; to_dict gives the simplified_view.json layout."""
+    __slots__ = ('object_id', 'caption', 'type', 'dimension', 'expression')
+
+    def __init__(self, object_id, caption, obj_type):
+        self.object_id = object_id
+        self.caption = caption
+        self.type = obj_type
+        self.dimension = []
+        self.expression = []
+
+    def to_dict(self):
+        return {
+            "sheet_object_info": {
+                "ObjectId": self.object_id,
+                "Caption": self.caption,
+                "Type": self.type
+            },
+            "dimension": self.dimension,
+            "expression": self.expression
         }
-    }
+
+
+class SimplifiedSheet:
+    """Simplified sheet; to_dict gives the simplified_view.json layout."""
+    __slots__ = ('sheet_info', 'sheet_objects')
 
     def __init__(self):
-        self.dimensions_data = None
-        self.measures_data = None
+        self.sheet_info = {}
+        self.sheet_objects = []
+
+    def to_dict(self):
+        return {
+            "Document": {
+                "sheet_info": self.sheet_info,
+                "sheet_objects": [obj.to_dict() for obj in self.sheet_objects]
+            }
+        }
+
+
+class QVFJsonSimplifier:
+    def __init__(self, cache=None, metrics=None, read_ahead=0, max_apps=16, selection=None, library_pool=None):
+        # Optional ConversionCache; unchanged sheets are then served from it
+        self.cache = cache
+        # Optional StageMetrics recording the "simplify" stage per sheet
+        self.metrics = metrics or NULL_METRICS
+        # simplify_json reads up to this many files concurrently (0: one at a time), which
+        # hides per-file latency on network shares; sheets are still processed in order
+        self.read_ahead = read_ahead
+        self.reader = None
+        # Optional SheetSelection; other sheets are skipped after reading their header, other
+        # objects before their libraries are looked up
+        self.selection = selection or SELECT_ALL
+        # Libraries of the app being converted, from a pool shared by the apps this instance
+        # converts (or by every simplifier given the same library_pool); module-level state
+        # (regexes, mapping tables) stays warm across apps anyway
+        self.library_pool = library_pool if library_pool is not None else LibraryPool(max_apps)
+        self.libraries = None
+        self.missing_library_items = []
 
     def filter_json_files(self, folder_path):
-        files = os.listdir(folder_path)
+        # Sorted, so the sheet order does not depend on the file system's listing order
+        files = sorted(os.listdir(folder_path))
         return [file for file in files if file.endswith('.json') and 'sheet' in file]
 
+    def read_bytes(self, path):
+        """Return the contents of path; every file simplify_json reads goes through here."""
+        with open(path, 'rb') as file:
+            return file.read()
+
+    def fetch(self, path):
+        """Return the contents of path, from the read-ahead when one is running."""
+        if self.reader is not None:
+            return self.reader.get(path)
+        return self.read_bytes(path)
+
     def simplify_json(self, folder_path):
-        folder_path = os.path.join(folder_path, "objects")
-        files = [file for file in os.listdir(folder_path) if file.endswith('.json') and 'sheet' in file]
-        result = {"ws_sheets": {}, "data_sources": []} 
-        for file_name in files:
-            with open(os.path.join(folder_path, file_name), 'r') as f:
-                data = json.load(f)
-                simplified_data = self.simplified_view(data, folder_path)
-                result['ws_sheets'][file_name] = simplified_data
-                
-        self.integrate_datasource(folder_path, result)
-        return result
+        with self.metrics.stage("simplify"):
+            folder_path = os.path.join(folder_path, "objects")
+            files = self.filter_json_files(folder_path)
+            result = {"ws_sheets": {}, "data_sources": []} 
+            self.open_app(folder_path)
+            if self.read_ahead:
+                self.reader = ReadAhead(self.read_bytes, self.read_ahead)
+                # The libraries are needed by the first sheet that uses them, the script only at the end
+                self.reader.prefetch(os.path.join(folder_path, 'dimensions.json'))
+                self.reader.prefetch(os.path.join(folder_path, 'measures.json'))
+                self.reader.schedule([os.path.join(folder_path, file_name) for file_name in files] +
+                                     [os.path.join(folder_path, "../script.qvs")])
+            try:
+                if self.cache is not None:
+                    library_digest = self.library_digest(folder_path)
+                    result["sheet_digests"] = {}
+                for file_name in files:
+                    sheet_path = os.path.join(folder_path, file_name)
+                    # With a read-ahead the file is fetched anyway, otherwise only its head is read
+                    raw = self.fetch(sheet_path) if self.reader is not None and self.selection.filters_sheets else None
+                    if not self.sheet_selected(sheet_path, raw):
+                        continue
+                    with self.metrics.sheet(file_name):
+                        if self.cache is not None:
+                            digest, result['ws_sheets'][file_name] = self.cached_simplified_view(sheet_path, folder_path, library_digest, raw)
+                            result["sheet_digests"][file_name] = digest
+                            continue
+                        if raw is None:
+                            raw = self.fetch(sheet_path)
+                        self.metrics.add("bytes_read", len(raw))
+                        simplified_data = self.simplified_view(JsonBackend.loads(raw), folder_path)
+                        result['ws_sheets'][file_name] = simplified_data.to_dict()
+
+                self.integrate_datasource(folder_path, result)
+            finally:
+                if self.reader is not None:
+                    self.reader.close()
+                    self.reader = None
+            result["missing_library_items"] = self.missing_library_items
+            return result
+
+    def cached_simplified_view(self, sheet_path, folder_path, library_digest, raw=None):
+        """Return (digest, simplified sheet dict), keyed on the sheet file, library contents and object selection."""
+        if raw is None:
+            raw = self.fetch(sheet_path)
+        self.metrics.add("bytes_read", len(raw))
+        if self.selection.filters_objects:
+            digest = self.cache.key(library_digest, self.selection.object_key(), raw)
+        else:
+            digest = self.cache.key(library_digest, raw)
+        cached = self.cache.get("simplify", digest)
+        self.metrics.add("cache_misses" if cached is None else "cache_hits")
+        if cached is None:
+            first_missing = len(self.missing_library_items)
+            sheet = self.simplified_view(JsonBackend.loads(raw), folder_path).to_dict()
+            cached = {"sheet": sheet, "missing_library_items": self.missing_library_items[first_missing:]}
+            self.cache.put("simplify", digest, cached)
+        else:
+            self.missing_library_items.extend(cached["missing_library_items"])
+        return digest, cached["sheet"]
+
+    def simplify_json_stream(self, folder_path, fp):
+        """Streaming variant of simplify_json that writes the result to fp as it is produced.
+
+        Sheet files are read incrementally and only one sheet object is held at a time.
+        The structure matches simplify_json, except that each sheet's sheet_info is
+        written after its sheet_objects because the child ids are only complete then.
+        """
+        with self.metrics.stage("simplify"):
+            folder_path = os.path.join(folder_path, "objects")
+            self.open_app(folder_path)
+            fp.write('{"ws_sheets": {')
+            written = 0
+            for file_name in self.filter_json_files(folder_path):
+                sheet_path = os.path.join(folder_path, file_name)
+                if not self.sheet_selected(sheet_path):
+                    continue
+                with self.metrics.sheet(file_name):
+                    if written:
+                        fp.write(',')
+                    written += 1
+                    fp.write('\n' + JsonBackend.dumps(file_name) + ': {"Document": {"sheet_objects": [')
+                    sheet_info = {"SheetId": "", "Title": "", "ChildObjects": {"ObjectId": []}}
+                    if self.metrics.enabled:
+                        self.metrics.add("bytes_read", os.path.getsize(sheet_path))
+                    for obj_index, obj in enumerate(self.iter_sheet_objects(sheet_path, folder_path, sheet_info)):
+                        fp.write(',\n' if obj_index else '\n')
+                        fp.write(JsonBackend.dumps(obj.to_dict()))
+                    fp.write('\n], "sheet_info": ' + JsonBackend.dumps(sheet_info) + '}}')
+
+            result = {"data_sources": []}
+            self.integrate_datasource(folder_path, result)
+            result["missing_library_items"] = self.missing_library_items
+            fp.write('\n}')
+            for key, value in result.items():
+                fp.write(', ' + JsonBackend.dumps(key) + ': ' + JsonBackend.dumps(value))
+            fp.write('}\n')
+
+    @staticmethod
+    def iter_simplified_view(fp, rest):
+        """Yield (sheet name, sheet) of a simplified view file, decoding one sheet at a time.
+
+        The file's other top-level members (data_sources, load_statements, ...) are stored
+        in rest as they are read; those simplify_json_stream writes after the sheets are
+        only there once the generator is exhausted.
+        """
+        reader = JsonStreamReader(fp)
+        for key in reader.iter_object():
+            if key == "ws_sheets":
+                for sheet_name in reader.iter_object():
+                    yield sheet_name, reader.read_value()
+            else:
+                rest[key] = reader.read_value()
+
+    def iter_sheet_objects(self, sheet_path, folder_path, sheet_info):
+        """Yield the simplified objects of one sheet file, decoding only the qProperty subtrees.
+
+        sheet_info is filled in from the sheet's own qProperty and the ids of the children seen.
+        """
+        with open(sheet_path, 'r') as f:
+            reader = JsonStreamReader(f)
+            for key in reader.iter_object():
+                if key == "qProperty":
+                    sheet_property = reader.read_value()
+                    sheet_info["SheetId"] = sheet_property.get("qInfo", {}).get("qId", "")
+                    sheet_info["Title"] = sheet_property.get("qMetaDef", {}).get("title", "")
+                elif key == "qChildren":
+                    for _ in reader.iter_array():
+                        child = {}
+                        for child_key in reader.iter_object():
+                            if child_key == "qProperty":
+                                child["qProperty"] = reader.read_value()
+                        if not self.child_selected(child):
+                            continue
+                        obj = self.simplify_child(child, folder_path)
+                        sheet_info["ChildObjects"]["ObjectId"].append(obj.object_id)
+                        yield obj
+
+    def read_sheet_header(self, source):
+        """Return the qProperty of a sheet file (a binary file object) without decoding its children."""
+        reader = JsonStreamReader(io.TextIOWrapper(source, encoding='utf-8'), chunk_size=1 << 16)
+        for key in reader.iter_object():
+            if key == "qProperty":
+                return reader.read_value()
+        return {}
+
+    def sheet_selected(self, sheet_path, raw=None):
+        """Check a sheet against the selection by its header; raw is the file when already read."""
+        if not self.selection.filters_sheets:
+            return True
+        if raw is not None:
+            header = self.read_sheet_header(io.BytesIO(raw))
+        else:
+            with open(sheet_path, 'rb') as f:
+                header = self.read_sheet_header(f)
+        return self.selection.match_sheet(header.get("qInfo", {}).get("qId", ""),
+                                          header.get("qMetaDef", {}).get("title", ""))
+
+    def child_selected(self, child):
+        if not self.selection.filters_objects:
+            return True
+        qInfo = child.get("qProperty", {}).get("qInfo", {})
+        return self.selection.match_object(qInfo.get("qId", ""), qInfo.get("qType", ""))
+
+    def open_app(self, folder_path):
+        """Switch to the app in folder_path: its pooled libraries and a fresh missing item list."""
+        self.libraries = self.library_pool.get(folder_path)
+        self.libraries.begin()
+        self.missing_library_items = []
+
+    def get_library(self, folder_path, file_name):
+        if self.libraries is None or self.libraries.folder_path != os.path.abspath(folder_path):
+            # Not opened with open_app: a pooled app may have been indexed by an earlier
+            # conversion, so its files are checked for changes again
+            self.libraries = self.library_pool.get(folder_path)
+            self.libraries.begin()
+        return self.libraries.get(file_name, self.fetch)
+
+    def library_digest(self, folder_path):
+        """Cache key part for the app's master item libraries; a missing library counts as empty.
+
+        Taken from the bytes get_library indexes, so the libraries are not read again for it.
+        """
+        digests = []
+        for file_name in ('dimensions.json', 'measures.json'):
+            try:
+                self.get_library(folder_path, file_name)
+                digests.append(self.libraries.digest(file_name, self.fetch))
+            except FileNotFoundError:
+                digests.append("")
+        return ",".join(digests)
+
+    def report_missing(self, obj, kind, item_ids):
+        for item_id in item_ids:
+            self.missing_library_items.append({
+                "ObjectId": obj.object_id,
+                "Type": kind,
+                "qLibraryId": item_id
+            })
     
     def integrate_datasource(self, folder_path, result):
         script_path = os.path.join(folder_path, "../script.qvs")  # Assuming script.qvs is one level up from the objects folder
-        with open(script_path, 'r') as f:
-            content = f.read()
-
-        # Regex to extract the last string after "FROM" and before the file extension within square brackets
-        matches = re.findall(r"FROM \[.*[\/\\]([^\/\\]+)\.\w+\]", content)
-        for match in matches:
-            result["data_sources"].append(match)  # Append each found data source name to the result
+        indexer = QlikScriptIndexer()
+        statements = indexer.index_bytes(self.fetch(script_path))
+        for statement in statements:
+            # data_sources keeps the file name of every file the script loads from
+            if statement.source_stem:
+                result["data_sources"].append(statement.source_stem)
+        result["load_statements"] = [statement.to_dict() for statement in statements]
+        result["script_includes"] = indexer.includes
 
     def simplified_view(self, data, folder_path):
-        # Create a new instance of simplified data from the template
-        simplified_data = json.loads(json.dumps(self.SIMPLIFIED_DATA_TEMPLATE))
+        simplified_data = SimplifiedSheet()
         self.populate_sheet_info(data, simplified_data)
         self.process_sheet_objects(data, simplified_data, folder_path)
         return simplified_data
 
     def populate_sheet_info(self, data, simplified_data):
-        simplified_data["Document"]["sheet_info"] = {
+        simplified_data.sheet_info = {
             "SheetId": data.get("qProperty", {}).get("qInfo", {}).get("qId", ""),
             "Title": data.get("qProperty", {}).get("qMetaDef", {}).get("title", ""),
             "ChildObjects": {"ObjectId": []}
@@ -69,14 +403,19 @@ class QVFJsonSimplifier:
     def process_sheet_objects(self, data, simplified_data, folder_path):
         if "qChildren" in data:
             for child in data["qChildren"]:
-                self.process_child(child, simplified_data, folder_path)
+                if self.child_selected(child):
+                    self.process_child(child, simplified_data, folder_path)
 
     def process_child(self, child, simplified_data, folder_path):
+        obj = self.simplify_child(child, folder_path)
+        simplified_data.sheet_info["ChildObjects"]["ObjectId"].append(obj.object_id)
+        simplified_data.sheet_objects.append(obj)
+
+    def simplify_child(self, child, folder_path):
         qInfo = child.get("qProperty", {}).get("qInfo", {})
         objectId = qInfo.get("qId", "")
-        simplified_data["Document"]["sheet_info"]["ChildObjects"]["ObjectId"].append(objectId)
-
         obj = self.get_new_obj(objectId, child.get("qProperty", {}).get("title", ""), qInfo.get("qType", ""))
+        self.metrics.add("objects")
         hypercube_def = child.get("qProperty", {}).get("qHyperCubeDef", {})
         dimensions = hypercube_def.get("qDimensions", [])
         dimension_ids = [d.get("qLibraryId") for d in dimensions if "qLibraryId" in d]
@@ -91,51 +430,37 @@ class QVFJsonSimplifier:
             self.integrate_measures(obj, folder_path,measure_ids)
         else:
             self.process_measure(child, obj)
-
-        simplified_data["Document"]["sheet_objects"].append(obj)
+        return obj
 
     def get_new_obj(self, objectId, caption, obj_type):
-        new_obj = json.loads(json.dumps(self.OBJ_TEMPLATE))  # Deep copy the template
-        new_obj['sheet_object_info']['ObjectId'] = objectId
-        new_obj['sheet_object_info']['Caption'] = caption
-        new_obj['sheet_object_info']['Type'] = obj_type
-        return new_obj
+        return SheetObject(objectId, caption, obj_type)
 
     def integrate_dimensions(self, obj, folder_path, dimension_ids):
-        if not self.dimensions_data:
-            dimensions_path = os.path.join(folder_path, 'dimensions.json')
-            with open(dimensions_path, 'r') as file:
-                self.dimensions_data = json.load(file)
-        for dimension in self.dimensions_data:
-            for dimension_id in dimension_ids:
-                if dimension["qInfo"]["qId"] == dimension_id:
-                    obj["dimension"].append({
-                        "Definition": dimension["qDim"].get("qFieldDefs", [""]),
-                        "Label": dimension["qDim"].get("qFieldLabels", [""]),
-                        "LabelExpression": dimension["qDim"].get("qLabelExpression", "")
-                    })
-            
-               
+        missing = []
+        for dimension in self.get_library(folder_path, 'dimensions.json').lookup(dimension_ids, missing):
+            obj.dimension.append({
+                "Definition": dimension["qDim"].get("qFieldDefs", [""]),
+                "Label": dimension["qDim"].get("qFieldLabels", [""]),
+                "LabelExpression": dimension["qDim"].get("qLabelExpression", "")
+            })
+        self.report_missing(obj, "dimension", missing)
+
     def integrate_measures(self, obj, folder_path, measure_ids):
-        if not self.measures_data:
-            measures_path = os.path.join(folder_path, 'measures.json')
-            with open(measures_path, 'r') as file:
-                self.measures_data = json.load(file)
-        for measure in self.measures_data:
-            for measure_id in measure_ids:
-                if measure["qInfo"]["qId"] == measure_id:
-                    obj["expression"].append({
-                        "Definition": measure["qMeasure"].get("qDef", ""),
-                        "Label": measure["qMeasure"].get("qLabel", ""),
-                        "LabelExpression": measure["qMeasure"].get("qLabelExpression", "")
-                    })
+        missing = []
+        for measure in self.get_library(folder_path, 'measures.json').lookup(measure_ids, missing):
+            obj.expression.append({
+                "Definition": measure["qMeasure"].get("qDef", ""),
+                "Label": measure["qMeasure"].get("qLabel", ""),
+                "LabelExpression": measure["qMeasure"].get("qLabelExpression", "")
+            })
+        self.report_missing(obj, "measure", missing)
 
     def process_dimension(self, child, obj):
         dimensions = child.get("qProperty", {}).get("qHyperCubeDef", {}).get("qDimensions", [])
         for dim in dimensions:
             definition = dim.get("qDef", {}).get("qFieldDefs", [""])[0]
             label = dim.get("qDef", {}).get("qFieldLabels", [""])[0]
-            obj["dimension"].append({
+            obj.dimension.append({
                 "Definition": definition,
                 "Label": label
             })
@@ -145,7 +470,7 @@ class QVFJsonSimplifier:
         for measure in measures:
             definition = measure.get("qDef", {}).get("qDef", "")
             label = measure.get("qDef", {}).get("qLabel", "")
-            obj["expression"].append({
+            obj.expression.append({
                 "Definition": definition,
                 "Label": label
             })
@@ -155,6 +480,5 @@ if __name__ == '__main__':
     simplifier = QVFJsonSimplifier()
 
     converted_data = simplifier.simplify_json(folder_path)
-    with open(folder_path + 'simplified_view.json', 'w') as fp:
-        json.dump(converted_data, fp,indent=4)
-    print(json.dumps(converted_data, indent=4))
+    JsonBackend.dump_file(converted_data, folder_path + 'simplified_view.json', pretty=True)
+    print(JsonBackend.dumps(converted_data, pretty=True))
@@ -0,0 +1,271 @@
+import io
+import os
+import re
+
+# Characters that change the scanner state; everything between them is copied as is
+SPECIAL = re.compile(r"//|/\*|\*/|[;'\"\[\]`]")
+TAB_MARKER = re.compile(r"^\s*///\$tab\s+(.*?)\s*$")
+INCLUDE = re.compile(r"\$\(\s*(?:Must_)?Include\s*=\s*([^)]*?)\s*\)", re.IGNORECASE)
+
+# Statement analysis, all anchored or bounded by keywords so none of them backtrack far
+LABEL = re.compile(r"^\s*(\[[^\]]*\]|\"[^\"]*\"|[\w.$#@]+)\s*:")
+PREFIXES = re.compile(
+    r"^\s*(?:(?:NoConcatenate|Concatenate|Join|Keep|Inner|Outer|Left|Right|Mapping|Generic|Semantic|"
+    r"Crosstable|Hierarchy|HierarchyBelongsTo|IntervalMatch|Replace|Add|Buffer|First|Sample|SQL)"
+    r"\b\s*(?:\([^()]*\)|\d+(?:\.\d+)?)?\s*)+",
+    re.IGNORECASE)
+JOIN_TARGET = re.compile(r"\b(?:Join|Keep|Concatenate)\s*\(\s*([^()]*?)\s*\)", re.IGNORECASE)
+LOAD_OR_SELECT = re.compile(r"^\s*(LOAD|SELECT)\b\s*(?:DISTINCT\b)?", re.IGNORECASE)
+# Quoted names are matched too so that a keyword inside them is passed over
+SOURCE_KEYWORD = re.compile(r"'[^']*'|\"[^\"]*\"|\[[^\]]*\]|\b(FROM|RESIDENT|INLINE|AUTOGENERATE|EXTENSION)\b",
+                            re.IGNORECASE)
+FROM_PATH = re.compile(r"\s*(\[[^\]]*\]|'[^']*'|\"[^\"]*\"|`[^`]*`|[^\s(;]+)")
+# The (txt, delimiter is ';', embedded labels, ...) format specification after a FROM path
+FORMAT_SPEC = re.compile(r"\s*\(((?:'[^']*'|\"[^\"]*\"|[^()'\"])*)\)")
+DELIMITER_IS = re.compile(r"^delimiter\s+is\s+(.+)$", re.IGNORECASE | re.DOTALL)
+HEADER_IS = re.compile(r"^header\s+is\s+(\d+)(?:\s+lines?)?$", re.IGNORECASE)
+# Named delimiters; anything else is taken literally once unquoted
+DELIMITER_NAMES = {'\\t': '\t', 'tab': '\t', 'spaces': ' ', 'space': ' '}
+ALIAS = re.compile(r"\bas\s+(\[[^\]]*\]|\"[^\"]*\"|`[^`]*`|[\w.$#@]+)\s*$", re.IGNORECASE)
+
+
+def unquote(name):
+    if name and name[0] in '["`\'' and len(name) > 1:
+        return name[1:-1]
+    return name
+
+
+def parse_file_format(spec):
+    """Dict of the options of a file format specification, e.g. "txt, delimiter is ';', no labels".
+
+    Keys: type (txt, qvd, ooxml, ... or None), delimiter (None when not given), labels
+    ("embedded", "explicit" or "none"; embedded by default), quotes ("msq", "standard"
+    or "none"; msq by default) and header_lines.
+    """
+    file_format = {"type": None, "delimiter": None, "labels": "embedded", "quotes": "msq", "header_lines": 0}
+    for option in split_top_level(spec):
+        lowered = ' '.join(option.lower().split())
+        delimiter = DELIMITER_IS.match(option)
+        header = HEADER_IS.match(lowered)
+        if delimiter:
+            value = unquote(delimiter.group(1).strip())
+            file_format["delimiter"] = DELIMITER_NAMES.get(value.lower(), value)
+        elif header:
+            file_format["header_lines"] = int(header.group(1))
+        elif lowered in ('embedded labels', 'explicit labels', 'no labels'):
+            file_format["labels"] = 'none' if lowered == 'no labels' else lowered.split()[0]
+        elif lowered in ('msq', 'no quotes'):
+            file_format["quotes"] = 'none' if lowered == 'no quotes' else 'msq'
+        elif lowered == 'standard quotes':
+            file_format["quotes"] = 'standard'
+        elif lowered in ('txt', 'fix', 'dif', 'biff', 'ooxml', 'html', 'xml', 'qvd', 'qvx', 'parquet', 'json',
+                         'kml'):
+            file_format["type"] = lowered
+    return file_format
+
+
+def split_top_level(text):
+    """Split on commas that are not inside parentheses, quotes or brackets."""
+    parts = []
+    depth = 0
+    quote = None
+    start = 0
+    for index, char in enumerate(text):
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in '\'"`':
+            quote = char
+        elif char == '[':
+            quote = ']'
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            parts.append(text[start:index])
+            start = index + 1
+    parts.append(text[start:])
+    return [part.strip() for part in parts if part.strip()]
+
+
+class LoadStatement:
+    """One LOAD / SELECT statement of a load script."""
+    __slots__ = ('table', 'kind', 'source', 'source_type', 'fields', 'start_line', 'end_line', 'tab', 'file_format')
+
+    def __init__(self, table, kind, source, source_type, fields, start_line, end_line, tab, file_format=None):
+        self.table = table
+        self.kind = kind
+        self.source = source
+        self.source_type = source_type
+        self.fields = fields
+        self.start_line = start_line
+        self.end_line = end_line
+        self.tab = tab
+        # parse_file_format of the FROM file's format specification, None without one
+        self.file_format = file_format
+
+    @property
+    def source_stem(self):
+        """File name of a file source without folder and extension, as data_sources lists it."""
+        if self.source_type != 'file':
+            return None
+        return os.path.splitext(re.split(r"[\\/]", self.source)[-1])[0]
+
+    def to_dict(self):
+        return {
+            "table": self.table,
+            "kind": self.kind,
+            "source": self.source,
+            "source_type": self.source_type,
+            "source_stem": self.source_stem,
+            "fields": self.fields,
+            "start_line": self.start_line,
+            "end_line": self.end_line,
+            "tab": self.tab,
+            "file_format": self.file_format
+        }
+
+
+class QlikScriptIndexer:
+    """Single-pass, line-oriented index of the LOAD / SELECT statements of a script.qvs.
+
+    The script is read one line at a time.  Comments are dropped and statements are
+    cut at semicolons outside quotes and brackets, so memory follows the longest
+    statement rather than the script.  Include directives are recorded, not followed.
+    """
+
+    def __init__(self):
+        self.statements = []
+        self.includes = []
+        self.tab = None
+        self._pending_label = None
+
+    def index_file(self, path):
+        with open(path, 'r', encoding='utf-8-sig', errors='replace') as file:
+            self.index_lines(file)
+        return self.statements
+
+    def index_bytes(self, data):
+        """Index a script already read into memory, decoded the way index_file reads it."""
+        return self.index_lines(io.StringIO(data.decode('utf-8-sig', errors='replace'), newline=None))
+
+    def index_lines(self, lines):
+        parts = []
+        start_line = None
+        in_block_comment = False
+        quote = None
+        for line_number, line in enumerate(lines, 1):
+            if not in_block_comment and quote is None:
+                tab = TAB_MARKER.match(line)
+                if tab:
+                    self.tab = tab.group(1)
+                    continue
+            for include in INCLUDE.finditer(line):
+                self.includes.append({"path": include.group(1), "line": line_number, "tab": self.tab})
+
+            pos = 0
+            for match in SPECIAL.finditer(line):
+                token = match.group()
+                if in_block_comment:
+                    if token == '*/':
+                        in_block_comment = False
+                        pos = match.end()
+                    continue
+                if quote is not None:
+                    if token == quote:
+                        quote = None
+                    continue
+                if token == '//':
+                    # lib:// and other URL schemes are not comments
+                    if match.start() > 0 and line[match.start() - 1] == ':':
+                        continue
+                    parts.append(line[pos:match.start()])
+                    pos = len(line)
+                    break
+                if token == '/*':
+                    parts.append(line[pos:match.start()])
+                    in_block_comment = True
+                    continue
+                if token == ';':
+                    parts.append(line[pos:match.start()])
+                    pos = match.end()
+                    if start_line is None:
+                        start_line = line_number
+                    self.add_statement(''.join(parts), start_line, line_number)
+                    parts = []
+                    start_line = None
+                    continue
+                if token in '\'"`':
+                    quote = token
+                elif token == '[':
+                    quote = ']'
+            if not in_block_comment:
+                rest = line[pos:]
+                if rest.strip() and start_line is None:
+                    start_line = line_number
+                parts.append(rest)
+        if ''.join(parts).strip():
+            self.add_statement(''.join(parts), start_line, line_number)
+        return self.statements
+
+    def add_statement(self, text, start_line, end_line):
+        label = LABEL.match(text)
+        table = None
+        if label:
+            table = unquote(label.group(1))
+            text = text[label.end():]
+        prefixes = PREFIXES.match(text)
+        if prefixes:
+            # JOIN (T) / KEEP (T) / CONCATENATE (T) add to table T
+            target = JOIN_TARGET.search(prefixes.group())
+            if target and table is None:
+                table = unquote(target.group(1))
+            text = text[prefixes.end():]
+        head = LOAD_OR_SELECT.match(text)
+        if head is None:
+            return
+        kind = head.group(1).lower()
+        body = text[head.end():]
+
+        source_keyword = None
+        for keyword in SOURCE_KEYWORD.finditer(body):
+            if keyword.group(1):
+                source_keyword = keyword
+                break
+        field_text = body[:source_keyword.start()] if source_keyword else body
+        fields = []
+        for field in split_top_level(field_text):
+            alias = ALIAS.search(field)
+            fields.append(unquote(alias.group(1) if alias else field))
+
+        source = None
+        source_type = None
+        file_format = None
+        if source_keyword:
+            keyword = source_keyword.group(1).lower()
+            if keyword == 'from':
+                path = FROM_PATH.match(body, source_keyword.end())
+                source = unquote(path.group(1)) if path else None
+                source_type = 'sql' if kind == 'select' else 'file'
+                spec = FORMAT_SPEC.match(body, path.end()) if path and source_type == 'file' else None
+                if spec:
+                    file_format = parse_file_format(spec.group(1))
+            elif keyword == 'resident':
+                path = FROM_PATH.match(body, source_keyword.end())
+                source = unquote(path.group(1)) if path else None
+                source_type = 'resident'
+            else:
+                source_type = keyword
+
+        # A preceding LOAD has no source of its own and feeds on the next statement
+        if source_type is None:
+            self._pending_label = table or self._pending_label
+        elif table is None:
+            table = self._pending_label
+            self._pending_label = None
+        else:
+            self._pending_label = None
+
+        self.statements.append(LoadStatement(table, kind, source, source_type, fields,
+                                             start_line, end_line, self.tab, file_format))
@@ -0,0 +1,68 @@
+import threading
+from collections import deque
+
+
+class ReadAhead:
+    """Reads files on a thread pool ahead of their use, for storage where latency dominates.
+
+    Scheduled paths are read in order, with at most max_in_flight reads running or
+    waiting to be collected, which also bounds the bytes held.  Prefetched paths are
+    read right away outside that window.  get(path) hands out one result, so the
+    caller keeps its own processing order while the reads overlap.
+    """
+
+    def __init__(self, read, max_in_flight=8):
+        # Imported here, most runs never read ahead
+        from concurrent.futures import ThreadPoolExecutor
+        self.read = read
+        self.max_in_flight = max_in_flight
+        self.executor = ThreadPoolExecutor(max_in_flight, thread_name_prefix="read-ahead")
+        self.lock = threading.Lock()
+        # path -> Future, for the paths submitted and not yet collected
+        self.futures = {}
+        self.windowed = set()
+        self.pending = deque()
+
+    def prefetch(self, path):
+        with self.lock:
+            if path not in self.futures:
+                self.futures[path] = self.executor.submit(self.read, path)
+
+    def schedule(self, paths):
+        with self.lock:
+            self.pending.extend(paths)
+            self._fill()
+
+    def _fill(self):
+        while self.pending and len(self.windowed) < self.max_in_flight:
+            path = self.pending.popleft()
+            if path in self.futures:
+                continue
+            self.futures[path] = self.executor.submit(self.read, path)
+            self.windowed.add(path)
+
+    def get(self, path):
+        """Return what read(path) returned or raise what it raised; reads now if not scheduled."""
+        with self.lock:
+            future = self.futures.pop(path, None)
+            if future is not None and path in self.windowed:
+                self.windowed.discard(path)
+                self._fill()
+            elif future is None and path in self.pending:
+                self.pending.remove(path)
+        if future is None:
+            return self.read(path)
+        return future.result()
+
+    def close(self):
+        with self.lock:
+            self.pending.clear()
+            self.futures.clear()
+            self.windowed.clear()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
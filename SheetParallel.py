@@ -0,0 +1,193 @@
+import io
+import os
+import sys
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# The common layer modules import each other as top-level modules
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "common_layer"))
+
+import JsonBackend
+from ColumnCatalog import ColumnCatalog
+from QlikToCommonConverter import commonConverter, new_common_workbook
+from CommonToTableauDatasource import CommonToTableauDatasource
+from CommonToTableauConverter import commonToTableauConverter, ColumnPool
+from TableauXmlWriter import TableauXmlWriter, JsonArrayWriter
+from Pipeline import SIMPLIFIED_VIEW_FILE
+
+# The SheetJob of the running conversion.  Set before the pool forks, so the workers
+# inherit it, libraries and catalog included, without pickling any of it
+_job = None
+
+
+def fork_available():
+    return 'fork' in multiprocessing.get_all_start_methods()
+
+
+class SheetResult:
+    """What a worker returns for one sheet file; worksheets are already serialized."""
+    __slots__ = ('file_name', 'simplified', 'digest', 'sheet_objects', 'missing_library_items', 'worksheets')
+
+    def __init__(self, file_name, simplified, digest, sheet_objects, missing_library_items, worksheets):
+        self.file_name = file_name
+        self.simplified = simplified
+        self.digest = digest
+        self.sheet_objects = sheet_objects
+        self.missing_library_items = missing_library_items
+        # [(title, worksheet XML, worksheet JSON or None)]
+        self.worksheets = worksheets
+
+
+class SheetJob:
+    """Converts the sheets of one app independently of each other, all four stages per sheet.
+
+    Everything the sheets share is prepared once in the parent: the master item
+    libraries, the script, the common layer data source and its column catalog.
+    convert_sheet then takes a sheet file to its serialized worksheets using only
+    that read-only state.
+    """
+
+    def __init__(self, pipeline, app_path, pretty, write_json):
+        self.pipeline = pipeline
+        self.simplifier = pipeline.simplifier
+        self.folder_path = os.path.join(app_path, "objects")
+        self.pretty = pretty
+        self.write_json = write_json
+        # The simplified sheets are only sent back when the artifact is written
+        self.keep_simplified = pipeline.artifacts_dir is not None
+        self.files = self.simplifier.filter_json_files(self.folder_path)
+        self.library_digest = None
+
+    def prepare(self):
+        """Load what every sheet needs and return the common layer without its sheets."""
+        simplifier = self.simplifier
+        simplifier.open_app(self.folder_path)
+        # Loaded now so the forked workers share them; a missing library only fails a sheet using it
+        for file_name in ('dimensions.json', 'measures.json'):
+            try:
+                simplifier.get_library(self.folder_path, file_name)
+            except FileNotFoundError:
+                pass
+        if simplifier.cache is not None:
+            self.library_digest = simplifier.library_digest(self.folder_path)
+        self.script = {"data_sources": []}
+        simplifier.integrate_datasource(self.folder_path, self.script)
+
+        self.common = commonConverter(cache=self.pipeline.cache, data=self.script, selection=self.pipeline.selection)
+        data_sources = self.script["data_sources"]
+        data_source_name = data_sources[0] if data_sources else None
+        common_layer = new_common_workbook(data_source_name, self.common.find_table_name(data_source_name))
+        CommonToTableauDatasource(None, self.pipeline.datasource_path, common_layer, self.pipeline.metrics,
+                                  datasource_cache=self.pipeline.datasource_cache).run_conversion()
+
+        self.tableau = commonToTableauConverter(None, None)
+        self.tableau.mappings.reload_if_changed()
+        data_source = common_layer['Workbook']['data_source']
+        self.data_source_name = data_source['name']
+        self.catalog = ColumnCatalog.from_columns(data_source.get('columns', {}))
+        self.pool = ColumnPool(self.tableau)
+        return common_layer
+
+    def convert_sheet(self, file_name):
+        """Return the SheetResult of one sheet file, or None when the selection skips it."""
+        simplifier = self.simplifier
+        sheet_path = os.path.join(self.folder_path, file_name)
+        raw = simplifier.read_bytes(sheet_path)
+        if not simplifier.sheet_selected(sheet_path, raw):
+            return None
+        simplifier.missing_library_items = []
+        digest = None
+        if simplifier.cache is not None:
+            digest, simplified = simplifier.cached_simplified_view(sheet_path, self.folder_path,
+                                                                   self.library_digest, raw)
+            sheet_objects = self.common.cached_process_sheet(simplified, digest)
+        else:
+            simplified = simplifier.simplified_view(JsonBackend.loads(raw), self.folder_path).to_dict()
+            sheet_objects = self.common.process_sheet(simplified)
+
+        fields = set()
+        for chart_data in sheet_objects.values():
+            for equations in self.tableau.chart_equations(chart_data):
+                fields.update(f"[{equation['column']}]" for equation in equations)
+        resolved = self.catalog.resolve_many(fields)
+        worksheets = []
+        for chart_data in sheet_objects.values():
+            entry = self.tableau.create_chart_entry(self.data_source_name, file_name, chart_data, resolved, self.pool)
+            worksheet = next(self.tableau.iter_worksheets({entry.title: entry}))
+            xml = io.StringIO()
+            TableauXmlWriter(xml, self.pretty, depth=2).element("worksheet", worksheet)
+            json_text = JsonArrayWriter.encode(worksheet, self.pipeline.pretty_json) if self.write_json else None
+            worksheets.append((entry.title, xml.getvalue(), json_text))
+
+        return SheetResult(file_name, simplified if self.keep_simplified else None, digest, sheet_objects,
+                           simplifier.missing_library_items, worksheets)
+
+
+def _convert_sheet(file_name):
+    return _job.convert_sheet(file_name)
+
+
+def run_parallel(pipeline, app_path, xml_output_path, json_output_path=None, pretty=True):
+    """Pipeline.run with the sheets of the app spread over pipeline.sheet_workers processes.
+
+    The workers are forked once the libraries are loaded and get contiguous runs of
+    sheet files; the results are merged back in file order, so the outputs match a
+    sequential run byte for byte.  The conversion cache's hit counts are not collected
+    from the workers, and Pipeline refuses sheet workers with StageMetrics or a
+    read-ahead.  Returns the common layer like Pipeline.run.
+    """
+    global _job
+    job = SheetJob(pipeline, app_path, pretty, json_output_path is not None)
+    common_layer = pipeline.timed("prepare", job.prepare)
+
+    workers = min(pipeline.sheet_workers, len(job.files)) or 1
+    chunk_size = max(1, math.ceil(len(job.files) / (workers * 4)))
+    _job = job
+    try:
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork')) as executor:
+            results = pipeline.timed("sheets", list, executor.map(_convert_sheet, job.files, chunksize=chunk_size))
+    finally:
+        _job = None
+    pipeline.timed("merge", merge_results, pipeline, job, [result for result in results if result is not None],
+                   common_layer, xml_output_path, json_output_path, pretty)
+    return common_layer
+
+
+def merge_results(pipeline, job, results, common_layer, xml_output_path, json_output_path, pretty):
+    """Assemble the outputs of the sheet results, in the order a sequential run writes them."""
+    simplifier = pipeline.simplifier
+    simplifier.missing_library_items = [item for result in results for item in result.missing_library_items]
+    if job.keep_simplified:
+        simplified = {"ws_sheets": {result.file_name: result.simplified for result in results}}
+        simplified["data_sources"] = job.script.pop("data_sources")
+        if simplifier.cache is not None:
+            simplified["sheet_digests"] = {result.file_name: result.digest for result in results}
+        simplified.update(job.script)
+        simplified["missing_library_items"] = simplifier.missing_library_items
+        pipeline.write_artifact(SIMPLIFIED_VIEW_FILE, simplified)
+
+    workbook = common_layer['Workbook']
+    # Charts are keyed by title as in generate_all_charts: a repeated title keeps the
+    # position of its first chart and the worksheet of its last one
+    worksheets = {}
+    for result in results:
+        workbook[result.file_name] = result.sheet_objects
+        for title, xml, json_text in result.worksheets:
+            worksheets[title] = (xml, json_text)
+    pipeline.write_common_layer(common_layer)
+
+    with open(xml_output_path, 'w') as result_file:
+        xml_writer = TableauXmlWriter(result_file, pretty)
+        xml_writer.open("Workbook")
+        xml_writer.open("worksheets")
+        for xml, _ in worksheets.values():
+            result_file.write(xml)
+        xml_writer.close()
+        xml_writer.close()
+    if json_output_path is not None:
+        with open(json_output_path, 'w') as json_file:
+            json_writer = JsonArrayWriter(json_file, "worksheets", "worksheet", pipeline.pretty_json)
+            for _, json_text in worksheets.values():
+                json_writer.write_encoded(json_text)
+            json_writer.close()
@@ -0,0 +1,457 @@
+import os
+import re
+import sys
+import csv
+import gzip
+import hashlib
+import datetime
+import itertools
+import importlib.util
+
+# Shared helpers live in common_layer, next to the converters that use them
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "common_layer"))
+
+from TableauXmlWriter import TableauXmlWriter
+from QlikScriptIndexer import QlikScriptIndexer
+
+FORMATS = ("parquet", "csv.gz")
+# Parquet output needs pyarrow, a dependency of extraction only: it is imported by ParquetSink,
+# so callers that never extract do not pay for importing it.  csv.gz is only written on request
+DEFAULT_FORMAT = "parquet"
+# Extensions of the delimited text files a LOAD ... FROM can read, with their delimiter when the
+# extension settles it (None: sniffed); others are reported as skipped
+DELIMITED_EXTENSIONS = {'.csv': None, '.txt': None, '.tab': '\t', '.tsv': '\t'}
+LIB_PREFIX = re.compile(r"^lib://[^/\\]*[/\\]", re.IGNORECASE)
+INTEGER = re.compile(r"^[-+]?(?:0|[1-9]\d*)$")
+# Leading zeros are left to strings, so codes such as "00123" keep them
+REAL = re.compile(r"^[-+]?(?:(?:0|[1-9]\d*)(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?$")
+BOOLEANS = {'true': True, 'false': False}
+
+
+def check_format(output_format):
+    """Raise RuntimeError when output_format cannot be written here (parquet without pyarrow)."""
+    if output_format not in FORMATS:
+        raise ValueError(f"Unknown extract format {output_format!r}; expected one of {', '.join(FORMATS)}")
+    if output_format == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        raise RuntimeError("Parquet extraction needs pyarrow (pip install pyarrow); "
+                           "ask for the csv.gz format to extract to gzip-compressed CSV instead")
+
+
+def parse_integer(value):
+    if not INTEGER.match(value):
+        raise ValueError(value)
+    number = int(value)
+    if not -2 ** 63 <= number < 2 ** 63:
+        raise ValueError(value)
+    return number
+
+
+def parse_real(value):
+    # float() alone would also take "nan", "inf" and "1_000"
+    if not REAL.match(value):
+        raise ValueError(value)
+    return float(value)
+
+
+def parse_boolean(value):
+    return BOOLEANS[value.lower()]
+
+
+# Tableau datatype -> parser, in the order inference tries them
+PARSERS = {
+    'integer': parse_integer,
+    'real': parse_real,
+    'boolean': parse_boolean,
+    'date': datetime.date.fromisoformat,
+    'datetime': datetime.datetime.fromisoformat,
+    'string': str
+}
+# Tableau datatype -> (role, type) of the generated <column>
+COLUMN_ROLES = {
+    'integer': ('measure', 'quantitative'),
+    'real': ('measure', 'quantitative'),
+    'boolean': ('dimension', 'nominal'),
+    'date': ('dimension', 'ordinal'),
+    'datetime': ('dimension', 'ordinal'),
+    'string': ('dimension', 'nominal')
+}
+
+
+def resolve_source_path(source, data_root):
+    """Local path of a LOAD ... FROM source; lib://<connection>/ paths are taken relative to data_root."""
+    path = LIB_PREFIX.sub('', source).replace('\\', '/')
+    return os.path.normpath(path if os.path.isabs(path) else os.path.join(data_root, path))
+
+
+def unique_names(header):
+    names = []
+    seen = set()
+    for index, name in enumerate(header):
+        name = name.strip() or f"Field_{index + 1}"
+        candidate, suffix = name, 2
+        while candidate.casefold() in seen:
+            candidate, suffix = f"{name}_{suffix}", suffix + 1
+        seen.add(candidate.casefold())
+        names.append(candidate)
+    return names
+
+
+class DelimitedReader:
+    """Reads a delimited text file in chunks of chunk_rows rows, padded to the header's width.
+
+    The options follow the LOAD statement's format specification: header_lines lines
+    are skipped first, then with labels "embedded" (or "explicit") a line of column
+    names follows, while with "none" the columns are named @1, @2, ... as in Qlik.
+    quotes="none" reads quote characters as data.  Without an explicit delimiter it is
+    sniffed from the start of the data.
+    """
+
+    def __init__(self, path, chunk_rows=50000, delimiter=None, encoding='utf-8-sig', labels='embedded',
+                 quotes='msq', header_lines=0):
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.delimiter = delimiter
+        self.encoding = encoding
+        self.labels = labels
+        self.quotes = quotes
+        self.header_lines = header_lines
+        self.file = None
+        self.reader = None
+        self.columns = []
+        self.first_row = None
+
+    def __enter__(self):
+        self.file = open(self.path, 'r', newline='', encoding=self.encoding, errors='replace')
+        for _ in range(self.header_lines):
+            self.file.readline()
+        if self.delimiter is None:
+            start = self.file.tell()
+            sample = self.file.read(1 << 16)
+            self.file.seek(start)
+            try:
+                self.delimiter = csv.Sniffer().sniff(sample, delimiters=',;\t|').delimiter
+            except csv.Error:
+                self.delimiter = ','
+        quoting = csv.QUOTE_NONE if self.quotes == 'none' else csv.QUOTE_MINIMAL
+        self.reader = csv.reader(self.file, delimiter=self.delimiter, quoting=quoting)
+        header = next(self.reader, [])
+        if self.labels == 'none':
+            # The first line is data; chunks() hands it out first
+            self.first_row = header
+            self.columns = [f"@{index + 1}" for index in range(len(header))]
+        else:
+            self.columns = unique_names(header)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.file.close()
+
+    def chunks(self):
+        width = len(self.columns)
+        chunk = []
+        rows = self.reader if self.first_row is None else itertools.chain([self.first_row], self.reader)
+        for row in rows:
+            if len(row) != width:
+                row = (row + [''] * width)[:width]
+            chunk.append(row)
+            if len(chunk) >= self.chunk_rows:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def infer_types(chunks, width):
+    """Tableau datatype of each column: the first of PARSERS that parses every non-empty value."""
+    candidates = [[name for name in PARSERS if name != 'string'] for _ in range(width)]
+    has_values = [False] * width
+    for chunk in chunks:
+        for index in range(width):
+            remaining = candidates[index]
+            for row in chunk:
+                if not remaining:
+                    break
+                value = row[index]
+                if value == '':
+                    continue
+                has_values[index] = True
+                for name in list(remaining):
+                    try:
+                        PARSERS[name](value)
+                    except (ValueError, KeyError):
+                        remaining.remove(name)
+    # A column without any value is a string column
+    return [remaining[0] if remaining and seen else 'string' for remaining, seen in zip(candidates, has_values)]
+
+
+def convert_column(chunk, index, datatype):
+    """Values of one column of a chunk in datatype; empty and unparsable values become None."""
+    parse = PARSERS[datatype]
+    values = []
+    failures = 0
+    for row in chunk:
+        value = row[index]
+        if value == '':
+            values.append(None)
+            continue
+        try:
+            values.append(parse(value))
+        except (ValueError, KeyError):
+            values.append(None)
+            failures += 1
+    return values, failures
+
+
+class ParquetSink:
+    """Writes converted chunks as row groups of a compressed Parquet file."""
+
+    def __init__(self, path, columns, datatypes, compression='zstd'):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError("Parquet output needs pyarrow; install it or use the csv.gz format")
+        self.pyarrow = pyarrow
+        arrow_types = {
+            'integer': pyarrow.int64(),
+            'real': pyarrow.float64(),
+            'boolean': pyarrow.bool_(),
+            'date': pyarrow.date32(),
+            'datetime': pyarrow.timestamp('us'),
+            'string': pyarrow.string()
+        }
+        self.schema = pyarrow.schema([pyarrow.field(name, arrow_types[datatype])
+                                      for name, datatype in zip(columns, datatypes)])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema, compression=compression)
+
+    def write(self, column_values):
+        pyarrow = self.pyarrow
+        arrays = [pyarrow.array(values, type=field.type) for values, field in zip(column_values, self.schema)]
+        self.writer.write_table(pyarrow.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+class CsvGzipSink:
+    """Writes converted chunks to a gzip-compressed CSV file, with ISO dates and empty nulls."""
+
+    def __init__(self, path, columns, datatypes):
+        self.file = gzip.open(path, 'wt', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+
+    def write(self, column_values):
+        for row in zip(*column_values):
+            self.writer.writerow([self.format(value) for value in row])
+
+    def format(self, value):
+        if value is None:
+            return ''
+        if isinstance(value, bool):
+            return 'true' if value else 'false'
+        if isinstance(value, (datetime.date, datetime.datetime)):
+            return value.isoformat()
+        return value
+
+    def close(self):
+        self.file.close()
+
+
+def write_datasource_xml(path, caption, columns, datatypes, data_file):
+    """Write the <datasource> with one <column> per extracted column, as CommonToTableauDatasource reads it.
+
+    The file only carries the column list for the converter; it is not a datasource
+    Tableau can open.  Its connection names data_file with class 'extract', which
+    Tableau reserves for .hyper / .tde extracts, and neither Parquet nor gzip CSV is one.
+    """
+    name = "federated." + hashlib.sha256(caption.encode('utf-8')).hexdigest()[:28]
+    column_elements = []
+    for column, datatype in zip(columns, datatypes):
+        role, type_ = COLUMN_ROLES[datatype]
+        column_elements.append({"@caption": column, "@datatype": datatype, "@name": f"[{column}]",
+                                "@role": role, "@type": type_})
+    with open(path, 'w', encoding='utf-8') as fp:
+        TableauXmlWriter(fp).element("datasource", {
+            "@caption": caption,
+            "@inline": "true",
+            "@name": name,
+            "@version": "18.1",
+            "connection": {"@class": "extract", "@filename": os.path.basename(data_file)},
+            "column": column_elements
+        })
+    return name
+
+
+def source_stem(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def output_names(paths, data_root):
+    """Output name (file name without extension) of each source path, unique across paths.
+
+    A source is named by its file stem unless other sources share that stem, e.g.
+    a/sales.csv and b/sales.csv; each of those gets a hash of its path relative to
+    data_root appended.  Names are compared case-insensitively, as file systems may.
+    """
+    sharing = {}
+    for path in paths:
+        sharing.setdefault(source_stem(path).casefold(), []).append(path)
+    names = {}
+    taken = {}
+    for path in paths:
+        name = source_stem(path)
+        if len(sharing[name.casefold()]) > 1:
+            relative = os.path.relpath(path, data_root).replace(os.sep, '/')
+            name = f"{name}-{hashlib.sha256(relative.encode('utf-8')).hexdigest()[:8]}"
+        if name.casefold() in taken:
+            raise ValueError(f"Sources {taken[name.casefold()]} and {path} both extract to {name}")
+        taken[name.casefold()] = path
+        names[path] = name
+    return names
+
+
+def extract_source(source_path, output_dir, output_format=DEFAULT_FORMAT, chunk_rows=50000, infer_chunks=2,
+                   delimiter=None, output_name=None, labels='embedded', quotes='msq', header_lines=0):
+    """Extract one delimited file to output_dir/<name>.<format> plus <name>.tds; returns a summary.
+
+    The .tds holds the inferred columns for CommonToTableauDatasource, not a connection
+    Tableau can open (see write_datasource_xml).  output_name defaults to the file's stem; delimiter, labels, quotes and header_lines
+    are DelimitedReader's options (see format_options).  Memory follows chunk_rows: the first
+    infer_chunks chunks are held to infer the column types, after that one chunk at a
+    time.  Values that do not parse as their column's inferred type are written as
+    nulls and counted in "conversion_failures".
+    """
+    name = output_name or source_stem(source_path)
+    data_file = os.path.join(output_dir, f"{name}.{output_format}")
+    datasource_file = os.path.join(output_dir, f"{name}.tds")
+    summary = {"source": source_path, "name": name, "data_file": data_file, "datasource": datasource_file,
+               "rows": 0}
+    os.makedirs(output_dir, exist_ok=True)
+    extension_delimiter = DELIMITED_EXTENSIONS.get(os.path.splitext(source_path)[1].lower())
+    with DelimitedReader(source_path, chunk_rows, delimiter or extension_delimiter, labels=labels, quotes=quotes,
+                         header_lines=header_lines) as reader:
+        chunks = reader.chunks()
+        head = []
+        for chunk in chunks:
+            head.append(chunk)
+            if len(head) >= infer_chunks:
+                break
+        datatypes = infer_types(head, len(reader.columns))
+        if output_format == "parquet":
+            sink = ParquetSink(data_file, reader.columns, datatypes)
+        else:
+            sink = CsvGzipSink(data_file, reader.columns, datatypes)
+        failures = [0] * len(reader.columns)
+        try:
+            for chunk in head:
+                sink.write(convert_chunk(chunk, datatypes, failures))
+                summary["rows"] += len(chunk)
+            head = None
+            for chunk in chunks:
+                sink.write(convert_chunk(chunk, datatypes, failures))
+                summary["rows"] += len(chunk)
+        finally:
+            sink.close()
+    summary["datasource_name"] = write_datasource_xml(datasource_file, name, reader.columns, datatypes, data_file)
+    summary["columns"] = dict(zip(reader.columns, datatypes))
+    summary["conversion_failures"] = {column: count for column, count in zip(reader.columns, failures) if count}
+    return summary
+
+
+def convert_chunk(chunk, datatypes, failures):
+    column_values = []
+    for index, datatype in enumerate(datatypes):
+        values, failed = convert_column(chunk, index, datatype)
+        failures[index] += failed
+        column_values.append(values)
+    return column_values
+
+
+def format_options(file_format):
+    """extract_source options of a LoadStatement.file_format; {} for a statement without one."""
+    if not file_format:
+        return {}
+    return {"delimiter": file_format["delimiter"], "labels": file_format["labels"],
+            "quotes": file_format["quotes"], "header_lines": file_format["header_lines"]}
+
+
+def app_sources(app_path, data_root=None):
+    """{local path: file format} of the files script.qvs loads from, in script order.
+
+    The file format is the LoadStatement.file_format of the first statement loading the path.
+    """
+    statements = QlikScriptIndexer().index_file(os.path.join(app_path, "script.qvs"))
+    sources = {}
+    for statement in statements:
+        if statement.source_type == 'file' and statement.source:
+            path = resolve_source_path(statement.source, data_root or app_path)
+            sources.setdefault(path, statement.file_format)
+    return sources
+
+
+def extract_app_sources(app_path, output_dir, data_root=None, workers=None, **options):
+    """Extract every delimited source of an app, one source per process; returns the summaries.
+
+    Sources that are missing or not delimited text (QVD, Excel, ...) are listed with a
+    "skipped" reason.  Each extracted source is written under its output_names name,
+    given as "name" in its summary, and read with the delimiter, labels and quoting of
+    its LOAD statement's format specification.  options are passed on to extract_source;
+    an output_format that cannot be written raises before anything is extracted (check_format).
+    """
+    check_format(options.get("output_format", DEFAULT_FORMAT))
+    sources = app_sources(app_path, data_root)
+    summaries = {}
+    jobs = []
+    for path, file_format in sources.items():
+        if (os.path.splitext(path)[1].lower() not in DELIMITED_EXTENSIONS or
+                file_format and file_format["type"] not in (None, 'txt')):
+            summaries[path] = {"source": path, "skipped": "not a delimited text file"}
+        elif not os.path.isfile(path):
+            summaries[path] = {"source": path, "skipped": "file not found"}
+        else:
+            jobs.append(path)
+    names = output_names(jobs, data_root or app_path)
+    if workers == 1 or len(jobs) < 2:
+        for path in jobs:
+            summaries[path] = extract_source(path, output_dir, output_name=names[path],
+                                             **format_options(sources[path]), **options)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {path: executor.submit(extract_source, path, output_dir, output_name=names[path],
+                                             **format_options(sources[path]), **options)
+                       for path in jobs}
+            for path, future in futures.items():
+                summaries[path] = future.result()
+    return [summaries[path] for path in sources]
+
+
+def main(argv=None):
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Extract the delimited files a Qlik app's script loads "
+                                                 "into compressed columnar files, with a .tds listing their "
+                                                 "columns for the converter (not openable in Tableau).")
+    parser.add_argument('app', help="unbuilt app folder (script.qvs)")
+    parser.add_argument('output', help="folder receiving <name>.<format> and <name>.tds per source")
+    parser.add_argument('--data-root', default=None,
+                        help="folder that lib://<connection>/ paths and relative paths resolve against (default: app)")
+    parser.add_argument('--format', choices=FORMATS, default=DEFAULT_FORMAT,
+                        help="parquet (needs pyarrow) or gzip-compressed CSV")
+    parser.add_argument('--chunk-rows', type=int, default=50000, help="rows read and written at a time")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="sources extracted in parallel")
+    args = parser.parse_args(argv)
+    try:
+        check_format(args.format)
+    except RuntimeError as e:
+        parser.error(str(e))
+
+    summaries = extract_app_sources(args.app, args.output, args.data_root, args.workers,
+                                    output_format=args.format, chunk_rows=args.chunk_rows)
+    print(json.dumps(summaries, indent=4))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""Throughput of commonToTableauConverter.generate_all_charts and transform on wide multi-field charts.
+
+    python benchmarks/bench_chart_entries.py [--charts 5000] [--fields 24] [--columns 400]
+
+Each synthetic chart has --fields dimensions and as many measures, drawn from a
+datasource of --columns columns, the shape of large pivot tables.  The per-chart
+column compares with resolving every field through the catalog chart by chart, and
+"copy per worksheet" builds the worksheets the way transform did before columns and
+column instances were shared, for time and traced memory per worksheet.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "common_layer"))
+
+from ColumnCatalog import ColumnCatalog
+from CommonToTableauConverter import commonToTableauConverter
+
+AGGREGATIONS = ("sum", "count", "countd", "median", "max", "none", "year")
+
+
+def synthetic_workbook(charts, fields, columns, seed=0):
+    rng = random.Random(seed)
+    names = [f"Field {index}" for index in range(columns)]
+    datasource_columns = {f"[field_{index}]": {"datatype": "string", "name": f"[field_{index}]", "role": "dimension",
+                                               "type": "nominal", "caption": name}
+                          for index, name in enumerate(names)}
+    sheet = {}
+    for index in range(charts):
+        # Qlik field names match the columns by caption, in whatever case the app used
+        dimensions = [{"aggregation": "none", "column": rng.choice(names).lower()} for _ in range(fields)]
+        measures = [{"aggregation": rng.choice(AGGREGATIONS), "column": rng.choice(names).lower()}
+                    for _ in range(fields)]
+        sheet[f"chart{index}"] = {
+            "description": {"type": "pivot-table", "title": f"Chart {index}", "position": ""},
+            "x_equation": dimensions[0],
+            "y_equation": measures[0],
+            "dimensions": dimensions,
+            "measures": measures
+        }
+    return {"data_source": {"name": "federated.synthetic", "columns": datasource_columns}, "sheet": sheet}
+
+
+def per_chart_resolution(workbook):
+    # What the converter did before: one catalog lookup per field reference
+    catalog = ColumnCatalog.from_columns(workbook["data_source"]["columns"])
+    for chart in workbook["sheet"].values():
+        for equation in chart["dimensions"] + chart["measures"]:
+            catalog.resolve(f"[{equation['column']}]")
+
+
+def batched_resolution(workbook):
+    catalog = ColumnCatalog.from_columns(workbook["data_source"]["columns"])
+    catalog.resolve_many(f"[{equation['column']}]" for chart in workbook["sheet"].values()
+                         for equation in chart["dimensions"] + chart["measures"])
+
+
+def copied_worksheets(converter, charts):
+    # What transform did before: fresh column / column-instance dicts for every worksheet
+    worksheets = []
+    for chart in charts.values():
+        worksheet = {"@name": chart.title, "table": {"view": {
+            "datasources": {"datasource": {"@caption": "zydrunas-events (zydrunas-events)", "@name": chart.datasource}},
+            "datasource-dependencies": {"@datasource": chart.datasource, "column-instance": [], "column": []},
+            "aggregation": {"@value": "true"}},
+            "style": None,
+            "panes": {"pane": {"@selection-relaxation-option": "selection-relaxation-allow",
+                               "view": {"breakdown": {"@value": "auto"}}, "mark": {"@class": chart.mark_class}}},
+            "rows": chart.y_dimension, "cols": chart.x_dimension},
+            "simple-id": {"@uuid": chart.sheet_id}}
+        dependencies = worksheet['table']['view']['datasource-dependencies']
+        for col in chart.columns:
+            dependencies['column'].append({key: col[key] for key in ('@caption', '@datatype', '@name', '@role', '@type')})
+        for instance in chart.column_instances:
+            dependencies['column-instance'].append({key: instance[key] for key in
+                                                    ('@column', '@derivation', '@name', '@pivot', '@type')})
+        worksheets.append(worksheet)
+    return worksheets
+
+
+def shared_worksheets(converter, charts):
+    return converter.transform(charts)
+
+
+def traced_peak(function, *args):
+    tracemalloc.start()
+    try:
+        function(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def best_time(function, repeat, *args):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--charts', type=int, default=5000)
+    parser.add_argument('--fields', type=int, default=24, help="dimensions and measures per chart")
+    parser.add_argument('--columns', type=int, default=400, help="datasource columns")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    workbook = synthetic_workbook(args.charts, args.fields, args.columns)
+    references = args.charts * args.fields * 2
+    converter = commonToTableauConverter(None, None)
+
+    print(f"{args.charts:,} charts x {args.fields * 2} fields = {references:,} column references, best of {args.repeat}")
+    for name, function in (("resolve per chart", per_chart_resolution),
+                           ("resolve batched", batched_resolution),
+                           ("generate_all_charts", converter.generate_all_charts)):
+        elapsed = best_time(function, args.repeat, workbook)
+        print(f"{name:22} {elapsed * 1000:10.1f} ms {references / elapsed:14,.0f} refs/s")
+
+    charts = converter.generate_all_charts(workbook)
+    print(f"\n{len(charts):,} worksheets")
+    for name, function in (("copy per worksheet", copied_worksheets),
+                           ("transform (shared)", shared_worksheets)):
+        elapsed = best_time(function, args.repeat, converter, charts)
+        peak = traced_peak(function, converter, charts)
+        print(f"{name:22} {elapsed * 1000:10.1f} ms {elapsed / len(charts) * 1e6:8.1f} us/ws "
+              f"{peak / len(charts) / 1024:8.1f} KiB/ws")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Throughput of the Qlik expression parser against the old split-based parse_equation.
+
+    python benchmarks/bench_expression_parser.py [--charts 20000]
+
+Each synthetic chart picks an expression from CORPUS, so most expressions repeat across
+charts the way they do in real apps; the memoized column shows the effect of the LRU.
+"""
+import os
+import sys
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "common_layer"))
+
+import QlikExpressionParser
+from QlikExpressionParser import describe_expression
+
+# Expressions as they appear in chart definitions and master measures
+CORPUS = [
+    "=Year(date)",
+    "Count(event_name)",
+    "median(place)",
+    "MAX(place)",
+    "level",
+    "Sum(Sales)",
+    "Sum([Sales Amount])",
+    "Sum([Sales Amount (EUR)])",
+    "Count(DISTINCT CustomerID)",
+    "Count({<Status={'Open'}>} DISTINCT TicketID)",
+    "Sum({<Year={2020}>} Sales)",
+    "Sum({$<Year={$(=Max(Year))}, Month=>} Sales)",
+    "Sum({1<Region={\"North\",\"South\"}>} [Net Revenue])",
+    "Sum({<OrderDate={\">=$(vStart)<=$(vEnd)\"}>} Quantity * UnitPrice)",
+    "Sum(Sales) / Sum(TOTAL Sales)",
+    "Num(Sum(Sales) / Sum(TOTAL <Region> Sales), '#,##0.0%')",
+    "Avg(Aggr(Sum(Sales), CustomerID))",
+    "Sum(Aggr(If(Count(OrderID) > 1, 1, 0), CustomerID))",
+    "If(Sum(Sales) > 100000, 'High', If(Sum(Sales) > 10000, 'Medium', 'Low'))",
+    "RangeSum(Above(Sum(Sales), 0, 12))",
+    "Date(Max(OrderDate), 'YYYY-MM-DD')",
+    "Month(OrderDate)",
+    "Sum(Sales) - Sum({<Year={$(=Max(Year)-1)}>} Sales)",
+    "(Sum(Sales) - Sum(Cost)) / Sum(Sales)",
+    "Only({<Flag={1}>} Category)",
+    "Alt(Sum(Returns), 0)",
+    "Count({<Customer=E({<Year={2021}>})>} Customer)",
+    "Sum({<Product=P({<Category={'Bikes'}>} Product)>} Sales)",
+    "Sum(\"Order Lines.Amount\")",
+    "Fractile(DeliveryDays, 0.9)",
+    "Stdev(Margin)",
+    "Max({<Date={\"$(=Date(Max(Date)))\"}>} Inventory)",
+    "-Sum(Discount) * 100",
+    "Sum(Sales) // comment after the expression",
+    "Count(If(Status = 'Closed' and Priority >= 2, TicketID))",
+]
+
+
+def legacy_parse_equation(equation):
+    parts = equation.split('(')
+    func = parts[0].strip('=') if len(parts) > 1 else "None"
+    column_name = parts[-1].strip(')')
+    return func.lower(), column_name.lower()
+
+
+def rate(function, expressions):
+    started = time.perf_counter()
+    for expression in expressions:
+        function(expression)
+    return len(expressions) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--charts', type=int, default=20000)
+    args = parser.parse_args()
+    expressions = [CORPUS[index % len(CORPUS)] for index in range(args.charts)]
+
+    def cold(expression):
+        QlikExpressionParser.parse_expression.cache_clear()
+        QlikExpressionParser._describe_expression.cache_clear()
+        describe_expression(expression)
+
+    QlikExpressionParser.parse_expression.cache_clear()
+    QlikExpressionParser._describe_expression.cache_clear()
+    print(f"{args.charts:,} expressions, {len(CORPUS)} distinct")
+    print(f"{'split parse_equation':28} {rate(legacy_parse_equation, expressions):12,.0f} expr/s")
+    print(f"{'parser, no memo':28} {rate(cold, expressions):12,.0f} expr/s")
+    print(f"{'parser, memoized':28} {rate(describe_expression, expressions):12,.0f} expr/s")
+
+    print("\nexpressions where the split parser and the AST disagree:")
+    for expression in CORPUS:
+        old = legacy_parse_equation(expression)
+        new = describe_expression(expression)
+        if old != (new["aggregation"], new["column"].lower()):
+            print(f"  {expression}\n      split: {old}\n      ast:   {new}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Decode / encode time of each installed JSON backend on synthetic app documents.
+
+    python benchmarks/bench_json_backend.py [--sheets 20] [--charts 50] [--repeat 5]
+
+Sheet files are decoded from bytes as QVFJsonSimplifier reads them, and the simplified
+view and common layer are encoded compact and pretty as Pipeline writes them.  The
+last column runs the whole Pipeline with the backend selected.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "common_layer"))
+
+import JsonBackend
+from synthetic_app import generate_app
+from Pipeline import Pipeline
+
+
+def best_time(function, repeat, *args):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def decode_all(backend, documents):
+    for raw in documents:
+        backend.loads(raw)
+
+
+def encode_all(backend, values, pretty):
+    for value in values:
+        backend.dumpb(value, pretty)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sheets', type=int, default=20)
+    parser.add_argument('--charts', type=int, default=50, help="charts per sheet")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        app_path = os.path.join(temp_dir, "app")
+        generate_app(app_path, sheets=args.sheets, charts=args.charts)
+        objects = os.path.join(app_path, "objects")
+        documents = []
+        for file_name in sorted(os.listdir(objects)):
+            with open(os.path.join(objects, file_name), 'rb') as fp:
+                documents.append(fp.read())
+
+        pipeline = Pipeline(os.path.join(app_path, "datasource.tds"))
+        simplified = pipeline.simplify(app_path)
+        common_layer = pipeline.attach_datasource(pipeline.to_common(simplified))
+        values = [simplified, common_layer]
+        xml_path = os.path.join(temp_dir, "out.xml")
+        json_path = os.path.join(temp_dir, "out.json")
+
+        print(f"{len(documents)} object files, {sum(map(len, documents)) / 1e6:.1f} MB, best of {args.repeat}")
+        print(f"{'backend':8} {'decode':>10} {'compact':>10} {'pretty':>10} {'pipeline':>10}   (ms)")
+        for name in JsonBackend.AVAILABLE_BACKENDS:
+            backend = JsonBackend.JsonBackend(name)
+            previous = JsonBackend.set_backend(name)
+            try:
+                timings = (best_time(decode_all, args.repeat, backend, documents),
+                           best_time(encode_all, args.repeat, backend, values, False),
+                           best_time(encode_all, args.repeat, backend, values, True),
+                           best_time(pipeline.run, args.repeat, app_path, xml_path, json_path))
+            finally:
+                JsonBackend.set_backend(previous.name)
+            print(f"{name:8} " + " ".join(f"{elapsed * 1000:10.1f}" for elapsed in timings))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Wall time per app of the in-memory Pipeline against the old JSON file hand-offs.
+
+    python benchmarks/bench_pipeline.py [--sheets 20] [--charts 50] [--repeat 5]
+
+The file-based run writes and re-reads result-qlik.json and common_layer.json between
+the stages the way the modules were chained before Pipeline; both runs write the same
+Tableau workbook XML and JSON.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "common_layer"))
+
+from synthetic_app import generate_app
+from Pipeline import Pipeline
+from QVFJsonSimplifier import QVFJsonSimplifier
+from QlikToCommonConverter import commonConverter
+from CommonToTableauDatasource import CommonToTableauDatasource
+from CommonToTableauConverter import commonToTableauConverter
+
+
+def file_round_trip(app_path, output_dir):
+    simplified_path = os.path.join(output_dir, "result-qlik.json")
+    common_path = os.path.join(output_dir, "common_layer.json")
+    with open(simplified_path, 'w') as fp:
+        json.dump(QVFJsonSimplifier().simplify_json(app_path), fp, indent=4)
+    with open(common_path, 'w') as fp:
+        json.dump(commonConverter(simplified_path).qlik_to_common(), fp, indent=4)
+    CommonToTableauDatasource(common_path, os.path.join(app_path, "datasource.tds")).run_conversion()
+    commonToTableauConverter(common_path, os.path.join(output_dir, "file.json"),
+                             os.path.join(output_dir, "file.xml")).convert()
+
+
+def in_memory(app_path, output_dir):
+    pipeline = Pipeline(os.path.join(app_path, "datasource.tds"))
+    pipeline.run(app_path, os.path.join(output_dir, "memory.xml"), os.path.join(output_dir, "memory.json"))
+
+
+def best_time(function, repeat, *args):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sheets', type=int, default=20)
+    parser.add_argument('--charts', type=int, default=50, help="charts per sheet")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        app_path = os.path.join(temp_dir, "app")
+        generate_app(app_path, args.sheets, args.charts)
+        before = best_time(file_round_trip, args.repeat, app_path, temp_dir)
+        after = best_time(in_memory, args.repeat, app_path, temp_dir)
+
+        for suffix in ("xml", "json"):
+            with open(os.path.join(temp_dir, f"file.{suffix}")) as a, open(os.path.join(temp_dir, f"memory.{suffix}")) as b:
+                assert a.read() == b.read(), f"{suffix} output differs"
+
+    print(f"{args.sheets} sheets x {args.charts} charts, best of {args.repeat}")
+    print(f"{'JSON file hand-offs':24} {before * 1000:10.1f} ms/app")
+    print(f"{'in-memory Pipeline':24} {after * 1000:10.1f} ms/app")
+    print(f"{'saved':24} {(before - after) * 1000:10.1f} ms/app ({(before - after) / before:.0%})")
+
+
+if __name__ == '__main__':
+    main()
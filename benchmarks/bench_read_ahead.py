@@ -0,0 +1,65 @@
+"""simplify_json wall time with and without read-ahead, on a local app with injected latency.
+
+    python benchmarks/bench_read_ahead.py [--sheets 40] [--latency-ms 20] [--read-ahead 1 4 16]
+
+Every file read sleeps --latency-ms first, standing in for the round trip of an NFS /
+SMB share, so the gain can be measured without one.  Each run is checked to give the
+same simplified view as the sequential one.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "common_layer"))
+
+from synthetic_app import generate_app
+from QVFJsonSimplifier import QVFJsonSimplifier
+
+
+class SlowStorageSimplifier(QVFJsonSimplifier):
+    """QVFJsonSimplifier whose file reads each wait latency seconds first."""
+
+    def __init__(self, latency, read_ahead=0):
+        super().__init__(read_ahead=read_ahead)
+        self.latency = latency
+
+    def read_bytes(self, path):
+        time.sleep(self.latency)
+        return super().read_bytes(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sheets', type=int, default=40)
+    parser.add_argument('--charts', type=int, default=20, help="charts per sheet")
+    parser.add_argument('--latency-ms', type=float, default=20.0, help="delay added to every file read")
+    parser.add_argument('--read-ahead', type=int, nargs='+', default=[1, 4, 16], help="in-flight limits to try")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        app_path = os.path.join(temp_dir, "app")
+        generate_app(app_path, sheets=args.sheets, charts=args.charts)
+        latency = args.latency_ms / 1000
+
+        print(f"{args.sheets} sheets, {args.latency_ms:g} ms per read")
+        expected = None
+        baseline = None
+        for read_ahead in [0] + args.read_ahead:
+            simplifier = SlowStorageSimplifier(latency, read_ahead)
+            started = time.perf_counter()
+            result = simplifier.simplify_json(app_path)
+            elapsed = time.perf_counter() - started
+            if expected is None:
+                expected, baseline = result, elapsed
+            elif result != expected:
+                raise SystemExit(f"read_ahead={read_ahead} gave a different simplified view")
+            label = "sequential" if read_ahead == 0 else f"read_ahead={read_ahead}"
+            print(f"{label:16} {elapsed * 1000:10.1f} ms {baseline / elapsed:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Wall time of one large app through Pipeline, sequential against sheet workers.
+
+    python benchmarks/bench_sheet_workers.py [--sheets 300] [--charts 50] [--workers 2 4 8]
+
+Every parallel run is checked to write the same workbook XML and JSON, byte for byte,
+as the sequential one.  The gain is bounded by the cores available (os.cpu_count()).
+"""
+import os
+import sys
+import time
+import argparse
+import filecmp
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "common_layer"))
+
+from synthetic_app import generate_app
+from Pipeline import Pipeline
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sheets', type=int, default=300)
+    parser.add_argument('--charts', type=int, default=50, help="charts per sheet")
+    parser.add_argument('--workers', type=int, nargs='+', default=[2, 4, 8], help="sheet worker counts to try")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        app_path = os.path.join(temp_dir, "app")
+        generate_app(app_path, sheets=args.sheets, charts=args.charts)
+        datasource_path = os.path.join(app_path, "datasource.tds")
+
+        print(f"{args.sheets} sheets x {args.charts} charts, {os.cpu_count()} CPUs")
+        baseline = None
+        for workers in [0] + args.workers:
+            xml_path = os.path.join(temp_dir, f"workers-{workers}.xml")
+            json_path = os.path.join(temp_dir, f"workers-{workers}.json")
+            pipeline = Pipeline(datasource_path, sheet_workers=workers)
+            started = time.perf_counter()
+            pipeline.run(app_path, xml_path, json_path)
+            elapsed = time.perf_counter() - started
+            if baseline is None:
+                baseline = elapsed
+            else:
+                for suffix in ("xml", "json"):
+                    if not filecmp.cmp(os.path.join(temp_dir, f"workers-0.{suffix}"),
+                                       os.path.join(temp_dir, f"workers-{workers}.{suffix}"), shallow=False):
+                        raise SystemExit(f"sheet_workers={workers} wrote a different {suffix} output")
+            label = "sequential" if workers == 0 else f"sheet_workers={workers}"
+            print(f"{label:18} {elapsed * 1000:10.1f} ms  x{baseline / elapsed:.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""Objects-per-second for template construction: JSON round-trip copies vs __slots__ records.
+
+Runs on a synthetic app with 10k chart objects:
+
+    python benchmarks/bench_templates.py [--charts 10000] [--repeat 5]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "common_layer"))
+sys.path.insert(0, ROOT)
+
+from QVFJsonSimplifier import QVFJsonSimplifier, SimplifiedSheet
+from CommonToTableauConverter import commonToTableauConverter, ChartEntry
+
+# The templates as they were cloned before the records were introduced
+LEGACY_OBJ_TEMPLATE = {
+    "sheet_object_info": {"ObjectId": None, "Caption": None, "Type": None},
+    "dimension": [],
+    "expression": []
+}
+LEGACY_RESULT_TEMPLATE = {
+    "sheet_info": {"Sheet_Id": "", "Title": "", "ChildObjects": ["pane"]},
+    "sheet_objects": {
+        "pane": {
+            "dimensions": {
+                "x_dimension": "",
+                "y_dimension": "",
+                "pane": {
+                    "@selection-relaxation-option": "selection-relaxation-allow",
+                    "view": {"breakdown": {"@value": "auto"}},
+                    "mark": {"@class": ""}
+                }
+            },
+            "columns": {"@datasource": "", "column-instance": [], "column": []}
+        }
+    }
+}
+LEGACY_SIMPLIFIED_DATA_TEMPLATE = {"Document": {"sheet_info": {}, "sheet_objects": []}}
+
+
+def legacy_sheet_object(object_id):
+    new_obj = json.loads(json.dumps(LEGACY_OBJ_TEMPLATE))
+    new_obj['sheet_object_info']['ObjectId'] = object_id
+    new_obj['sheet_object_info']['Caption'] = "Chart"
+    new_obj['sheet_object_info']['Type'] = "barchart"
+    return new_obj
+
+
+def legacy_chart_entry(title):
+    chart_entry = json.loads(json.dumps(LEGACY_RESULT_TEMPLATE))
+    chart_entry["sheet_info"]["Sheet_Id"] = "{sheet}"
+    chart_entry["sheet_info"]["Title"] = title
+    chart_entry["sheet_objects"]["pane"]["dimensions"]["x_dimension"] = "[ds].[yr:date:qk]"
+    chart_entry["sheet_objects"]["pane"]["dimensions"]["y_dimension"] = "[ds].[cnt:event_name:qk]"
+    chart_entry["sheet_objects"]["pane"]["dimensions"]["pane"]["mark"]["@class"] = "Bar"
+    chart_entry["sheet_objects"]["pane"]["columns"]["@datasource"] = "ds"
+    chart_entry["sheet_objects"]["pane"]["columns"]["column-instance"] = []
+    chart_entry["sheet_objects"]["pane"]["columns"]["column"] = []
+    return chart_entry
+
+
+def synthetic_sheet(charts):
+    children = []
+    for index in range(charts):
+        children.append({
+            "qProperty": {
+                "qInfo": {"qId": f"chart{index}", "qType": "barchart"},
+                "title": f"Chart {index}",
+                "qHyperCubeDef": {
+                    "qDimensions": [{"qDef": {"qFieldDefs": ["=Year(date)"], "qFieldLabels": ["Year"]}}],
+                    "qMeasures": [{"qDef": {"qDef": "Count(event_name)", "qLabel": "Events"}}]
+                }
+            }
+        })
+    return {"qProperty": {"qInfo": {"qId": "sheet"}, "qMetaDef": {"title": "Sheet"}}, "qChildren": children}
+
+
+def synthetic_workbook(charts):
+    columns = {f"[{name}]": {"datatype": "string", "name": f"[{name}]", "role": "dimension", "type": "nominal"}
+               for name in ("date", "event_name")}
+    sheet = {}
+    for index in range(charts):
+        sheet[f"chart{index}"] = {
+            "description": {"type": "Bar Chart", "title": f"Chart {index}", "position": ""},
+            "x_equation": {"aggregation": "year", "column": "date"},
+            "y_equation": {"aggregation": "count", "column": "event_name"}
+        }
+    return {"data_source": {"name": "federated.synthetic", "columns": columns}, "sheet": sheet}
+
+
+def best_rate(function, count, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return count / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--charts', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    charts = range(args.charts)
+    simplifier = QVFJsonSimplifier()
+    construction = [
+        ("sheet object",
+         lambda: [legacy_sheet_object(str(i)) for i in charts],
+         lambda: [simplifier.get_new_obj(str(i), "Chart", "barchart") for i in charts]),
+        ("simplified sheet",
+         lambda: [json.loads(json.dumps(LEGACY_SIMPLIFIED_DATA_TEMPLATE)) for i in charts],
+         lambda: [SimplifiedSheet() for i in charts]),
+        ("chart entry",
+         lambda: [legacy_chart_entry(str(i)) for i in charts],
+         lambda: [ChartEntry("{sheet}", str(i), "[ds].[yr:date:qk]", "[ds].[cnt:event_name:qk]",
+                             "Bar", "ds", [], []) for i in charts]),
+    ]
+
+    print(f"{args.charts:,} objects, best of {args.repeat}")
+    print(f"{'construction':44} {'before obj/s':>14} {'after obj/s':>14} {'speed-up':>9}")
+    for name, before, after in construction:
+        before_rate = best_rate(before, args.charts, args.repeat)
+        after_rate = best_rate(after, args.charts, args.repeat)
+        print(f"{name:44} {before_rate:14,.0f} {after_rate:14,.0f} {after_rate / before_rate:8.1f}x")
+
+    sheet = synthetic_sheet(args.charts)
+    workbook = synthetic_workbook(args.charts)
+    converter = commonToTableauConverter(None, None)
+    print(f"{'end to end':44} {'obj/s':>14}")
+    for name, function in (
+            ("QVFJsonSimplifier.simplified_view", lambda: simplifier.simplified_view(sheet, ROOT).to_dict()),
+            ("commonToTableauConverter.generate_all_charts", lambda: converter.generate_all_charts(workbook))):
+        print(f"{name:44} {best_rate(function, args.charts, args.repeat):14,.0f}")
+
+
+if __name__ == '__main__':
+    main()
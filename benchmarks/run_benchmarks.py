@@ -0,0 +1,183 @@
+"""Time every pipeline stage on synthetic apps of growing size and save the results as JSON.
+
+    python benchmarks/run_benchmarks.py [--scales 1,2,4,8] [--output results.json] [--baseline old.json]
+
+Scale n multiplies the base app (--sheets, --charts, --dimensions, --measures,
+--script-statements, --datasource-columns) by n in sheets, master items, script and
+datasource columns; charts per sheet stay fixed.  Each stage and scale runs in a fresh
+process so its peak RSS is not inflated by the previous ones; the stage inputs are
+prepared untimed first, and the best of --repeat runs is reported.  With --baseline,
+stages that got slower than --tolerance relative to an earlier results file are listed
+and the exit status is 1.
+"""
+import os
+import sys
+import json
+import math
+import time
+import platform
+import argparse
+import resource
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(ROOT))
+sys.path.insert(0, os.path.join(os.path.dirname(ROOT), "common_layer"))
+
+from synthetic_app import generate_app
+from QVFJsonSimplifier import QVFJsonSimplifier
+from QlikToCommonConverter import commonConverter
+from CommonToTableauDatasource import CommonToTableauDatasource
+from CommonToTableauConverter import commonToTableauConverter
+
+STAGES = ("simplify", "common_layer", "datasource", "tableau")
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def folder_bytes(path):
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+def prepare(stage, app_path):
+    """Build the inputs of stage from the earlier stages; returns (callable, items, bytes)."""
+    datasource = os.path.join(app_path, "datasource.tds")
+    objects = os.path.join(app_path, "objects")
+    if stage == "simplify":
+        return lambda: QVFJsonSimplifier().simplify_json(app_path), None, folder_bytes(objects)
+
+    simplified = QVFJsonSimplifier().simplify_json(app_path)
+    charts = sum(len(sheet["Document"]["sheet_objects"]) for sheet in simplified["ws_sheets"].values())
+    if stage == "common_layer":
+        return lambda: commonConverter(data=simplified).qlik_to_common(), charts, None
+    if stage == "datasource":
+        return lambda: CommonToTableauDatasource(None, datasource, {}).parse_datasource_xml(), \
+            None, os.path.getsize(datasource)
+
+    common_layer = commonConverter(data=simplified).qlik_to_common()
+    CommonToTableauDatasource(None, datasource, common_layer).run_conversion()
+    output_dir = os.path.join(app_path, "tableau-output")
+    os.makedirs(output_dir, exist_ok=True)
+    converter = commonToTableauConverter(None, os.path.join(output_dir, "result.json"),
+                                         os.path.join(output_dir, "result.xml"))
+    return lambda: converter.convert(common_layer=common_layer), charts, None
+
+
+def measure(stage, app_path, sizes, repeat):
+    """Run in a worker process: time one stage and report throughput and peak RSS."""
+    function, items, size = prepare(stage, app_path)
+    rss_before = peak_rss_mb()
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    if items is None:
+        items = sizes["charts"] if stage == "simplify" else sizes["datasource_columns"]
+    return {
+        "stage": stage,
+        "seconds": best,
+        "items": items,
+        "items_per_second": items / best if best else None,
+        "bytes": size,
+        "mb_per_second": size / best / 1e6 if size and best else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_rss_before_mb": rss_before
+    }
+
+
+def scaling_exponent(points):
+    """Least-squares slope of log(seconds) against log(items); 1.0 means linear."""
+    points = [(math.log(items), math.log(seconds)) for items, seconds in points if items and seconds]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    spread = sum((x - mean_x) ** 2 for x, _ in points)
+    if not spread:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / spread
+
+
+def compare(results, baseline, tolerance):
+    """Return the (stage, scale, before, after) entries that got slower than tolerance."""
+    previous = {(r["stage"], r["scale"]): r["seconds"] for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        before = previous.get((result["stage"], result["scale"]))
+        if before and result["seconds"] > before * (1 + tolerance):
+            regressions.append((result["stage"], result["scale"], before, result["seconds"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scales', default="1,2,4,8", help="comma separated app size multipliers")
+    parser.add_argument('--sheets', type=int, default=5)
+    parser.add_argument('--charts', type=int, default=20, help="charts per sheet")
+    parser.add_argument('--dimensions', type=int, default=25)
+    parser.add_argument('--measures', type=int, default=25)
+    parser.add_argument('--script-statements', type=int, default=20)
+    parser.add_argument('--datasource-columns', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default="benchmark-results.json")
+    parser.add_argument('--baseline', default=None, help="earlier results file to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed slow-down before a stage is flagged")
+    args = parser.parse_args()
+    scales = [int(scale) for scale in args.scales.split(',')]
+
+    results = []
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for scale in scales:
+            app_path = os.path.join(temp_dir, f"app-{scale}")
+            sizes = generate_app(app_path, args.sheets * scale, args.charts, args.dimensions * scale,
+                                 args.measures * scale, args.script_statements * scale,
+                                 args.datasource_columns * scale)
+            for stage in STAGES:
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    result = executor.submit(measure, stage, app_path, sizes, args.repeat).result()
+                result.update(scale=scale, app=sizes)
+                results.append(result)
+                rate = f"{result['items_per_second']:12,.0f} items/s" if result['items_per_second'] else ""
+                print(f"scale {scale:3}  {stage:13} {result['seconds'] * 1000:10.1f} ms {rate}  "
+                      f"peak RSS {result['peak_rss_mb']:7.1f} MB")
+
+    curves = {}
+    for stage in STAGES:
+        points = [(r["items"], r["seconds"]) for r in results if r["stage"] == stage]
+        curves[stage] = {"points": points, "scaling_exponent": scaling_exponent(points)}
+        exponent = curves[stage]["scaling_exponent"]
+        if exponent is not None:
+            print(f"{stage:13} time grows as items^{exponent:.2f}")
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "arguments": vars(args),
+        "results": results,
+        "scaling": curves
+    }
+    with open(args.output, 'w') as fp:
+        json.dump(report, fp, indent=4)
+    print(f"results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as fp:
+            regressions = compare(results, json.load(fp), args.tolerance)
+        for stage, scale, before, after in regressions:
+            print(f"REGRESSION {stage} at scale {scale}: {before * 1000:.1f} ms -> {after * 1000:.1f} ms")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
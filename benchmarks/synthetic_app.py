@@ -0,0 +1,168 @@
+"""Generate synthetic unbuilt Qlik apps and a matching Tableau datasource.
+
+    python benchmarks/synthetic_app.py OUTPUT_DIR [--sheets 10] [--charts 20] ...
+
+The app has the layout BatchMigration looks for: objects/sheet-*.json,
+objects/dimensions.json, objects/measures.json and script.qvs, plus a datasource.tds
+whose columns are the fields the charts and the script use.  Everything is derived from
+the seed, so the same arguments always give the same files.
+"""
+import os
+import json
+import random
+import argparse
+
+CHART_TYPES = ("barchart", "linechart", "piechart", "table", "pivot-table", "combochart", "kpi", "text")
+DIMENSION_TEMPLATES = ("{field}", "=Year({field})", "=Month({field})", "[{field}]")
+MEASURE_TEMPLATES = (
+    "Count({field})",
+    "Sum({field})",
+    "Median({field})",
+    "Max({field})",
+    "Count(DISTINCT {field})",
+    "Sum({{<Year={{2020}}>}} {field})",
+    "Num(Sum({field}) / Sum(TOTAL {field}), '#,##0.0%')",
+    "If(Sum({field}) > 100, Sum({field}), 0)",
+)
+DATATYPES = (("string", "nominal"), ("integer", "ordinal"), ("date", "ordinal"), ("real", "quantitative"))
+
+
+def field_name(index):
+    return f"field_{index}"
+
+
+def master_items(kind, count, fields, rng):
+    items = []
+    for index in range(count):
+        field = field_name(rng.randrange(fields))
+        if kind == "dimension":
+            items.append({
+                "qInfo": {"qId": f"D{index}", "qType": "dimension"},
+                "qDim": {"qFieldDefs": [rng.choice(DIMENSION_TEMPLATES).format(field=field)],
+                         "qFieldLabels": [f"Dimension {index}"]},
+                "qMetaDef": {"title": f"Dimension {index}"}
+            })
+        else:
+            items.append({
+                "qInfo": {"qId": f"M{index}", "qType": "measure"},
+                "qMeasure": {"qDef": rng.choice(MEASURE_TEMPLATES).format(field=field),
+                             "qLabel": f"Measure {index}"},
+                "qMetaDef": {"title": f"Measure {index}"}
+            })
+    return items
+
+
+def chart_object(sheet, chart, fields, dimensions, measures, rng):
+    # About half of the dimensions and measures come from the master item library
+    qdimensions = []
+    for _ in range(rng.randint(1, 2)):
+        if dimensions and rng.random() < 0.5:
+            qdimensions.append({"qLibraryId": f"D{rng.randrange(dimensions)}"})
+        else:
+            field = field_name(rng.randrange(fields))
+            qdimensions.append({"qDef": {"qFieldDefs": [rng.choice(DIMENSION_TEMPLATES).format(field=field)],
+                                         "qFieldLabels": [field]}})
+    qmeasures = []
+    for _ in range(rng.randint(1, 2)):
+        if measures and rng.random() < 0.5:
+            qmeasures.append({"qLibraryId": f"M{rng.randrange(measures)}"})
+        else:
+            field = field_name(rng.randrange(fields))
+            qmeasures.append({"qDef": {"qDef": rng.choice(MEASURE_TEMPLATES).format(field=field),
+                                       "qLabel": field}})
+    return {
+        "qProperty": {
+            "qInfo": {"qId": f"obj{sheet}_{chart}", "qType": rng.choice(CHART_TYPES)},
+            "title": f"Chart {sheet}.{chart}",
+            "qHyperCubeDef": {"qDimensions": qdimensions, "qMeasures": qmeasures}
+        },
+        "qChildren": [],
+        "qEmbeddedSnapshotRef": None
+    }
+
+
+def load_script(statements, fields, rng):
+    lines = ["///$tab Main", "SET ThousandSep=',';", ""]
+    for index in range(statements):
+        chosen = sorted(rng.sample(range(fields), min(fields, 5)))
+        columns = ",\n    ".join(field_name(field) for field in chosen)
+        lines.append(f"// table {index}")
+        lines.append(f"Table{index}:")
+        lines.append(f"LOAD {columns}")
+        lines.append(f"FROM [lib://Data/source_{index}.qvd] (qvd);")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def datasource_xml(columns, name="federated.synthetic", caption="synthetic (synthetic)"):
+    lines = ["<?xml version='1.0' encoding='utf-8' ?>",
+             f"<datasource caption='{caption}' inline='true' name='{name}' version='18.1'>",
+             "  <connection class='federated'>",
+             "    <relation name='synthetic' table='[synthetic$]' type='table'>",
+             "      <columns header='yes'>"]
+    for index in range(columns):
+        datatype = DATATYPES[index % len(DATATYPES)][0]
+        lines.append(f"        <column datatype='{datatype}' name='{field_name(index)}' ordinal='{index}' />")
+    lines.extend(["      </columns>", "    </relation>", "  </connection>"])
+    for index in range(columns):
+        datatype, type_ = DATATYPES[index % len(DATATYPES)]
+        caption = field_name(index).replace('_', ' ').title()
+        lines.append(f"  <column caption='{caption}' datatype='{datatype}' name='[{field_name(index)}]' "
+                     f"role='dimension' type='{type_}' />")
+    lines.append("</datasource>")
+    return "\n".join(lines) + "\n"
+
+
+def generate_app(app_path, sheets=10, charts=20, dimensions=50, measures=50, script_statements=20,
+                 datasource_columns=50, seed=0):
+    """Write one synthetic unbuilt app to app_path and return its sizes."""
+    rng = random.Random(seed)
+    objects = os.path.join(app_path, "objects")
+    os.makedirs(objects, exist_ok=True)
+    fields = max(1, datasource_columns)
+
+    with open(os.path.join(objects, "dimensions.json"), 'w') as fp:
+        json.dump(master_items("dimension", dimensions, fields, rng), fp)
+    with open(os.path.join(objects, "measures.json"), 'w') as fp:
+        json.dump(master_items("measure", measures, fields, rng), fp)
+    for sheet in range(sheets):
+        sheet_json = {
+            "qProperty": {"qInfo": {"qId": f"sheet{sheet}", "qType": "sheet"},
+                          "qMetaDef": {"title": f"Sheet {sheet}"}},
+            "qChildren": [chart_object(sheet, chart, fields, dimensions, measures, rng) for chart in range(charts)]
+        }
+        with open(os.path.join(objects, f"sheet-{sheet}.json"), 'w') as fp:
+            json.dump(sheet_json, fp)
+    with open(os.path.join(app_path, "script.qvs"), 'w') as fp:
+        fp.write(load_script(script_statements, fields, rng))
+    with open(os.path.join(app_path, "datasource.tds"), 'w') as fp:
+        fp.write(datasource_xml(fields))
+
+    return {
+        "sheets": sheets,
+        "charts": sheets * charts,
+        "dimensions": dimensions,
+        "measures": measures,
+        "script_statements": script_statements,
+        "datasource_columns": fields
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('output', help="app folder to create")
+    parser.add_argument('--sheets', type=int, default=10)
+    parser.add_argument('--charts', type=int, default=20, help="charts per sheet")
+    parser.add_argument('--dimensions', type=int, default=50, help="master dimensions")
+    parser.add_argument('--measures', type=int, default=50, help="master measures")
+    parser.add_argument('--script-statements', type=int, default=20, help="LOAD statements in script.qvs")
+    parser.add_argument('--datasource-columns', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    sizes = generate_app(args.output, args.sheets, args.charts, args.dimensions, args.measures,
+                         args.script_statements, args.datasource_columns, args.seed)
+    print(json.dumps(sizes))
+
+
+if __name__ == '__main__':
+    main()
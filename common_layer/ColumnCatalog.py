@@ -0,0 +1,141 @@
+import os
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+
+
+def parse_datasource_xml(source):
+    """Stream a Tableau datasource file and return (datasource_info, columns).
+
+    datasource_info holds the name / caption of the last <datasource> element and columns
+    maps each column name to its definition, for every <column> that has a role and type.
+    Elements are dropped from the tree as soon as they are finished, so memory does not
+    grow with the number of columns.  source is a path or a binary file object.
+    """
+    datasource_info = {}
+    columns = {}
+    stack = []
+    try:
+        for event, element in ET.iterparse(source, events=('start', 'end')):
+            if event == 'start':
+                stack.append(element)
+                if element.tag == 'datasource':
+                    datasource_info['name'] = element.get('name')
+                    datasource_info['caption'] = element.get('caption')
+                continue
+
+            stack.pop()
+            if element.tag == 'column':
+                role = element.get('role')
+                type_ = element.get('type')
+                if role and type_:
+                    column = {
+                        'datatype': element.get('datatype'),
+                        'name': element.get('name'),
+                        'role': role,
+                        'type': type_
+                    }
+                    caption = element.get('caption')
+                    if caption:
+                        column['caption'] = caption
+                    columns[column['name']] = column
+            # iterparse builds the tree ahead of the events, so later siblings may already
+            # follow the finished element; it is removed by identity, not by position
+            element.clear()
+            if stack:
+                stack[-1].remove(element)
+    except ET.ParseError:
+        raise ValueError("Invalid XML data")
+    return datasource_info, columns
+
+
+class DatasourceCache:
+    """parse_datasource_xml results by path, re-parsed when the file's mtime or size changes.
+
+    For long-lived processes converting many apps against the same few datasources; the
+    least recently used file is dropped past max_files.  Returned dicts are shared by
+    every caller and must not be modified.
+    """
+
+    def __init__(self, max_files=32):
+        self.max_files = max_files
+        # absolute path -> ((mtime, size), (datasource_info, columns))
+        self.entries = OrderedDict()
+
+    def get(self, path):
+        key = os.path.abspath(path)
+        stat = os.stat(key)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        entry = self.entries.pop(key, None)
+        if entry is None or entry[0] != signature:
+            entry = (signature, parse_datasource_xml(key))
+        self.entries[key] = entry
+        while len(self.entries) > self.max_files:
+            self.entries.popitem(last=False)
+        return entry[1]
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def catalog_key(field):
+    """Lookup key of a field or column name: without [brackets], case-insensitive."""
+    field = field.strip()
+    if len(field) > 1 and field[0] == '[' and field[-1] == ']':
+        field = field[1:-1]
+    return field.casefold()
+
+
+class ColumnCatalog:
+    """Datasource columns indexed by name and by caption, case-insensitively.
+
+    Qlik field names rarely match Tableau's bracketed column names exactly, so lookups
+    try the column name first and the caption second, both without brackets and case.
+    """
+
+    def __init__(self):
+        self.columns = {}
+        self.by_name = {}
+        self.by_caption = {}
+
+    @classmethod
+    def from_columns(cls, columns):
+        """Build the catalog from the 'columns' dict of the common layer data source."""
+        catalog = cls()
+        for column in columns.values():
+            catalog.add(column)
+        return catalog
+
+    @classmethod
+    def from_file(cls, source):
+        datasource_info, columns = parse_datasource_xml(source)
+        return cls.from_columns(columns)
+
+    def add(self, column):
+        self.columns[column['name']] = column
+        self.by_name.setdefault(catalog_key(column['name']), column)
+        if column.get('caption'):
+            self.by_caption.setdefault(catalog_key(column['caption']), column)
+
+    def resolve(self, field):
+        """Return the column definition a field name refers to, or None."""
+        if not field:
+            return None
+        column = self.columns.get(field)
+        if column is not None:
+            return column
+        key = catalog_key(field)
+        return self.by_name.get(key) or self.by_caption.get(key)
+
+    def resolve_many(self, fields):
+        """Resolve a batch of field names at once; returns {field: column definition or None}."""
+        resolved = {}
+        for field in fields:
+            if field not in resolved:
+                resolved[field] = self.resolve(field)
+        return resolved
+
+    def __len__(self):
+        return len(self.columns)
+
+    def __contains__(self, field):
+        return self.resolve(field) is not None
@@ -0,0 +1,154 @@
+import os
+import hashlib
+import tempfile
+from collections.abc import Mapping
+
+import JsonBackend
+
+MANIFEST_FILE = 'manifest.json'
+DATA_SOURCE_FILE = 'data_source.json'
+# Bump when the manifest layout changes
+STORE_FORMAT_VERSION = 1
+
+
+def atomic_write(path, data):
+    """Replace path with data (bytes) so readers see either the old or the new file, never a part."""
+    folder = os.path.dirname(path) or '.'
+    fd, temp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def shard_file_name(sheet_name):
+    # Derived from the name, so rewriting a sheet never renames its shard
+    return f"sheet-{hashlib.sha256(sheet_name.encode('utf-8')).hexdigest()[:16]}.json"
+
+
+class CommonLayerStore:
+    """Common layer workbook stored as a folder: a manifest plus one JSON shard per sheet.
+
+    manifest.json lists the sheets in workbook order with their shard files, and the
+    data source lives in data_source.json.  Every file is replaced atomically and an
+    update rewrites only the shard it changes, so a crash never leaves a half written
+    workbook and a datasource refresh does not touch the sheets.
+    """
+
+    def __init__(self, path, pretty=False):
+        self.path = path
+        self.pretty = pretty
+
+    @staticmethod
+    def is_store(path):
+        return bool(path) and os.path.isfile(os.path.join(path, MANIFEST_FILE))
+
+    def shard_path(self, file_name):
+        return os.path.join(self.path, file_name)
+
+    def _write(self, file_name, value):
+        atomic_write(self.shard_path(file_name), JsonBackend.dumpb(value, self.pretty))
+
+    def read_manifest(self):
+        manifest = JsonBackend.load_file(self.shard_path(MANIFEST_FILE))
+        if manifest.get("version") != STORE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported common layer store version {manifest.get('version')!r} in {self.path}")
+        return manifest
+
+    def sheet_names(self):
+        return [sheet["name"] for sheet in self.read_manifest()["sheets"]]
+
+    def write_workbook(self, common_layer):
+        """Store a whole {"Workbook": {...}} common layer, replacing what the folder held."""
+        os.makedirs(self.path, exist_ok=True)
+        sheets = []
+        for name, value in common_layer["Workbook"].items():
+            if name == 'data_source':
+                self._write(DATA_SOURCE_FILE, value)
+            else:
+                sheets.append({"name": name, "file": shard_file_name(name)})
+                self._write(sheets[-1]["file"], value)
+        # The manifest goes last: until it is replaced, readers see the previous sheet list
+        self._write(MANIFEST_FILE, {"version": STORE_FORMAT_VERSION, "data_source": DATA_SOURCE_FILE,
+                                    "sheets": sheets})
+        self.remove_unlisted(sheets)
+
+    def remove_unlisted(self, sheets):
+        listed = {sheet["file"] for sheet in sheets}
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                if entry.name.startswith('sheet-') and entry.name.endswith('.json') and entry.name not in listed:
+                    os.remove(entry.path)
+
+    def load_data_source(self):
+        return JsonBackend.load_file(self.shard_path(self.read_manifest()["data_source"]))
+
+    def save_data_source(self, data_source):
+        self._write(self.read_manifest()["data_source"], data_source)
+
+    def load_sheet(self, name):
+        for sheet in self.read_manifest()["sheets"]:
+            if sheet["name"] == name:
+                return JsonBackend.load_file(self.shard_path(sheet["file"]))
+        raise KeyError(name)
+
+    def save_sheet(self, name, sheet_objects):
+        """Write one sheet's shard; the manifest is only rewritten for a new sheet."""
+        manifest = self.read_manifest()
+        file_name = shard_file_name(name)
+        self._write(file_name, sheet_objects)
+        if not any(sheet["name"] == name for sheet in manifest["sheets"]):
+            manifest["sheets"].append({"name": name, "file": file_name})
+            self._write(MANIFEST_FILE, manifest)
+
+    def open_workbook(self):
+        """Return {"Workbook": ShardedWorkbook}; sheets are only read when looked up."""
+        return {"Workbook": ShardedWorkbook(self)}
+
+    def load_workbook(self):
+        """Read the whole common layer into the single-file {"Workbook": {...}} layout."""
+        return {"Workbook": dict(ShardedWorkbook(self).items())}
+
+
+class ShardedWorkbook(Mapping):
+    """Read-only view of a CommonLayerStore laid out like common_layer['Workbook'].
+
+    Keys are 'data_source' followed by the sheet names in workbook order; each lookup
+    reads its shard, so iterating over items() holds one sheet at a time.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        manifest = store.read_manifest()
+        self.data_source_file = manifest["data_source"]
+        self.files = {sheet["name"]: sheet["file"] for sheet in manifest["sheets"]}
+
+    def __getitem__(self, name):
+        file_name = self.data_source_file if name == 'data_source' else self.files[name]
+        return JsonBackend.load_file(self.store.shard_path(file_name))
+
+    def __iter__(self):
+        yield 'data_source'
+        yield from self.files
+
+    def __len__(self):
+        return len(self.files) + 1
+
+    def __contains__(self, name):
+        return name == 'data_source' or name in self.files
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) != 3:
+        sys.exit("usage: python CommonLayerStore.py common_layer.json <store folder>")
+    CommonLayerStore(sys.argv[2]).write_workbook(JsonBackend.load_file(sys.argv[1]))
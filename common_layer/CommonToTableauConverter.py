@@ -1,253 +1,330 @@
-import json
-import xmltodict
-
-# Updated helper dictionaries
-FUNCTION_INFO = {
-    'count': {'name': 'cnt', 'func_type': 'quantitative'},
-    'median': {'name': 'med', 'func_type': 'quantitative'},
-    'year': {'name': 'yr', 'func_type': 'ordinal'},
-    'sum': {'name': 'sum', 'func_type': 'quantitative'},
-    'max': {'name': 'sum', 'func_type': 'quantitative'},
-    'none': {'name': 'none', 'func_type': 'ordinal'}
-}
-
-CHART_INFO = {
-    'Bar Chart': 'Bar',
-    'Pivot Table': 'Automatic',
-    'Pie Chart': 'Pie'
-}
-
-class commonToTableauConverter:
-    # Static template for result structure
-    RESULT_TEMPLATE = {
-        "sheet_info": {
-            "Sheet_Id": "",
-            "Title": "",
-            "ChildObjects": ["pane"]
-        },
-        "sheet_objects": {
-            "pane": {
-                "dimensions": {
-                    "x_dimension": "",
-                    "y_dimension": "",
-                    "pane": {
-                        "@selection-relaxation-option": "selection-relaxation-allow",
-                        "view": {
-                            "breakdown": {
-                                "@value": "auto"
+import io
+
+import JsonBackend
+from ColumnCatalog import ColumnCatalog
+from CommonLayerStore import CommonLayerStore
+from StageMetrics import NULL_METRICS
+from dictionary.mapping_registry import default_registry
+from TableauXmlWriter import TableauXmlWriter, JsonArrayWriter
+
+
+class ChartEntry:
+    """One chart's worksheet data; to_dict gives the result-tableau.json layout."""
+    __slots__ = ('sheet_id', 'title', 'x_dimension', 'y_dimension', 'mark_class',
+                 'datasource', 'column_instances', 'columns')
+
+    def __init__(self, sheet_id, title, x_dimension, y_dimension, mark_class, datasource, column_instances, columns):
+        self.sheet_id = sheet_id
+        self.title = title
+        self.x_dimension = x_dimension
+        self.y_dimension = y_dimension
+        self.mark_class = mark_class
+        self.datasource = datasource
+        self.column_instances = column_instances
+        self.columns = columns
+
+    def to_dict(self):
+        return {
+            "sheet_info": {
+                "Sheet_Id": self.sheet_id,
+                "Title": self.title,
+                "ChildObjects": ["pane"]
+            },
+            "sheet_objects": {
+                "pane": {
+                    "dimensions": {
+                        "x_dimension": self.x_dimension,
+                        "y_dimension": self.y_dimension,
+                        "pane": {
+                            "@selection-relaxation-option": "selection-relaxation-allow",
+                            "view": {
+                                "breakdown": {
+                                    "@value": "auto"
+                                }
+                            },
+                            "mark": {
+                                "@class": self.mark_class
                             }
-                        },
-                        "mark": {
-                            "@class": ""
                         }
+                    },
+                    "columns": {
+                        "@datasource": self.datasource,
+                        "column-instance": self.column_instances,
+                        "column": self.columns
                     }
-                },
-                "columns": {
-                    "@datasource": "",
-                    "column-instance": [],
-                    "column": []
                 }
             }
         }
-    }
 
-    def __init__(self, input_path, output_path):
+
+class ColumnPool:
+    """Column and column-instance dicts of one datasource, each built once.
+
+    Every ChartEntry and worksheet of the datasource refers to the same dicts, so they
+    are shared by reference until serialization and must not be modified.
+    """
+    __slots__ = ('converter', 'columns', 'instances', 'by_field')
+
+    def __init__(self, converter):
+        self.converter = converter
+        # column name -> column dict
+        self.columns = {}
+        # (column, derivation, type) -> column-instance dict
+        self.instances = {}
+        # (column name, Qlik aggregation) -> column-instance dict, skips the function_info lookup
+        self.by_field = {}
+
+    def column(self, column):
+        interned = self.columns.get(column['name'])
+        if interned is None:
+            interned = self.columns[column['name']] = self.converter.find_columns([column])[0]
+        return interned
+
+    def instance(self, column, aggregation):
+        field = (column['name'], aggregation)
+        interned = self.by_field.get(field)
+        if interned is None:
+            instance = self.converter.find_column_instance(column, self.converter.mappings.function_info(aggregation))
+            key = (instance['@column'], instance['@derivation'], instance['@type'])
+            interned = self.by_field[field] = self.instances.setdefault(key, instance)
+        return interned
+
+
+class commonToTableauConverter:
+    def __init__(self, input_path, output_path, xml_output_path='tableau-result.xml', metrics=None, mappings=None):
         self.input_path = input_path
         self.output_path = output_path
+        self.xml_output_path = xml_output_path
+        # Function and chart mappings of dictionary/config.yaml
+        self.mappings = mappings or default_registry()
+        # Optional StageMetrics recording the "tableau" stage per sheet
+        self.metrics = metrics or NULL_METRICS
 
     def load_input_json(self):
-        """Read and return the JSON content from the input file."""
-        with open(self.input_path, 'r') as input_file:
-            return json.load(input_file)
+        """Read and return the JSON content from the input file, or open a CommonLayerStore folder."""
+        if CommonLayerStore.is_store(self.input_path):
+            return CommonLayerStore(self.input_path).open_workbook()
+        return JsonBackend.load_file(self.input_path)
 
-    def save_json(self, data):
+    def save_json(self, data, pretty=False):
         """Save the result data as a JSON file to the output path."""
-        with open(self.output_path, 'w') as output_file:
-            json.dump(data, output_file, indent=4)
+        JsonBackend.dump_file(data, self.output_path, pretty)
 
-    def convert_to_xml(self, data):
+    def convert_to_xml(self, data, pretty=True):
         """Convert the generated dictionary into an XML string."""
-        return xmltodict.unparse(data, pretty=True)
+        output = io.StringIO()
+        writer = TableauXmlWriter(output, pretty)
+        for tag, value in data.items():
+            writer.element(tag, value)
+        return output.getvalue()
 
-    def find_column_instance(self, data_source, column_name, agg_info):
+    def find_column_instance(self, column, agg_info):
         """Generate the column-instance entry based on the data source column and function info."""
-        column = data_source['columns'].get(column_name)
-        if column:
-            return {
-                "@column": column_name,
-                "@derivation": agg_info.get('name', ''),
-                "@name": f"[{agg_info.get('name', '')}:{column_name.split('[')[1].split(']')[0]}:qk]",
-                "@pivot": "key",
-                "@type": agg_info.get('func_type', '')
-            }
+        column_name = column['name']
+        return {
+            "@column": column_name,
+            "@derivation": agg_info.get('name', ''),
+            "@name": f"[{agg_info.get('name', '')}:{column_name.split('[')[1].split(']')[0]}:qk]",
+            "@pivot": "key",
+            "@type": agg_info.get('func_type', '')
+        }
 
-    def find_columns(self, data_source, column_names):
-        """Generate the list of column definitions based on the provided column names and the data source."""
-        columns = []
-        for column_name in column_names:
-            column_info = data_source['columns'].get(column_name)
-            if column_info:
-                columns.append({
-                    "@caption": column_info['name'].strip('[]'),
-                    "@datatype": column_info['datatype'],
-                    "@name": column_info['name'],
-                    "@role": column_info['role'],
-                    "@type": column_info['type']
-                })
-        return columns
-
-    def generate_dimensions(self, data_source_name, column_instances, eq_column):
-        """Generate dimensions by matching column instances and appending the data source name."""
-        for instance in column_instances:
-            if instance["@column"] == eq_column:
-                return f"[{data_source_name}].{instance['@name']}"
-
-
-    def create_chart_entry(self, data_source_name, doc_name, chart_data, data_source):
-        """Generate and return a dictionary for a specific chart entry."""
+    def find_columns(self, columns):
+        """Generate the column definitions of the given data source columns."""
+        return [{
+            "@caption": column_info['name'].strip('[]'),
+            "@datatype": column_info['datatype'],
+            "@name": column_info['name'],
+            "@role": column_info['role'],
+            "@type": column_info['type']
+        } for column_info in columns]
+
+    def generate_dimensions(self, data_source_name, instance_names, separator):
+        """Generate a shelf expression from column instance names; None when there are none."""
+        fields = [f"[{data_source_name}].{name}" for name in instance_names]
+        if not fields:
+            return None
+        return fields[0] if len(fields) == 1 else f"({separator.join(fields)})"
+
+    def chart_equations(self, chart_data):
+        """(dimensions, measures) of a chart; common layers without the lists use x / y_equation."""
+        dimensions = chart_data.get('dimensions')
+        if dimensions is None:
+            dimensions = [chart_data['x_equation']]
+        measures = chart_data.get('measures')
+        if measures is None:
+            measures = [chart_data['y_equation']]
+        return dimensions, measures
+
+    def create_chart_entry(self, data_source_name, doc_name, chart_data, resolved, pool=None):
+        """Generate and return the ChartEntry for a specific chart.
+
+        resolved maps each bracketed field name to its data source column (or None), as
+        generate_all_charts resolves them sheet by sheet; pool is the datasource's
+        ColumnPool, shared by all its charts.
+        """
+        if pool is None:
+            pool = ColumnPool(self)
         title = chart_data['description']['title']
         chart_type = chart_data['description']['type']
-        chart_class = CHART_INFO.get(chart_type, 'Bar')
-
-        x_eq = chart_data['x_equation']
-        y_eq = chart_data['y_equation']
-
-        x_agg_info = FUNCTION_INFO.get(x_eq['aggregation'], {})
-        y_agg_info = FUNCTION_INFO.get(y_eq['aggregation'], {})
-
-        column_instances = [
-            self.find_column_instance(data_source, f"[{x_eq['column']}]", x_agg_info),
-            self.find_column_instance(data_source, f"[{y_eq['column']}]", y_agg_info)
-        ]
-        column_instances = [ci for ci in column_instances if ci is not None]
+        chart_class = self.mappings.chart_info(chart_type, 'Bar')
 
-        column_names = [f"[{x_eq['column']}]", f"[{y_eq['column']}]"]
-        columns = self.find_columns(data_source, column_names)
-
-        # Derive dimensions from column instances
-        x_dimension = self.generate_dimensions(data_source_name, column_instances, f"[{x_eq['column']}]")
-        y_dimension = self.generate_dimensions(data_source_name, column_instances, f"[{y_eq['column']}]")
-
-        # Create a copy of the static template and populate it with specific values
-        chart_entry = json.loads(json.dumps(self.RESULT_TEMPLATE))
-        chart_entry["sheet_info"]["Sheet_Id"] = f"{{{doc_name}}}"
-        chart_entry["sheet_info"]["Title"] = title
-        chart_entry["sheet_objects"]["pane"]["dimensions"]["x_dimension"] = x_dimension
-        chart_entry["sheet_objects"]["pane"]["dimensions"]["y_dimension"] = y_dimension
-        chart_entry["sheet_objects"]["pane"]["dimensions"]["pane"]["mark"]["@class"] = chart_class
-        chart_entry["sheet_objects"]["pane"]["columns"]["@datasource"] = data_source_name
-        chart_entry["sheet_objects"]["pane"]["columns"]["column-instance"] = column_instances
-        chart_entry["sheet_objects"]["pane"]["columns"]["column"] = columns
-
-        return chart_entry
+        column_instances = []
+        columns = []
+        seen_instances = set()
+        seen_columns = set()
+        shelves = []
+        for equations in self.chart_equations(chart_data):
+            shelf = []
+            for equation in equations:
+                column = resolved.get(f"[{equation['column']}]")
+                if column is None:
+                    continue
+                instance = pool.instance(column, equation['aggregation'])
+                shelf.append(instance['@name'])
+                if instance['@name'] not in seen_instances:
+                    seen_instances.add(instance['@name'])
+                    column_instances.append(instance)
+                if column['name'] not in seen_columns:
+                    seen_columns.add(column['name'])
+                    columns.append(pool.column(column))
+            shelves.append(shelf)
+
+        # Dimensions nest on the columns shelf, measures are concatenated on the rows shelf
+        x_dimension = self.generate_dimensions(data_source_name, shelves[0], ' / ')
+        y_dimension = self.generate_dimensions(data_source_name, shelves[1], ' + ')
+
+        return ChartEntry(f"{{{doc_name}}}", title, x_dimension, y_dimension, chart_class,
+                          data_source_name, column_instances, columns)
 
     def generate_all_charts(self, workbook):
-        """Generate a dictionary containing all chart entries."""
+        """Generate a dictionary of ChartEntry records keyed by chart title."""
+        # Picks up edits of config.yaml when the converter runs in a long-lived process
+        self.mappings.reload_if_changed()
         result = {}
         data_source = workbook['data_source']
         data_source_name = data_source['name']
+        catalog = ColumnCatalog.from_columns(data_source.get('columns', {}))
+        # Each distinct field name is resolved once, when the first sheet using it comes up
+        resolved = {}
+        pool = ColumnPool(self)
 
+        # One sheet at a time, so a lazily loaded workbook (ShardedWorkbook) holds a single shard
         for doc_name, doc_data in workbook.items():
-            if not doc_name.startswith('Document'):
+            if doc_name == 'data_source':
                 continue
-
-            for chart_name, chart_data in doc_data.items():
-                title = chart_data['description']['title']
-                result[title] = self.create_chart_entry(data_source_name, doc_name, chart_data, data_source)
+            fields = set()
+            for chart_data in doc_data.values():
+                for equations in self.chart_equations(chart_data):
+                    fields.update(f"[{equation['column']}]" for equation in equations)
+            resolved.update(catalog.resolve_many(fields - resolved.keys()))
+            with self.metrics.sheet(doc_name):
+                for chart_name, chart_data in doc_data.items():
+                    title = chart_data['description']['title']
+                    result[title] = self.create_chart_entry(data_source_name, doc_name, chart_data, resolved, pool)
+                    self.metrics.add("objects")
 
         return result
         
-    def transform(self,data):
-        transformed_data = {
+    def transform(self, data):
+        """Build the worksheets structure from the ChartEntry records of generate_all_charts."""
+        return {
             "worksheets": {
-                "worksheet": []
+                "worksheet": list(self.iter_worksheets(data))
             }
         }
 
-        # Iterate over each sheet in the input data
-        for sheet_name, sheet_content in data.items():
-            sheet_info = sheet_content['sheet_info']
-            sheet_objects = sheet_content['sheet_objects']['pane']
-
-            worksheet = {
-                "@name": sheet_info['Title'],
-                "table": {
-                    "view": {
-                        "datasources": {
-                            "datasource": {
-                                "@caption": "zydrunas-events (zydrunas-events)",
-                                "@name": sheet_objects['columns']['@datasource']
+    def iter_worksheets(self, data):
+        """Yield the worksheet dict of each ChartEntry, one at a time.
+
+        Column and column-instance dicts come from the charts' ColumnPool, and the parts
+        every worksheet of a datasource or mark class has in common are built once, so a
+        worksheet only adds its own shelves and lists.
+        """
+        datasources = {}
+        panes = {}
+        aggregation = {"@value": "true"}
+        for chart in data.values():
+            datasource = datasources.get(chart.datasource)
+            if datasource is None:
+                datasource = datasources[chart.datasource] = {
+                    "datasource": {
+                        "@caption": "zydrunas-events (zydrunas-events)",
+                        "@name": chart.datasource
+                    }
+                }
+            pane = panes.get(chart.mark_class)
+            if pane is None:
+                pane = panes[chart.mark_class] = {
+                    "pane": {
+                        "@selection-relaxation-option": "selection-relaxation-allow",
+                        "view": {
+                            "breakdown": {
+                                "@value": "auto"
                             }
                         },
+                        "mark": {
+                            "@class": chart.mark_class
+                        }
+                    }
+                }
+            yield {
+                "@name": chart.title,
+                "table": {
+                    "view": {
+                        "datasources": datasource,
                         "datasource-dependencies": {
-                            "@datasource": sheet_objects['columns']['@datasource'],
-                            "column-instance": [],
-                            "column": []
+                            "@datasource": chart.datasource,
+                            "column-instance": chart.column_instances,
+                            "column": chart.columns
                         },
-                        "aggregation": {
-                            "@value": "true"
-                        }
+                        "aggregation": aggregation
                     },
                     "style": None,
-                    "panes": {
-                        "pane": {
-                            "@selection-relaxation-option": sheet_objects['dimensions']['pane']['@selection-relaxation-option'],
-                            "view": {
-                                "breakdown": {
-                                    "@value": "auto"
-                                }
-                            },
-                            "mark": {
-                                "@class": sheet_objects['dimensions']['pane']['mark']['@class']
-                            }
-                        }
-                    },
-                    "rows": sheet_objects['dimensions']['y_dimension'],
-                    "cols": sheet_objects['dimensions']['x_dimension'] if 'x_dimension' in sheet_objects['dimensions'] else None
+                    "panes": pane,
+                    "rows": chart.y_dimension,
+                    "cols": chart.x_dimension
                 },
                 "simple-id": {
-                    "@uuid": sheet_info['Sheet_Id']
+                    "@uuid": chart.sheet_id
                 }
             }
 
-            # Process columns and column instances
-            for col in sheet_objects['columns']['column']:
-                worksheet['table']['view']['datasource-dependencies']['column'].append({
-                    "@caption": col.get('@caption', ''),
-                    "@datatype": col['@datatype'],
-                    "@name": col['@name'],
-                    "@role": col['@role'],
-                    "@type": col['@type']
-                })
-
-            for instance in sheet_objects['columns']['column-instance']:
-                worksheet['table']['view']['datasource-dependencies']['column-instance'].append({
-                    "@column": instance['@column'],
-                    "@derivation": instance['@derivation'],
-                    "@name": instance['@name'],
-                    "@pivot": instance['@pivot'],
-                    "@type": instance['@type']
-                })
-
-            transformed_data['worksheets']['worksheet'].append(worksheet)
-
-        return transformed_data
-
-    def convert(self):
-        """Main conversion function to read the input JSON and write the result to the output."""
-        common_layer = self.load_input_json()
-        result = self.generate_all_charts(common_layer['Workbook'])
-        result_xml = self.transform(result)
-
-        # Save as JSON
-        self.save_json(result_xml)
-
-        # Convert and print as XML (you can also save this to a file)
-        output = self.convert_to_xml({"Workbook": result_xml})
-        with open('tableau-result.xml', 'w') as result_file:
-            result_file.write(output)
-
-
-# Usage
-converter = commonToTableauConverter('common_layer.json', 'result-common-to-tableau.json')
-converter.convert()
+    def convert(self, pretty=True, write_json=True, common_layer=None, pretty_json=False):
+        """Main conversion function to read the input JSON and write the result to the output.
+
+        Worksheets are written to the XML (and, unless write_json is False, the JSON)
+        output as they are generated, so no whole-workbook document is built in memory.
+        An already loaded common_layer is used instead of reading input_path.  The JSON
+        output is compact unless pretty_json is True.
+        """
+        with self.metrics.stage("tableau"):
+            if common_layer is None:
+                common_layer = self.load_input_json()
+            result = self.generate_all_charts(common_layer['Workbook'])
+
+            json_file = open(self.output_path, 'w') if write_json else None
+            try:
+                json_writer = JsonArrayWriter(json_file, "worksheets", "worksheet", pretty_json) if json_file else None
+                with open(self.xml_output_path, 'w') as result_file:
+                    xml_writer = TableauXmlWriter(result_file, pretty)
+                    xml_writer.open("Workbook")
+                    xml_writer.open("worksheets")
+                    for worksheet in self.iter_worksheets(result):
+                        xml_writer.element("worksheet", worksheet)
+                        if json_writer:
+                            json_writer.write(worksheet)
+                    xml_writer.close()
+                    xml_writer.close()
+                    self.metrics.add("bytes_written", result_file.tell())
+                if json_writer:
+                    json_writer.close()
+                    self.metrics.add("bytes_written", json_file.tell())
+            finally:
+                if json_file:
+                    json_file.close()
+
+
+if __name__ == '__main__':
+    converter = commonToTableauConverter('common_layer.json', 'result-common-to-tableau.json')
+    converter.convert(pretty_json=True)
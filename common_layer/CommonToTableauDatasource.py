@@ -1,57 +1,62 @@
-import xml.etree.ElementTree as ET
-import json
+import os
+
+import JsonBackend
+from ColumnCatalog import parse_datasource_xml
+from CommonLayerStore import CommonLayerStore, atomic_write
+from StageMetrics import NULL_METRICS
 
 class CommonToTableauDatasource:
-    def __init__(self, common_layer_path, datasource_path):
+    def __init__(self, common_layer_path, datasource_path, common_layer=None, metrics=None, pretty_json=False,
+                 datasource_cache=None):
+        # With an in-memory common_layer, common_layer_path may be None and nothing is saved
         self.common_layer_path = common_layer_path
         self.datasource_path = datasource_path
-        self.common_layer = self.load_json(common_layer_path)
-        self.datasource_xml = self.load_xml(datasource_path)
+        self.pretty_json = pretty_json
+        # A CommonLayerStore folder is updated shard by shard; its sheets are never read
+        self.store = None
+        if common_layer is None and CommonLayerStore.is_store(common_layer_path):
+            self.store = CommonLayerStore(common_layer_path, pretty_json)
+            common_layer = self.store.open_workbook()
+        self.common_layer = self.load_json(common_layer_path) if common_layer is None else common_layer
         self.datasource_info = {}
         self.columns = {}
+        # Optional StageMetrics recording the "datasource" stage
+        self.metrics = metrics or NULL_METRICS
+        # Optional DatasourceCache; the datasource file is then only parsed when it changed
+        self.datasource_cache = datasource_cache
 
     def load_json(self, path):
-        with open(path, 'r') as file:
-            return json.load(file)
-
-    def load_xml(self, path):
-        with open(path, 'r') as file:
-            return file.read()
+        return JsonBackend.load_file(path)
 
     def parse_datasource_xml(self):
-        try:
-            root = ET.fromstring(self.datasource_xml)
-            for datasource in root.findall('.//datasource'):
-                self.datasource_info['name'] = datasource.get('name')
-                self.datasource_info['caption'] = datasource.get('caption')
-            for column in root.findall(".//column"):
-                role = column.get('role')
-                type_ = column.get('type')
-                if role and type_:
-                    self.columns[column.get('name')] = {
-                        'datatype': column.get('datatype'),
-                        'name': column.get('name'),
-                        'role': role,
-                        'type': type_
-                    }
-        except ET.ParseError:
-            raise ValueError("Invalid XML data")
+        # Streamed with iterparse rather than loading the whole datasource file
+        with self.metrics.stage("datasource"):
+            if self.datasource_cache is not None:
+                self.datasource_info, self.columns = self.datasource_cache.get(self.datasource_path)
+            else:
+                self.datasource_info, self.columns = parse_datasource_xml(self.datasource_path)
+            if self.metrics.enabled:
+                self.metrics.add("bytes_read", os.path.getsize(self.datasource_path))
+                self.metrics.add("objects", len(self.columns))
 
     def update_common_layer(self):
         # Assuming the location to insert XML data is in the 'data_source' section of common_layer
         data_source_section = self.common_layer['Workbook']['data_source']
         data_source_section.update(self.datasource_info)
         data_source_section['columns'] = self.columns
-        self.save_updated_json()
+        if self.store is not None:
+            self.store.save_data_source(data_source_section)
+        elif self.common_layer_path:
+            self.save_updated_json()
 
     def save_updated_json(self):
-        with open(self.common_layer_path, 'w') as file:
-            json.dump(self.common_layer, file, indent=4)
+        atomic_write(self.common_layer_path, JsonBackend.dumpb(self.common_layer, self.pretty_json))
 
     def run_conversion(self):
         self.parse_datasource_xml()
         self.update_common_layer()
+        return self.common_layer
 
-# Example usage
-converter = CommonToTableauDatasource('common_layer.json', 'input-data-source.txt')
-converter.run_conversion()
+if __name__ == '__main__':
+    converter = CommonToTableauDatasource('common_layer.json', 'input-data-source.txt', pretty_json=True)
+    converter.run_conversion()
@@ -0,0 +1,142 @@
+import os
+import hashlib
+import tempfile
+from collections import OrderedDict
+
+import JsonBackend
+
+# Bump when the cached simplified_view / common layer layouts change
+CACHE_FORMAT_VERSION = "2"
+COMMON_LAYER_DIR = os.path.dirname(os.path.abspath(__file__))
+MAPPING_CONFIG_PATH = os.path.join(COMMON_LAYER_DIR, 'dictionary', 'config.yaml')
+# The modules whose code produces the cached "simplify" and "common" results
+CODE_PATHS = (
+    os.path.join(os.path.dirname(COMMON_LAYER_DIR), 'QVFJsonSimplifier.py'),
+    os.path.join(COMMON_LAYER_DIR, 'QlikToCommonConverter.py'),
+    os.path.join(COMMON_LAYER_DIR, 'QlikExpressionParser.py'),
+)
+
+
+def mapping_config_version(path=MAPPING_CONFIG_PATH):
+    """Digest of the mapping config, so editing the mappings invalidates cached results."""
+    try:
+        with open(path, 'rb') as file:
+            return hashlib.sha256(file.read()).hexdigest()
+    except FileNotFoundError:
+        return ""
+
+
+def code_version(paths=CODE_PATHS):
+    """Digest of the converter sources, so upgrading the converters invalidates cached results."""
+    digest = hashlib.sha256()
+    for path in paths:
+        try:
+            with open(path, 'rb') as file:
+                digest.update(file.read())
+        except FileNotFoundError:
+            pass
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class ConversionCache:
+    """Content-addressed on-disk cache of per-sheet conversion results.
+
+    Entries live in cache_dir as <namespace>-<key>.json.  A key is a sha256 over the
+    inputs that produced the entry plus the cache version (format, mapping config and
+    converter code), so stale entries are never hit, they just age out: reads refresh an
+    entry's mtime and the least recently used entries are removed once the cache grows
+    past max_bytes.  Several processes may share cache_dir; the folder is scanned again
+    before evicting and after every max_bytes / 16 written, so their entries count too.
+    """
+
+    def __init__(self, cache_dir, max_bytes=256 * 1024 * 1024, version=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        if version is None:
+            version = f"{mapping_config_version()}:{code_version()}"
+        self.version = f"{CACHE_FORMAT_VERSION}:{version}"
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        # file name -> size, oldest first
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        # Bytes this process wrote since the scan
+        self.written_bytes = 0
+        found = []
+        with os.scandir(self.cache_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith('.json') and entry.is_file():
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        # Evicted by another process meanwhile
+                        continue
+                    found.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, name, size in sorted(found):
+            self.entries[name] = size
+            self.total_bytes += size
+
+    def key(self, *parts):
+        """Return the cache key for the given str / bytes parts."""
+        digest = hashlib.sha256(self.version.encode())
+        for part in parts:
+            digest.update(b'\0')
+            digest.update(part.encode() if isinstance(part, str) else part)
+        return digest.hexdigest()
+
+    def _path(self, name):
+        return os.path.join(self.cache_dir, name)
+
+    def get(self, namespace, key):
+        """Return the cached value or None."""
+        name = f"{namespace}-{key}.json"
+        try:
+            value = JsonBackend.load_file(self._path(name))
+        except (FileNotFoundError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        try:
+            os.utime(self._path(name))
+        except FileNotFoundError:
+            pass
+        if name in self.entries:
+            self.entries.move_to_end(name)
+        return value
+
+    def put(self, namespace, key, value):
+        name = f"{namespace}-{key}.json"
+        # Write to a temp file first so concurrent workers never read a partial entry
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(JsonBackend.dumpb(value))
+            size = os.path.getsize(temp_path)
+            os.replace(temp_path, self._path(name))
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        self.total_bytes += size - self.entries.pop(name, 0)
+        self.entries[name] = size
+        self.written_bytes += size
+        if self.total_bytes > self.max_bytes or self.written_bytes > self.max_bytes // 16:
+            self.evict()
+
+    def evict(self):
+        # Other processes writing to the folder are only seen by scanning it
+        self._scan()
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            name, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(self._path(name))
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries), "bytes": self.total_bytes}
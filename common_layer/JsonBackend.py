@@ -0,0 +1,95 @@
+import os
+import json
+
+# Optional fast encoders, used in this order of preference when installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+AVAILABLE_BACKENDS = tuple(name for name, module in (("orjson", orjson), ("ujson", ujson), ("json", json))
+                           if module is not None)
+
+
+class JsonBackend:
+    """loads / dumps over one JSON library, compact unless pretty=True.
+
+    orjson parses bytes directly, so files are read as bytes and never decoded to str
+    first.  Pretty output is indented by 4 spaces, except with orjson, which only
+    supports 2.
+    """
+
+    def __init__(self, name):
+        if name not in AVAILABLE_BACKENDS:
+            raise ValueError(f"JSON backend {name!r} is not available, use one of {AVAILABLE_BACKENDS}")
+        self.name = name
+
+    def loads(self, data):
+        """Decode a str or bytes document."""
+        if self.name == "orjson":
+            return orjson.loads(data)
+        if self.name == "ujson":
+            return ujson.loads(data)
+        return json.loads(data)
+
+    def dumpb(self, value, pretty=False, sort_keys=False):
+        """Encode to UTF-8 bytes."""
+        if self.name == "orjson":
+            option = (orjson.OPT_INDENT_2 if pretty else 0) | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+            return orjson.dumps(value, option=option)
+        return self.dumps(value, pretty, sort_keys).encode('utf-8')
+
+    def dumps(self, value, pretty=False, sort_keys=False):
+        """Encode to str."""
+        if self.name == "orjson":
+            return self.dumpb(value, pretty, sort_keys).decode('utf-8')
+        if self.name == "ujson":
+            return ujson.dumps(value, indent=4 if pretty else 0, sort_keys=sort_keys, ensure_ascii=False,
+                               escape_forward_slashes=False)
+        if pretty:
+            return json.dumps(value, indent=4, sort_keys=sort_keys, ensure_ascii=False)
+        return json.dumps(value, separators=(',', ':'), sort_keys=sort_keys, ensure_ascii=False)
+
+    def load_file(self, path):
+        with open(path, 'rb') as file:
+            return self.loads(file.read())
+
+    def dump_file(self, value, path, pretty=False):
+        with open(path, 'wb') as file:
+            file.write(self.dumpb(value, pretty))
+
+
+# QLIK_JSON_BACKEND=json (or ujson) pins a backend, e.g. to compare output with the stdlib
+backend = JsonBackend(os.environ.get("QLIK_JSON_BACKEND") or AVAILABLE_BACKENDS[0])
+
+
+def set_backend(name):
+    """Switch the process-wide backend; returns the previous one."""
+    global backend
+    previous = backend
+    backend = JsonBackend(name)
+    return previous
+
+
+def loads(data):
+    return backend.loads(data)
+
+
+def dumps(value, pretty=False, sort_keys=False):
+    return backend.dumps(value, pretty, sort_keys)
+
+
+def dumpb(value, pretty=False, sort_keys=False):
+    return backend.dumpb(value, pretty, sort_keys)
+
+
+def load_file(path):
+    return backend.load_file(path)
+
+
+def dump_file(value, path, pretty=False):
+    backend.dump_file(value, path, pretty)
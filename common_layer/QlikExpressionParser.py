@@ -0,0 +1,340 @@
+import re
+from functools import lru_cache
+
+# One alternation per token kind; tried in order at each position, no backtracking between kinds.
+# A set expression only has its opening brace matched here, scan_set_expression finds its end.
+TOKEN_PATTERN = re.compile(r"""
+    (?P<ws>\s+|//[^\n]*|/\*.*?\*/)
+  | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+  | (?P<string>'(?:[^']|'')*')
+  | (?P<field>\[[^\]]*\]|"(?:[^"]|"")*"|`[^`]*`)
+  | (?P<variable>\$\([^()]*\))
+  | (?P<name>[A-Za-z_\u0080-\uffff#@][\w.#@$\u0080-\uffff]*)
+  | (?P<set>\{)
+  | (?P<op><=|>=|<>|[-+*/&=<>^,()])
+""", re.VERBOSE | re.DOTALL)
+
+# Binary operator precedence, loosest first
+PRECEDENCE = {
+    'or': 1, 'xor': 1,
+    'and': 2,
+    '=': 3, '<>': 3, '<': 3, '>': 3, '<=': 3, '>=': 3, 'like': 3,
+    '&': 4,
+    '+': 5, '-': 5,
+    '*': 6, '/': 6,
+    '^': 7,
+}
+WORD_OPERATORS = {'and', 'or', 'xor', 'like', 'not'}
+QUALIFIERS = {'distinct', 'total', 'all', 'nodistinct'}
+# Formatting, conditional and inter-record wrappers; the aggregation is looked up inside them
+PASS_THROUGH_FUNCTIONS = {
+    'num', 'text', 'dual', 'money', 'date', 'if', 'alt', 'coalesce', 'round', 'floor', 'ceil', 'fabs',
+    'aggr', 'rangesum', 'rangeavg', 'rangemin', 'rangemax', 'rangecount', 'above', 'below', 'before', 'after',
+    'top', 'bottom', 'first', 'last',
+}
+
+
+class QlikExpressionError(ValueError):
+    pass
+
+
+class Call:
+    __slots__ = ('name', 'args', 'set_expression', 'qualifiers')
+
+    def __init__(self, name, args, set_expression=None, qualifiers=()):
+        self.name = name
+        self.args = args
+        self.set_expression = set_expression
+        self.qualifiers = qualifiers
+
+    def __repr__(self):
+        return f"Call({self.name!r}, {self.args!r}, {self.set_expression!r}, {self.qualifiers!r})"
+
+
+class Field:
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return f"Field({self.name!r})"
+
+
+class Literal:
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __repr__(self):
+        return f"Literal({self.value!r})"
+
+
+class Variable:
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return f"Variable({self.name!r})"
+
+
+class BinaryOp:
+    __slots__ = ('op', 'left', 'right')
+
+    def __init__(self, op, left, right):
+        self.op = op
+        self.left = left
+        self.right = right
+
+    def __repr__(self):
+        return f"BinaryOp({self.op!r}, {self.left!r}, {self.right!r})"
+
+
+class UnaryOp:
+    __slots__ = ('op', 'operand')
+
+    def __init__(self, op, operand):
+        self.op = op
+        self.operand = operand
+
+    def __repr__(self):
+        return f"UnaryOp({self.op!r}, {self.operand!r})"
+
+
+def tokenize(text):
+    """Return the (kind, value) tokens of a Qlik expression, without whitespace and comments."""
+    tokens = []
+    pos = 0
+    length = len(text)
+    while pos < length:
+        match = TOKEN_PATTERN.match(text, pos)
+        if match is None:
+            raise QlikExpressionError(f"Unexpected character {text[pos]!r} at {pos} in {text!r}")
+        kind = match.lastgroup
+        if kind == 'set':
+            end = scan_set_expression(text, pos)
+            tokens.append((kind, text[pos:end], pos))
+            pos = end
+            continue
+        if kind != 'ws':
+            value = match.group()
+            if kind == 'name' and value.lower() in WORD_OPERATORS:
+                kind, value = 'op', value.lower()
+            tokens.append((kind, value, match.start()))
+        pos = match.end()
+    return tokens
+
+
+# Quoted runs inside a set expression, skipped whole so their braces do not count
+SET_QUOTED = re.compile(r"'(?:[^']|'')*'|\"[^\"]*\"|\[[^\]]*\]")
+SET_BRACE = re.compile(r"[{}'\"\[]")
+
+
+def scan_set_expression(text, pos):
+    """Return the offset just past the balanced {...} set expression starting at pos."""
+    depth = 0
+    while True:
+        match = SET_BRACE.search(text, pos)
+        if match is None:
+            raise QlikExpressionError(f"Unterminated set expression in {text!r}")
+        char = match.group()
+        if char == '{':
+            depth += 1
+            pos = match.end()
+        elif char == '}':
+            depth -= 1
+            pos = match.end()
+            if depth == 0:
+                return pos
+        else:
+            quoted = SET_QUOTED.match(text, match.start())
+            if quoted is None:
+                raise QlikExpressionError(f"Unterminated quote in set expression of {text!r}")
+            pos = quoted.end()
+
+
+def unquote_field(token):
+    if token[0] == '[':
+        return token[1:-1]
+    if token[0] == '"':
+        return token[1:-1].replace('""', '"')
+    return token[1:-1]
+
+
+class Parser:
+    """Recursive descent parser over the tokens of one expression."""
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.index = 0
+
+    def peek(self):
+        if self.index < len(self.tokens):
+            return self.tokens[self.index]
+        return (None, None, len(self.text))
+
+    def advance(self):
+        token = self.peek()
+        self.index += 1
+        return token
+
+    def expect(self, value):
+        kind, token, pos = self.advance()
+        if token != value:
+            raise QlikExpressionError(f"Expected {value!r} at {pos} in {self.text!r}")
+
+    def parse(self):
+        # A chart expression may start with '=' (calculated dimension)
+        if self.peek()[1] == '=':
+            self.advance()
+        node = self.parse_binary(1)
+        if self.index != len(self.tokens):
+            raise QlikExpressionError(f"Unexpected {self.peek()[1]!r} at {self.peek()[2]} in {self.text!r}")
+        return node
+
+    def parse_binary(self, min_precedence):
+        left = self.parse_unary()
+        while True:
+            kind, op, _ = self.peek()
+            precedence = PRECEDENCE.get(op) if kind == 'op' else None
+            if precedence is None or precedence < min_precedence:
+                return left
+            self.advance()
+            left = BinaryOp(op, left, self.parse_binary(precedence + 1))
+
+    def parse_unary(self):
+        kind, op, _ = self.peek()
+        if kind == 'op' and op in ('-', '+', 'not'):
+            self.advance()
+            return UnaryOp(op, self.parse_unary())
+        return self.parse_primary()
+
+    def parse_primary(self):
+        kind, value, pos = self.advance()
+        if kind == 'number':
+            return Literal(float(value) if any(c in value for c in '.eE') else int(value))
+        if kind == 'string':
+            return Literal(value[1:-1].replace("''", "'"))
+        if kind == 'field':
+            return Field(unquote_field(value))
+        if kind == 'variable':
+            return Variable(value[2:-1].strip())
+        if kind == 'name':
+            if self.peek()[1] == '(':
+                self.advance()
+                return self.parse_call(value)
+            return Field(value)
+        if value == '(':
+            node = self.parse_binary(1)
+            self.expect(')')
+            return node
+        raise QlikExpressionError(f"Unexpected {value!r} at {pos} in {self.text!r}")
+
+    def parse_call(self, name):
+        set_expression = None
+        qualifiers = []
+        args = []
+        if self.peek()[0] == 'set':
+            set_expression = self.advance()[1]
+        while self.peek()[0] == 'name' and self.peek()[1].lower() in QUALIFIERS:
+            qualifier = self.advance()[1].lower()
+            if qualifier == 'total' and self.peek()[1] == '<':
+                # TOTAL <field, ...> keeps the listed dimensions
+                while self.advance()[1] not in ('>', None):
+                    pass
+            qualifiers.append(qualifier)
+        if self.peek()[1] != ')':
+            args.append(self.parse_binary(1))
+            while self.peek()[1] == ',':
+                self.advance()
+                args.append(self.parse_binary(1))
+        self.expect(')')
+        return Call(name, tuple(args), set_expression, tuple(qualifiers))
+
+
+@lru_cache(maxsize=8192)
+def parse_expression(text):
+    """Parse a Qlik expression into an AST; results are memoized, treat them as read-only."""
+    return Parser(text).parse()
+
+
+def child_nodes(node, values_first=False):
+    """Return the children of node in source order.
+
+    With values_first the condition of an If() comes after its value branches.
+    """
+    if isinstance(node, Call):
+        if values_first and node.name.lower() == 'if' and len(node.args) > 1:
+            return node.args[1:] + node.args[:1]
+        return node.args
+    if isinstance(node, BinaryOp):
+        return (node.left, node.right)
+    if isinstance(node, UnaryOp):
+        return (node.operand,)
+    return ()
+
+
+def iter_nodes(node, values_first=False):
+    """Depth-first walk over the AST, parents before children."""
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed(child_nodes(node, values_first)))
+
+
+def first_field(node):
+    """Return the first field of node, looking in the value branches of an If() before its condition."""
+    for child in iter_nodes(node, values_first=True):
+        if isinstance(child, Field):
+            return child.name
+    return ""
+
+
+def first_call(node):
+    """Return the first call that is not a pass-through wrapper, else the outermost call."""
+    outermost = None
+    for child in iter_nodes(node):
+        if isinstance(child, Call):
+            if child.name.lower() not in PASS_THROUGH_FUNCTIONS:
+                return child
+            if outermost is None:
+                outermost = child
+    return outermost
+
+
+def describe_expression(text):
+    """Return {"aggregation", "column", ...} for the main function call of an expression.
+
+    The aggregation is the lower-cased name of the first call that is not a formatting or
+    conditional wrapper ("none" for a bare field), the column the first field it is applied
+    to.  Count(DISTINCT x) becomes "countd"; a set expression and other qualifiers are kept
+    under "set_expression" / "qualifiers".  Each call returns a new dict and list.
+    """
+    description = dict(_describe_expression(text))
+    if "qualifiers" in description:
+        description["qualifiers"] = list(description["qualifiers"])
+    return description
+
+
+@lru_cache(maxsize=8192)
+def _describe_expression(text):
+    ast = parse_expression(text)
+    call = first_call(ast)
+    if call is None:
+        return (("aggregation", "none"), ("column", first_field(ast)))
+    aggregation = call.name.lower()
+    if aggregation == 'count' and 'distinct' in call.qualifiers:
+        aggregation = 'countd'
+    description = [("aggregation", aggregation), ("column", first_field(call))]
+    if call.set_expression:
+        description.append(("set_expression", call.set_expression))
+    # Memoized and shared between callers, so only immutable values are kept
+    qualifiers = tuple(q for q in call.qualifiers if not (q == 'distinct' and aggregation == 'countd'))
+    if qualifiers:
+        description.append(("qualifiers", qualifiers))
+    return tuple(description)
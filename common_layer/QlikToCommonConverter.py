@@ -1,39 +1,108 @@
-import json
+import functools
 
-class commonConverter:
-    # Static variable to hold the template
-    TEMPLATE = {
+import JsonBackend
+from QlikExpressionParser import describe_expression, QlikExpressionError
+from SheetSelection import SELECT_ALL
+from StageMetrics import NULL_METRICS
+
+def new_common_workbook(data_source_name, table_name="<name_of_table_in_ds>"):
+    """Return an empty common layer workbook for the given data source."""
+    return {
         "Workbook": {
             "data_source": {
-                "data_source_name": None,  # To be filled later
-                "table_name": "<name_of_table_in_ds>",  # Placeholder
+                "data_source_name": data_source_name,
+                "table_name": table_name,
                 "unique_script": "unique_script_for_this_data_source"  # Placeholder
             }
         }
     }
 
-    def __init__(self, input_file):
-        with open(input_file, 'r') as file:
-            self.data = json.load(file)
 
-    def qlik_to_common(self):
-        # Initialize the template
-        common_format = json.loads(json.dumps(self.TEMPLATE))  # Deep copy of the template
-        common_format["Workbook"]["data_source"]["data_source_name"] = self.data["data_sources"][0]
+@functools.lru_cache(maxsize=None)
+def is_chart_type(obj_type):
+    """Charts and tables are converted, other sheet objects (text, filter panes, ...) are not."""
+    obj_type = obj_type.lower()
+    return "chart" in obj_type or "table" in obj_type
+
+
+class commonConverter:
+    def __init__(self, input_file=None, cache=None, data=None, metrics=None, selection=None):
+        # Optional StageMetrics recording the "common_layer" stage per sheet
+        self.metrics = metrics or NULL_METRICS
+        # data is an already loaded simplified view, e.g. straight from QVFJsonSimplifier
+        if data is None:
+            data = JsonBackend.load_file(input_file)
+        self.data = data
+        # Optional ConversionCache; unchanged sheets are then served from it
+        self.cache = cache
+        # Optional SheetSelection, for simplified views that were not already filtered by it
+        self.selection = selection or SELECT_ALL
+
+    def qlik_to_common(self, sheets=None):
+        """Convert the simplified view to the common layer workbook.
+
+        sheets, an iterable of (sheet name, simplified sheet), replaces data["ws_sheets"] so
+        sheets can be streamed in one at a time; data's data_sources and load_statements
+        are only read once it is exhausted (see QVFJsonSimplifier.iter_simplified_view).
+        """
+        with self.metrics.stage("common_layer"):
+            # The data source is filled in after the sheets, its keys stay first
+            common_format = new_common_workbook(None)
+
+            # Process each sheet
+            sheet_digests = self.data.get("sheet_digests", {})
+            for sheet_name, sheet_data in (self.data["ws_sheets"].items() if sheets is None else sheets):
+                if not self.sheet_selected(sheet_data):
+                    continue
+                with self.metrics.sheet(sheet_name):
+                    if self.cache is None:
+                        common_format["Workbook"][sheet_name] = self.process_sheet(sheet_data)
+                    else:
+                        common_format["Workbook"][sheet_name] = self.cached_process_sheet(sheet_data, sheet_digests.get(sheet_name))
 
-        # Process each sheet
-        for sheet_name in self.data["ws_sheets"]:
-            common_format["Workbook"][sheet_name] = self.process_sheet(self.data["ws_sheets"][sheet_name])
+            data_sources = self.data.get("data_sources", [])
+            data_source_name = data_sources[0] if data_sources else None
+            data_source = common_format["Workbook"]["data_source"]
+            data_source["data_source_name"] = data_source_name
+            data_source["table_name"] = self.find_table_name(data_source_name)
+            return common_format
 
-        return common_format
+    def sheet_selected(self, sheet_data):
+        if not self.selection.filters_sheets:
+            return True
+        sheet_info = sheet_data.get("Document", sheet_data).get("sheet_info", {})
+        return self.selection.match_sheet(sheet_info.get("SheetId", ""), sheet_info.get("Title", ""))
+
+    def find_table_name(self, data_source_name):
+        """Return the script table loaded from the data source file, or the placeholder."""
+        for statement in self.data.get("load_statements", []):
+            if statement["table"] and statement["source_stem"] == data_source_name:
+                return statement["table"]
+        return "<name_of_table_in_ds>"
+
+    def cached_process_sheet(self, sheet_data, sheet_digest=None):
+        # The simplifier's per-sheet digest already covers the sheet's inputs; hash the sheet otherwise
+        digest = self.cache.key(sheet_digest or JsonBackend.dumpb(sheet_data, sort_keys=True))
+        if self.selection.filters_objects:
+            digest = self.cache.key(digest, self.selection.object_key())
+        sheet_objects = self.cache.get("common", digest)
+        self.metrics.add("cache_misses" if sheet_objects is None else "cache_hits")
+        if sheet_objects is None:
+            sheet_objects = self.process_sheet(sheet_data)
+            self.cache.put("common", digest, sheet_objects)
+        return sheet_objects
 
     def process_sheet(self, sheet_data):
+        # QVFJsonSimplifier wraps each sheet in a "Document" key
+        sheet_data = sheet_data.get("Document", sheet_data)
         sheet_objects = {}
         for obj in sheet_data["sheet_objects"]:
-            if "chart" in obj["sheet_object_info"]["Type"].lower() or "table" in obj["sheet_object_info"]["Type"].lower():
-                object_id = obj["sheet_object_info"]["ObjectId"]
+            object_info = obj["sheet_object_info"]
+            if is_chart_type(object_info["Type"]) and self.selection.match_object(object_info["ObjectId"], object_info["Type"]):
+                object_id = object_info["ObjectId"]
                 object_info = self.process_object(obj)
                 sheet_objects[object_id] = object_info
+                self.metrics.add("objects")
         return sheet_objects
 
     def process_object(self, obj):
@@ -41,9 +110,10 @@ class commonConverter:
         obj_type = obj["sheet_object_info"]["Type"]
         obj_caption = obj["sheet_object_info"].get("Caption", "No Caption")
 
-        # Extract equations
-        x_aggregation, x_column = self.extract_equation(obj["dimension"]) if obj["dimension"] else ("", "")
-        y_aggregation, y_column = self.extract_equation(obj["expression"]) if obj["expression"] else ("", "")
+        # Every dimension and measure; x_equation / y_equation stay the first of each
+        dimensions = [self.extract_equation(entry) for entry in obj["dimension"]]
+        measures = [self.extract_equation(entry) for entry in obj["expression"]]
+        empty_equation = {"aggregation": "", "column": ""}
 
         return {
             "description": {
@@ -51,30 +121,44 @@ class commonConverter:
                 "title": obj_caption,
                 "position": "Add Position Here"  # Placeholder
             },
-            "x_equation": {
-                "aggregation": x_aggregation,
-                "column": x_column
-            },
-            "y_equation": {
-                "aggregation": y_aggregation,
-                "column": y_column
-            }
+            "x_equation": dimensions[0] if dimensions else empty_equation,
+            "y_equation": measures[0] if measures else empty_equation,
+            "dimensions": dimensions,
+            "measures": measures
         }
 
-    def extract_equation(self, equation_list):
-        equation = equation_list[0]["PseudoDef"] if "PseudoDef" in equation_list[0] else equation_list[0]["Definition"]
-        return self.parse_equation(equation)
-    
+    def extract_equation(self, entry):
+        """Describe one simplified dimension or measure entry."""
+        equation = entry["PseudoDef"] if "PseudoDef" in entry else entry["Definition"]
+        if isinstance(equation, list):
+            # Master dimensions carry their qFieldDefs list
+            equation = equation[0] if equation else ""
+        return self.describe_equation(equation)
+
+    def describe_equation(self, equation):
+        """Return the common layer equation: aggregation, column and any set analysis / qualifiers."""
+        try:
+            description = describe_expression(equation)
+        except QlikExpressionError:
+            # Not a valid Qlik expression, keep the old best-effort split
+            aggregation, column = self.split_equation(equation)
+            return {"aggregation": aggregation, "column": column}
+        description["column"] = description["column"].lower()
+        return description
+
     def parse_equation(self, equation):
+        description = self.describe_equation(equation)
+        return description["aggregation"], description["column"]
+
+    def split_equation(self, equation):
         parts = equation.split('(')
         func = parts[0].strip('=') if len(parts) > 1 else "None"
         column_name = parts[-1].strip(')')
         return func.lower(), column_name.lower()
 
-# Usage
-converter = commonConverter('result-qlik.json')
-converted_data = converter.qlik_to_common()
+if __name__ == '__main__':
+    converter = commonConverter('result-qlik.json')
+    converted_data = converter.qlik_to_common()
 
-# To save the converted data
-with open('common_layer.json', 'w') as f:
-    json.dump(converted_data, f, indent=4)
+    # To save the converted data
+    JsonBackend.dump_file(converted_data, 'common_layer.json', pretty=True)
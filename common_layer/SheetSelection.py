@@ -0,0 +1,70 @@
+import re
+import fnmatch
+
+
+def compile_globs(patterns):
+    """One case-insensitive regex matching any of the fnmatch patterns, or None for no patterns."""
+    if not patterns:
+        return None
+    return re.compile('|'.join(fnmatch.translate(pattern) for pattern in patterns), re.IGNORECASE)
+
+
+class SheetSelection:
+    """Which sheets and objects of an app to convert.
+
+    Sheets are picked by id or by title glob, objects by id or by type glob (e.g. "*chart",
+    "table").  Every criterion given must match, one that is not given does not filter,
+    so SheetSelection() selects everything.  Ids match exactly, globs case-insensitively.
+    """
+
+    def __init__(self, sheet_ids=(), titles=(), object_types=(), object_ids=()):
+        self.sheet_ids = frozenset(sheet_ids)
+        self.titles = tuple(titles)
+        self.object_types = tuple(object_types)
+        self.object_ids = frozenset(object_ids)
+        self.title_pattern = compile_globs(self.titles)
+        self.type_pattern = compile_globs(self.object_types)
+
+    @classmethod
+    def from_args(cls, args):
+        """Build the selection from the --sheet / --title / --type / --object options of add_arguments."""
+        return cls(args.sheet or (), args.title or (), args.type or (), args.object or ())
+
+    @staticmethod
+    def add_arguments(parser):
+        parser.add_argument('--sheet', action='append', metavar='ID', help="only convert this sheet id (repeatable)")
+        parser.add_argument('--title', action='append', metavar='GLOB',
+                            help="only convert sheets whose title matches this glob (repeatable)")
+        parser.add_argument('--type', action='append', metavar='GLOB',
+                            help="only convert objects whose type matches this glob, e.g. barchart (repeatable)")
+        parser.add_argument('--object', action='append', metavar='ID', help="only convert this object id (repeatable)")
+
+    @property
+    def filters_sheets(self):
+        return bool(self.sheet_ids or self.titles)
+
+    @property
+    def filters_objects(self):
+        return bool(self.object_ids or self.object_types)
+
+    def match_sheet(self, sheet_id, title):
+        if self.sheet_ids and sheet_id not in self.sheet_ids:
+            return False
+        return self.title_pattern is None or self.title_pattern.match(title or "") is not None
+
+    def match_object(self, object_id, object_type):
+        if self.object_ids and object_id not in self.object_ids:
+            return False
+        return self.type_pattern is None or self.type_pattern.match(object_type or "") is not None
+
+    def object_key(self):
+        """Stable text of the object criteria, for cache keys of per-sheet results."""
+        return repr((sorted(self.object_ids), self.object_types))
+
+    def __repr__(self):
+        return (f"SheetSelection(sheet_ids={sorted(self.sheet_ids)}, titles={list(self.titles)}, "
+                f"object_types={list(self.object_types)}, object_ids={sorted(self.object_ids)})")
+
+
+# Selects every sheet and object
+SELECT_ALL = SheetSelection()
@@ -0,0 +1,228 @@
+import os
+import json
+import time
+import heapq
+
+
+def capture_filters():
+    """Leave the allocations made by the capture itself out of the allocation statistics."""
+    # cProfile, pstats and tracemalloc are only imported once a capture is requested
+    import pstats
+    import cProfile
+    import tracemalloc
+    return (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, cProfile.__file__),
+        tracemalloc.Filter(False, pstats.__file__),
+    )
+
+
+class NullSpan:
+    """Stand-in for Span when metrics are off; every method does nothing."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def add(self, key, value=1):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class NullMetrics:
+    """Recorder used when no metrics were asked for, so instrumented code costs one call per span."""
+    enabled = False
+
+    def stage(self, name):
+        return NULL_SPAN
+
+    def sheet(self, name):
+        return NULL_SPAN
+
+    def add(self, key, value=1):
+        pass
+
+
+NULL_METRICS = NullMetrics()
+
+
+class Span:
+    """One timed stage or sheet; counts added while it is open roll up into its stage."""
+    __slots__ = ('metrics', 'kind', 'stage', 'name', 'counts', 'started', 'cpu_started', 'profile', 'traced_start',
+                 'record')
+
+    def __init__(self, metrics, kind, stage, name):
+        self.metrics = metrics
+        self.kind = kind
+        self.stage = stage
+        self.name = name
+        self.counts = {}
+        self.profile = None
+        self.traced_start = None
+        self.record = None
+
+    def add(self, key, value=1):
+        self.counts[key] = self.counts.get(key, 0) + value
+
+    def __enter__(self):
+        self.metrics.open_spans.append(self)
+        if self.kind == 'sheet':
+            self.metrics.start_capture(self)
+        self.cpu_started = time.process_time()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        wall = time.perf_counter() - self.started
+        cpu = time.process_time() - self.cpu_started
+        self.metrics.open_spans.pop()
+        record = {"type": self.kind, "stage": self.stage}
+        if self.kind == 'sheet':
+            record["sheet"] = self.name
+            self.metrics.stop_capture(self, record)
+        record["wall_seconds"] = wall
+        record["cpu_seconds"] = cpu
+        record.update(self.counts)
+        if "cache_hits" in self.counts or "cache_misses" in self.counts:
+            lookups = self.counts.get("cache_hits", 0) + self.counts.get("cache_misses", 0)
+            record["cache_hit_rate"] = self.counts.get("cache_hits", 0) / lookups
+        self.record = record
+        self.metrics.finish(self)
+        return False
+
+
+class StageMetrics:
+    """Wall / CPU time, bytes, object counts and cache hits per stage and per sheet.
+
+    Instrumented code opens stage() and sheet() spans and add()s counts to the innermost
+    open one.  With profile_slowest=N every sheet runs under cProfile (and tracemalloc
+    with trace_memory=True) and the profiles of the N slowest sheets are kept for
+    write_profiles().  Every traced sheet records its peak and retained bytes; only the
+    kept sheets pay for a snapshot, of the allocations still live when they finish.
+    Records are written with write_jsonl() or write_prometheus().
+    """
+    enabled = True
+
+    def __init__(self, labels=None, profile_slowest=0, trace_memory=False):
+        # labels, e.g. {"app": ...}, are added to every record
+        self.labels = dict(labels or {})
+        self.profile_slowest = profile_slowest
+        self.trace_memory = trace_memory
+        self.records = []
+        self.open_spans = []
+        # (wall seconds, sequence, record, profile stats, top allocations) of the slowest sheets
+        self.slowest = []
+        self._capturing = False
+
+    def stage(self, name):
+        return Span(self, 'stage', name, name)
+
+    def sheet(self, name):
+        stage = self.open_spans[-1].stage if self.open_spans else None
+        return Span(self, 'sheet', stage, name)
+
+    def add(self, key, value=1):
+        if self.open_spans:
+            self.open_spans[-1].add(key, value)
+
+    def finish(self, span):
+        if span.kind == 'sheet' and self.open_spans:
+            # Sheet counts also count for the stage around them
+            parent = self.open_spans[-1]
+            for key, value in span.counts.items():
+                parent.add(key, value)
+        record = dict(self.labels)
+        record.update(span.record)
+        self.records.append(record)
+
+    def start_capture(self, span):
+        if not self.profile_slowest or self._capturing:
+            return
+        import cProfile
+        import tracemalloc
+        self._capturing = True
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            span.traced_start = tracemalloc.get_traced_memory()[0]
+        span.profile = cProfile.Profile()
+        span.profile.enable()
+
+    def stop_capture(self, span, record):
+        if span.profile is None:
+            return
+        span.profile.disable()
+        wall = time.perf_counter() - span.started
+        import pstats
+        import tracemalloc
+        self._capturing = False
+        profile = span.profile
+        span.profile = None
+        if self.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            record["peak_traced_bytes"] = peak
+            record["retained_traced_bytes"] = current - span.traced_start
+        if len(self.slowest) == self.profile_slowest and wall <= self.slowest[0][0]:
+            return
+
+        # Only the sheets that are kept pay for the stats and the snapshot
+        top_allocations = None
+        if self.trace_memory:
+            snapshot = tracemalloc.take_snapshot().filter_traces(capture_filters())
+            top_allocations = [str(stat) for stat in snapshot.statistics('lineno')[:10]]
+        entry = (wall, len(self.records), record, pstats.Stats(profile), top_allocations)
+        if len(self.slowest) < self.profile_slowest:
+            heapq.heappush(self.slowest, entry)
+        else:
+            heapq.heapreplace(self.slowest, entry)
+
+    def write_profiles(self, folder):
+        """Write <stage>-<sheet>.prof (and .txt with the top functions / allocations) per kept sheet."""
+        os.makedirs(folder, exist_ok=True)
+        written = []
+        for wall, _, record, stats, top_allocations in sorted(self.slowest, reverse=True):
+            base = os.path.join(folder, f"{record['stage']}-{record['sheet']}".replace(os.sep, '_'))
+            stats.dump_stats(base + '.prof')
+            with open(base + '.txt', 'w') as fp:
+                fp.write(f"{record['stage']} {record['sheet']}: {wall:.3f}s\n\n")
+                stats.stream = fp
+                stats.sort_stats('cumulative').print_stats(25)
+                if top_allocations:
+                    fp.write("\nLargest live allocations:\n" + "\n".join(top_allocations) + "\n")
+            written.append(base + '.prof')
+        if self.trace_memory:
+            import tracemalloc
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+        return written
+
+    def write_jsonl(self, fp):
+        for record in self.records:
+            fp.write(json.dumps(record) + '\n')
+
+    def write_prometheus(self, fp, prefix="qlik_migration"):
+        """Write the records as Prometheus text exposition, one gauge per numeric field."""
+        series = {}
+        for record in self.records:
+            labels = {key: value for key, value in record.items()
+                      if isinstance(value, str) or value is None}
+            label_text = ','.join(f'{key}="{escape_label(value)}"' for key, value in labels.items()
+                                  if key != 'type' and value is not None)
+            for key, value in record.items():
+                if key in labels or isinstance(value, bool):
+                    continue
+                series.setdefault(f"{prefix}_{record['type']}_{key}", []).append((label_text, value))
+        for name, samples in series.items():
+            fp.write(f"# TYPE {name} gauge\n")
+            for label_text, value in samples:
+                fp.write(f"{name}{{{label_text}}} {value}\n")
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,148 @@
+import json
+
+import JsonBackend
+
+
+# xml.sax.saxutils.escape / quoteattr, without the urllib import that module pulls in
+def escape(data):
+    return data.replace("&", "&amp;").replace(">", "&gt;").replace("<", "&lt;")
+
+
+def quoteattr(data):
+    data = escape(data).replace("\n", "&#10;").replace("\r", "&#13;").replace("\t", "&#9;")
+    if '"' in data:
+        if "'" in data:
+            return '"' + data.replace('"', "&quot;") + '"'
+        return "'" + data + "'"
+    return '"' + data + '"'
+
+
+class TableauXmlWriter:
+    """Incremental XML writer for the xmltodict-style dicts the converter builds.
+
+    Keys starting with '@' are attributes, '#text' is element text, lists repeat the
+    element and None is an empty element.  open() / close() write the enclosing
+    elements so the inner ones can be written one at a time with element(); the output
+    matches xmltodict.unparse(..., pretty=pretty) for the same structure.  A writer
+    with a depth writes a fragment to be placed that deep in a document, without the
+    XML declaration.
+    """
+
+    def __init__(self, fp, pretty=True, indent='\t', newline='\n', depth=0):
+        self.fp = fp
+        self.pretty = pretty
+        self.indent = indent
+        self.newline = newline
+        self.depth = depth
+        self.open_tags = []
+        if not depth:
+            fp.write('<?xml version="1.0" encoding="utf-8"?>\n')
+
+    def _break(self, depth):
+        # Before a start tag; the root element starts right after the declaration
+        if self.pretty and depth:
+            self.fp.write(self.newline + self.indent * depth)
+
+    def _end_break(self, depth):
+        if self.pretty:
+            self.fp.write(self.newline + self.indent * depth)
+
+    def open(self, tag, attributes=None):
+        """Write a start tag whose children follow through element() / open()."""
+        self._break(self.depth + len(self.open_tags))
+        self.fp.write(self._start_tag(tag, attributes or {}))
+        self.open_tags.append(tag)
+
+    def close(self):
+        tag = self.open_tags.pop()
+        # Every element opened with open() is written with children
+        self._end_break(self.depth + len(self.open_tags))
+        self.fp.write(f'</{tag}>')
+
+    def element(self, tag, value):
+        """Write tag with value as one or more complete elements at the current depth."""
+        self._emit(tag, value, self.depth + len(self.open_tags))
+
+    def _start_tag(self, tag, attributes):
+        parts = [tag]
+        for name, value in attributes.items():
+            parts.append(f'{name}={quoteattr(self._text(value))}')
+        return '<' + ' '.join(parts) + '>'
+
+    def _text(self, value):
+        if isinstance(value, bool):
+            return 'true' if value else 'false'
+        return str(value)
+
+    def _emit(self, tag, value, depth):
+        if isinstance(value, list):
+            for item in value:
+                self._emit(tag, item, depth)
+            return
+        write = self.fp.write
+        self._break(depth)
+        if value is None:
+            write(f'<{tag}></{tag}>')
+            return
+        if not isinstance(value, dict):
+            write(f'<{tag}>{escape(self._text(value))}</{tag}>')
+            return
+
+        attributes = {}
+        children = []
+        text = None
+        for key, child in value.items():
+            if key[0] == '@':
+                attributes[key[1:]] = child
+            elif key == '#text':
+                text = child
+            else:
+                children.append((key, child))
+        write(self._start_tag(tag, attributes))
+        if text is not None:
+            write(escape(self._text(text)))
+        for key, child in children:
+            self._emit(key, child, depth + 1)
+        if children:
+            self._end_break(depth)
+        write(f'</{tag}>')
+
+
+class JsonArrayWriter:
+    """Writes {"<outer>": {"<inner>": [items...]}} item by item.
+
+    Compact by default, through JsonBackend; pretty=True gives the json.dump(indent=4) layout.
+    """
+
+    def __init__(self, fp, outer, inner, pretty=False):
+        self.fp = fp
+        self.pretty = pretty
+        self.count = 0
+        if pretty:
+            self.fp.write('{\n    ' + json.dumps(outer) + ': {\n        ' + json.dumps(inner) + ': [')
+        else:
+            self.fp.write('{' + JsonBackend.dumps(outer) + ':{' + JsonBackend.dumps(inner) + ':[')
+
+    @staticmethod
+    def encode(item, pretty=False):
+        """Text of one item as write() lays it out, for items encoded elsewhere (see write_encoded)."""
+        if not pretty:
+            return JsonBackend.dumps(item)
+        return '\n'.join('            ' + line for line in json.dumps(item, indent=4).split('\n'))
+
+    def write(self, item):
+        self.write_encoded(self.encode(item, self.pretty))
+
+    def write_encoded(self, text):
+        if self.pretty:
+            self.fp.write(',\n' if self.count else '\n')
+        elif self.count:
+            self.fp.write(',')
+        self.fp.write(text)
+        self.count += 1
+
+    def close(self):
+        if not self.pretty:
+            self.fp.write(']}}')
+        else:
+            self.fp.write('\n        ]\n    }\n}' if self.count else ']\n    }\n}')
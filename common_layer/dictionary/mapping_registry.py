@@ -0,0 +1,204 @@
+import os
+import re
+import json
+import time
+import fnmatch
+import hashlib
+import tempfile
+import threading
+from types import MappingProxyType
+
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.yaml')
+# Per user, so no other local user can plant or read the compiled tables
+DEFAULT_CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+                                 'qlik-tableau-mappings')
+# Bump when the compiled layout changes so old cache files are ignored
+COMPILED_FORMAT_VERSION = 2
+TABLES = ('function_info', 'chart_info')
+
+
+def freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+class MappingTable:
+    """Frozen lookup table: exact names and aliases case-insensitively, then the rules in order."""
+    __slots__ = ('name', 'entries', 'rules')
+
+    def __init__(self, name, entries, rules):
+        self.name = name
+        # casefolded key or alias -> value
+        self.entries = MappingProxyType({key: freeze(value) for key, value in entries.items()})
+        # (compiled pattern, value)
+        self.rules = tuple((re.compile(pattern, re.IGNORECASE), freeze(value)) for pattern, value in rules)
+
+    def get(self, key, default=None):
+        if key is None:
+            return default
+        value = self.entries.get(str(key).casefold())
+        if value is not None:
+            return value
+        for pattern, value in self.rules:
+            if pattern.search(str(key)):
+                return value
+        return default
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+
+def compile_config(config):
+    """Turn the parsed config.yaml into {table: (entries, [(regex, value)])} of plain objects.
+
+    The result is plain JSON data; MappingTable builds the frozen lookups from it.
+    """
+    aliases = config.get('aliases') or {}
+    rules = config.get('rules') or {}
+    compiled = {}
+    for table in TABLES:
+        values = config.get(table) or {}
+        entries = {str(key).casefold(): value for key, value in values.items()}
+        for alias, target in (aliases.get(table) or {}).items():
+            if target not in values:
+                raise ValueError(f"Alias {alias!r} in {table} refers to unknown entry {target!r}")
+            entries.setdefault(str(alias).casefold(), values[target])
+        table_rules = []
+        for rule in rules.get(table) or []:
+            if 'use' in rule:
+                if rule['use'] not in values:
+                    raise ValueError(f"Rule {rule!r} in {table} refers to unknown entry {rule['use']!r}")
+                value = values[rule['use']]
+            else:
+                value = rule['value']
+            if 'regex' in rule:
+                pattern = rule['regex']
+            else:
+                # fnmatch.translate anchors the glob at both ends
+                pattern = fnmatch.translate(rule['match'])
+            re.compile(pattern)
+            table_rules.append((pattern, value))
+        compiled[table] = (entries, table_rules)
+    return compiled
+
+
+class MappingRegistry:
+    """function_info / chart_info of config.yaml, compiled once into frozen MappingTables.
+
+    The compiled form is cached on disk as JSON keyed by the file's path, mtime and size,
+    so a new worker process loads it without parsing YAML.  The cache folder is created
+    private to the user and ignored when another user owns it.  reload_if_changed()
+    recompiles when the file changed; it checks at most every check_interval seconds,
+    which lets long-running services pick up edits without a restart.
+    """
+
+    def __init__(self, config_path=DEFAULT_CONFIG_PATH, cache_dir=DEFAULT_CACHE_DIR, check_interval=2.0):
+        self.config_path = os.path.abspath(config_path)
+        self.cache_dir = cache_dir
+        self.check_interval = check_interval
+        self.signature = None
+        self.tables = {}
+        self.checked = 0.0
+        self.lock = threading.Lock()
+        self.load()
+
+    def file_signature(self):
+        stat = os.stat(self.config_path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def cache_path(self):
+        name = hashlib.sha256(self.config_path.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f"mappings-{name}.json")
+
+    def cache_dir_trusted(self):
+        """True when the cache folder exists, belongs to this user and only they can write to it."""
+        try:
+            stat = os.stat(self.cache_dir)
+        except OSError:
+            return False
+        if hasattr(os, 'getuid') and stat.st_uid != os.getuid():
+            return False
+        return not stat.st_mode & 0o022
+
+    def load(self):
+        signature = self.file_signature()
+        compiled = self.read_cache(signature)
+        if compiled is None:
+            # Imported here so processes served from the cache never import yaml
+            try:
+                from config_loader import ConfigLoader
+            except ImportError:
+                from dictionary.config_loader import ConfigLoader
+            compiled = compile_config(ConfigLoader(self.config_path).config or {})
+            self.write_cache(signature, compiled)
+        # Swapped in one assignment, readers see either the old or the new tables
+        self.tables = {table: MappingTable(table, *compiled[table]) for table in TABLES}
+        self.signature = signature
+        self.checked = time.monotonic()
+
+    def read_cache(self, signature):
+        if self.cache_dir is None or not self.cache_dir_trusted():
+            return None
+        try:
+            with open(self.cache_path(), 'rb') as file:
+                cached = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(cached, dict) or cached.get('version') != COMPILED_FORMAT_VERSION \
+                or cached.get('path') != self.config_path or cached.get('signature') != list(signature):
+            return None
+        return cached['tables']
+
+    def write_cache(self, signature, compiled):
+        if self.cache_dir is None:
+            return
+        try:
+            data = json.dumps({'version': COMPILED_FORMAT_VERSION, 'path': self.config_path,
+                               'signature': list(signature), 'tables': compiled})
+            os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+            if not self.cache_dir_trusted():
+                return
+            fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'w') as file:
+                file.write(data)
+            os.replace(temp_path, self.cache_path())
+        except (OSError, TypeError, ValueError):
+            # The cache only saves start-up time; a read-only cache folder or values JSON
+            # cannot hold are not errors
+            pass
+
+    def reload_if_changed(self):
+        """Recompile if config.yaml changed since it was loaded; returns True when it did."""
+        now = time.monotonic()
+        if now - self.checked < self.check_interval:
+            return False
+        with self.lock:
+            self.checked = now
+            try:
+                if self.file_signature() == self.signature:
+                    return False
+                self.load()
+            except Exception:
+                # Keep serving the last good tables while the file is half edited or invalid
+                return False
+        return True
+
+    def function_info(self, aggregation, default=MappingProxyType({})):
+        return self.tables['function_info'].get(aggregation, default)
+
+    def chart_info(self, chart_type, default=None):
+        return self.tables['chart_info'].get(chart_type, default)
+
+
+_default_registry = None
+
+
+def default_registry():
+    """Process-wide registry over dictionary/config.yaml, created on first use."""
+    global _default_registry
+    if _default_registry is None:
+        _default_registry = MappingRegistry()
+    return _default_registry
@@ -0,0 +1,158 @@
+"""Qlik to Tableau migration command line.
+
+    python migrate.py convert APP DATASOURCE [-o tableau-result.xml] [--daemon]
+    python migrate.py batch ROOT OUTPUT [...]      (see BatchMigration.py)
+    python migrate.py extract APP OUTPUT [...]     (see SourceExtractor.py)
+    python migrate.py serve [--socket PATH]        (see MigrationDaemon.py)
+    python migrate.py stop [--socket PATH]
+
+Only argparse and the standard library are imported up front; each command imports
+the converters it needs, so `convert --daemon` hands its job to a running daemon
+without loading any of them.
+"""
+import os
+import sys
+import argparse
+
+# The common layer modules import each other as top-level modules
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "common_layer"))
+
+from SheetSelection import SheetSelection
+
+
+def convert_request(args):
+    """The daemon's convert request for the parsed convert arguments, with absolute paths."""
+    def absolute(path):
+        return os.path.abspath(path) if path else None
+
+    selection = SheetSelection.from_args(args)
+    return {
+        "command": "convert",
+        "app": absolute(args.app),
+        "datasource": absolute(args.datasource),
+        "output": absolute(args.output),
+        "json": absolute(args.json),
+        "stream": args.stream,
+        "read_ahead": args.read_ahead,
+        "sheet_workers": args.sheet_workers,
+        "pretty": not args.compact_xml,
+        "pretty_json": args.pretty_json,
+        "selection": {"sheet_ids": sorted(selection.sheet_ids), "titles": list(selection.titles),
+                      "object_types": list(selection.object_types), "object_ids": sorted(selection.object_ids)}
+    }
+
+
+def convert_in_process(args):
+    from Pipeline import Pipeline
+
+    pipeline = Pipeline(args.datasource, stream=args.stream, pretty_json=args.pretty_json,
+                        read_ahead=args.read_ahead, selection=SheetSelection.from_args(args),
+                        sheet_workers=args.sheet_workers)
+    pipeline.run(args.app, args.output, args.json, pretty=not args.compact_xml)
+    return pipeline.stage_times
+
+
+def convert(args):
+    if args.daemon or args.socket:
+        from MigrationClient import submit
+
+        try:
+            response = submit(convert_request(args), args.socket)
+        except OSError as e:
+            print(f"No migration daemon ({e}), converting in process", file=sys.stderr)
+        else:
+            if response["status"] != "ok":
+                sys.exit(f"Conversion failed: {response['error']}")
+            stage_times = response["stage_times"]
+            print(", ".join(f"{stage} {elapsed:.3f}s" for stage, elapsed in stage_times.items()))
+            return
+    stage_times = convert_in_process(args)
+    print(", ".join(f"{stage} {elapsed:.3f}s" for stage, elapsed in stage_times.items()))
+
+
+def batch(argv):
+    from BatchMigration import main
+    main(argv)
+
+
+def extract(argv):
+    from SourceExtractor import main
+    main(argv)
+
+
+def serve(args):
+    from MigrationDaemon import MigrationDaemon
+
+    try:
+        MigrationDaemon(args.socket, args.max_apps).serve()
+    except RuntimeError as e:
+        sys.exit(str(e))
+
+
+def stop(args):
+    from MigrationClient import submit
+
+    try:
+        submit({"command": "shutdown"}, args.socket)
+    except OSError as e:
+        sys.exit(f"No migration daemon ({e})")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Migrate unbuilt Qlik apps to Tableau.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    convert_parser = commands.add_parser('convert', help="migrate one app to a Tableau workbook")
+    convert_parser.add_argument('app', help="unbuilt app folder (objects/ + script.qvs)")
+    convert_parser.add_argument('datasource', help="Tableau datasource XML")
+    convert_parser.add_argument('-o', '--output', default='tableau-result.xml', help="workbook XML to write")
+    convert_parser.add_argument('--json', default=None, help="also write the worksheets as JSON to this file")
+    convert_parser.add_argument('--stream', action='store_true', help="parse sheet files incrementally")
+    convert_parser.add_argument('--read-ahead', type=int, default=0, metavar='N',
+                                help="read up to N object files concurrently, for apps on network shares")
+    convert_parser.add_argument('--sheet-workers', type=int, default=0, metavar='N',
+                                help="convert the sheets on N processes, for apps with many sheets")
+    convert_parser.add_argument('--compact-xml', action='store_true',
+                                help="write the workbook XML without indentation")
+    convert_parser.add_argument('--pretty-json', action='store_true', help="indent the JSON output")
+    SheetSelection.add_arguments(convert_parser)
+    convert_parser.add_argument('--daemon', action='store_true',
+                                help="hand the job to a running `migrate.py serve`, converting in process without one")
+    convert_parser.add_argument('--socket', default=None, help="daemon socket path (implies --daemon)")
+
+    # batch and extract keep their own options, everything after the command is passed on
+    commands.add_parser('batch', add_help=False, help="migrate every app under a folder (BatchMigration.py)")
+    commands.add_parser('extract', add_help=False, help="extract an app's CSV sources (SourceExtractor.py)")
+
+    serve_parser = commands.add_parser('serve', help="run the conversion daemon in the foreground")
+    serve_parser.add_argument('--socket', default=None,
+                              help="socket path (default: in $XDG_RUNTIME_DIR or a private temporary folder)")
+    serve_parser.add_argument('--max-apps', type=int, default=64, help="apps whose master item libraries stay cached")
+
+    stop_parser = commands.add_parser('stop', help="shut down a running conversion daemon")
+    stop_parser.add_argument('--socket', default=None,
+                             help="socket path (default: in $XDG_RUNTIME_DIR or a private temporary folder)")
+    return parser.parse_known_args(argv)
+
+
+def main(argv=None):
+    args, rest = parse_args(argv)
+    if args.command == 'batch':
+        batch(rest)
+    elif args.command == 'extract':
+        extract(rest)
+    elif rest:
+        sys.exit(f"unrecognized arguments: {' '.join(rest)}")
+    elif args.command == 'convert':
+        # Checked here too, the daemon would only report it after connecting
+        if args.sheet_workers > 1 and (args.stream or args.read_ahead):
+            sys.exit(f"--sheet-workers cannot be combined with {'--stream' if args.stream else '--read-ahead'}")
+        convert(args)
+    elif args.command == 'serve':
+        serve(args)
+    else:
+        stop(args)
+
+
+if __name__ == '__main__':
+    main()